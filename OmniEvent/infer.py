@@ -1,7 +1,11 @@
 import os
+import copy
 import json
+import time
+import logging
+import argparse
 
-import torch.cuda
+import torch
 
 from .arguments import (
     ArgumentParser,
@@ -25,8 +29,20 @@ from .infer_module.seq2seq import (
     get_ed_result,
     get_eae_result,
     prepare_for_eae_from_input,
-    prepare_for_eae_from_pred
+    prepare_for_eae_from_pred,
+    get_language,
+    DECODING_PROFILES
 )
+from .infer_module.document import split_into_windows, assign_triggers_to_windows, merge_window_results
+from .infer_module.registry import ModelRegistry
+from .infer_module.cache import ResultCache, model_fingerprint, make_cache_key
+from .infer_module.precision import PRECISIONS, get_precision_dtype, quantize_dynamic_int8
+from .infer_module.pipeline import PipelinedExecutor
+from .infer_module.batching import BatchScheduler
+from .infer_module.stream import read_instances, iter_chunks, StreamCheckpoint
+
+
+logger = logging.getLogger(__name__)
 
 
 class AttrDict(dict):
@@ -58,21 +74,228 @@ def get_model(model_args, model_name_or_path):
     return model
 
 
-def get_pretrained(model_name_or_path, device):
+def load_pretrained(model_name_or_path, device, dtype=None):
     # model
     model_args = AttrDict({
         "paradigm": "seq2seq",
         "model_type": "mt5"
     })
     model = get_model(model_args, model_name_or_path)
-    model = model.to(device)
+    if dtype == torch.qint8:
+        model = quantize_dynamic_int8(model.to(device))
+    else:
+        model = model.to(device, dtype=dtype) if dtype is not None else model.to(device)
+    model.eval()
     # tokenizer 
     tokenizer = get_tokenizer(model_name_or_path)
 
     return model, tokenizer
 
 
-def infer(text, model=None, tokenizer=None, triggers=None, schema="ace", task="ED", device='auto'):
+MODEL_REGISTRY = ModelRegistry(max_models=int(os.environ.get("OMNIEVENT_MAX_LOADED_MODELS", 4)))
+
+
+def get_pretrained(model_name_or_path, device, dtype=None, use_registry=True, precision="fp32"):
+    """Returns the `(model, tokenizer)` pair, loading it only once per (model name, device, dtype) in the process.
+    The model is shared by all threads, while every thread gets its own copy of the tokenizer.
+
+    Args:
+        model_name_or_path (`str`): Model identifier such as "s2s-mt5-ed", or a local path.
+        device: Device the model is placed on.
+        dtype (`torch.dtype`, *optional*): Dtype the model weights are cast to. `torch.qint8` applies dynamic int8
+            quantization to the Linear layers instead.
+        use_registry (`bool`): Whether to share the model through `MODEL_REGISTRY`. Set to `False` for a private copy.
+        precision (`str`): Selected in ['fp32', 'bf16', 'int8']. Shorthand for `dtype`, see `get_precision_dtype`.
+    """
+    if precision != "fp32":
+        dtype = get_precision_dtype(precision, device)
+    if not use_registry:
+        return load_pretrained(model_name_or_path, device, dtype)
+    model, tokenizer = MODEL_REGISTRY.get(model_name_or_path, device, dtype, load_pretrained)
+    # the model is shared, but every thread encodes with its own tokenizer
+    return model, MODEL_REGISTRY.local_copy(tokenizer)
+
+
+def preload(model_names_or_paths=("s2s-mt5-ed", "s2s-mt5-eae"), device='auto', dtype=None, precision="fp32"):
+    """Loads models into `MODEL_REGISTRY` ahead of the first `infer` call."""
+    device = get_device(device)
+    for model_name_or_path in model_names_or_paths:
+        get_pretrained(model_name_or_path, device, dtype, precision=precision)
+
+
+def unload(model_name_or_path=None, device=None, dtype=None):
+    """Removes models from `MODEL_REGISTRY`. Arguments left as `None` match every loaded model."""
+    if device is not None:
+        device = get_device(device)
+    num_unloaded = MODEL_REGISTRY.unload(model_name_or_path, device, dtype)
+    if num_unloaded > 0 and torch.cuda.is_available():
+        torch.cuda.empty_cache()
+    return num_unloaded
+
+
+SCHEMAS = ['ace', 'kbp', 'ere', 'maven', 'leven', 'duee', 'fewfc']
+
+
+def get_device(device):
+    if device == 'auto':
+        device = torch.device("cpu")
+        if torch.cuda.is_available():
+            device = 'cuda'
+    else:
+        device = torch.device(device)
+    return device
+
+
+def split_into_batches(instances, batch_size):
+    """Yields `(start, end)` spans of `instances` holding at most `batch_size` items each."""
+    for start in range(0, len(instances), batch_size):
+        yield start, min(start + batch_size, len(instances))
+
+
+def pipelined_event_extraction(ed_model, ed_tokenizer, eae_model, eae_tokenizer, texts, schemas, device, batch_size,
+                               decoding="accurate", deadline=None):
+    """Runs ED on micro-batch k+1 in a worker thread while EAE consumes the triggers of micro-batch k."""
+    # fast tokenizers must not be used from two threads at once
+    if ed_tokenizer is eae_tokenizer:
+        ed_tokenizer = copy.deepcopy(ed_tokenizer)
+    def detect(span):
+        start, end = span
+        events = do_event_detection(ed_model, ed_tokenizer, texts[start:end], schemas[start:end], device,
+                                    decoding=decoding, deadline=deadline)
+        return prepare_for_eae_from_pred(texts[start:end], events, schemas[start:end])
+
+    def extract(instances):
+        arguments = do_event_argument_extraction(eae_model, eae_tokenizer, instances, device,
+                                                 batch_size=batch_size, sort_by_length=True, decoding=decoding,
+                                                 deadline=deadline)
+        return get_eae_result(instances, arguments)
+
+    stream_context = None
+    if torch.device(device).type == "cuda":
+        ed_stream = torch.cuda.Stream(device=device)
+        stream_context = lambda: torch.cuda.stream(ed_stream)
+    executor = PipelinedExecutor(detect, extract, first_stage_context=stream_context)
+    results = []
+    for batch_results in executor.run(split_into_batches(texts, batch_size)):
+        results.extend(batch_results)
+    return results
+
+
+def run_inference(texts, triggers, schemas, task, models, tokenizers, device, batch_size, pipeline, decoding,
+                  deadline=None):
+    """Runs ED, EAE or EE over `texts`. `models` and `tokenizers` hold one item for ED and EAE, and two for EE."""
+    kwargs = {"batch_size": batch_size, "sort_by_length": True, "decoding": decoding, "deadline": deadline}
+    if task == "ED":
+        events = do_event_detection(models[0], tokenizers[0], texts, schemas, device, **kwargs)
+        results = get_ed_result(texts, events)
+    elif task == "EAE":
+        instances = prepare_for_eae_from_input(texts, triggers, schemas)
+        arguments = do_event_argument_extraction(models[0], tokenizers[0], instances, device, **kwargs)
+        results = get_eae_result(instances, arguments)
+    elif task == "EE":
+        ed_model, eae_model = models
+        ed_tokenizer, eae_tokenizer = tokenizers
+        if pipeline and len(texts) > batch_size:
+            results = pipelined_event_extraction(ed_model, ed_tokenizer, eae_model, eae_tokenizer, texts, schemas,
+                                                 device, batch_size, decoding, deadline)
+        else:
+            events = do_event_detection(ed_model, ed_tokenizer, texts, schemas, device, **kwargs)
+            instances = prepare_for_eae_from_pred(texts, events, schemas)
+            arguments = do_event_argument_extraction(eae_model, eae_tokenizer, instances, device, **kwargs)
+            results = get_eae_result(instances, arguments)
+    return results
+
+
+def infer_batch(texts, model=None, tokenizer=None, triggers=None, schemas="ace", task="ED", device='auto',
+                batch_size=16, pipeline=True, decoding="accurate", cache=None, precision="fp32", deadline=None):
+    """Batched infer method.
+
+    Runs `infer` over many documents at once. Inputs are micro-batched so that each `generate()` call decodes up to
+    `batch_size` sequences, and the predictions are mapped back to the input they belong to. Identical inputs in the
+    batch are only decoded once.
+
+    Args:
+        texts (`List[str]`): Input plain texts.
+        triggers (`List[List[List]]`, *optional*): Triggers of each text. Only useful for EAE.
+        schemas (`Union[str, List[str]]`): Schema shared by all texts, or one schema per text.
+        task (`str`): Task type. Selected in ['ED', 'EAE', 'EE']
+        batch_size (`int`): Maximum number of sequences decoded per forward pass. For EAE, every trigger is one
+            sequence.
+        pipeline (`bool`): For EE, whether to overlap ED on the next micro-batch with EAE on the current one.
+        decoding (`Union[str, Dict]`): Decoding profile. Selected in ['accurate', 'fast', 'speculative'] (see
+            `DECODING_PROFILES`), or a dict of `generate()` arguments. Such a dict may hold a `constraint_decoder` to
+            restrict the output to known types followed by spans of the input, e.g. `get_constraint_decoder(tokenizer,
+            {"role_list": ["attack:", "injure:"]})`.
+        cache (`ResultCache`, *optional*): Cache of results keyed by text, schema, task, triggers, decoding profile and
+            model fingerprint. Any object with `get(key)` and `set_many(items)` methods can be used.
+        precision (`str`): Precision of the default models. Selected in ['fp32', 'bf16', 'int8']. `int8` applies
+            dynamic int8 quantization to the Linear layers (CPU only), `bf16` casts the weights to bfloat16 where the
+            device supports it. Ignored if `model` is given.
+        deadline (`float`, *optional*): `time.monotonic()` value at which generation stops, as in `InferenceEngine`.
+            Results cut short by it are returned, but not cached.
+
+    Returns:
+        results (`List`): Predicted results, one item per input text, in the format of `infer`.
+    """
+    if isinstance(schemas, str):
+        schemas = [schemas] * len(texts)
+    assert len(schemas) == len(texts)
+    assert all(schema in SCHEMAS for schema in schemas)
+    assert task in ['ED', 'EAE', 'EE']
+    schemas = [f"<{schema}>" for schema in schemas]
+    if triggers is None:
+        triggers = [None] * len(texts)
+    device = get_device(device)
+
+    if task == "ED":
+        if model is None or tokenizer is None:
+            models, tokenizers = zip(get_pretrained("s2s-mt5-ed", device, precision=precision))
+        else:
+            models, tokenizers = (model,), (tokenizer,)
+    elif task == "EAE":
+        if model is None or tokenizer is None:
+            models, tokenizers = zip(get_pretrained("s2s-mt5-eae", device, precision=precision))
+        else:
+            models, tokenizers = (model,), (tokenizer,)
+    elif task == "EE":
+        if model is None or tokenizer is None:
+            models, tokenizers = zip(get_pretrained("s2s-mt5-ed", device, precision=precision),
+                                     get_pretrained("s2s-mt5-eae", device, precision=precision))
+        else:
+            models, tokenizers = tuple(model), tuple(tokenizer)
+
+    # de-duplicate the batch, then look the remaining inputs up in the cache
+    fingerprint = [model_fingerprint(model) for model in models]
+    keys = [make_cache_key(text, schema, task, fingerprint, triggers_in_text, decoding)
+            for text, schema, triggers_in_text in zip(texts, schemas, triggers)]
+    unique_results = {}
+    for key in keys:
+        if key not in unique_results:
+            unique_results[key] = cache.get(key) if cache is not None else None
+    todo = {}
+    for i, key in enumerate(keys):
+        if unique_results[key] is None and key not in todo:
+            todo[key] = i
+    if len(todo) > 0:
+        indices = list(todo.values())
+        new_results = run_inference([texts[i] for i in indices],
+                                    [triggers[i] for i in indices],
+                                    [schemas[i] for i in indices],
+                                    task, models, tokenizers, device, batch_size, pipeline, decoding, deadline)
+        unique_results.update(zip(todo.keys(), new_results))
+        if cache is not None and (deadline is None or time.monotonic() < deadline):
+            cache.set_many(zip(todo.keys(), new_results))
+
+    results = []
+    used_keys = set()
+    for key in keys:
+        results.append(unique_results[key] if key not in used_keys else copy.deepcopy(unique_results[key]))
+        used_keys.add(key)
+    return results
+
+
+def infer(text, model=None, tokenizer=None, triggers=None, schema="ace", task="ED", device='auto', document=False,
+          window_size=96, window_overlap=32, batch_size=16, decoding="accurate", cache=None, precision="fp32"):
     """Infer method.
 
     Args:
@@ -80,6 +303,16 @@ def infer(text, model=None, tokenizer=None, triggers=None, schema="ace", task="E
         triggers (`List[List]`, *optional*): List of triggers in the text. Only useful for EAE. Examples: [(moving, 2, 8), ...]
         schema (`str`): Schema used for ED and EAE. Selected in ['ace', 'kbp', 'ere', 'maven', 'leven', 'duee', 'fewfc']
         task (`str`): Task type. Selected in ['ED', 'EAE', 'EE']
+        document (`bool`): Whether `text` is a long document. If so, it is split into overlapping windows of whole
+            sentences, all windows are inferred in one batched pass, and the results are merged back with offsets in
+            `text`. Otherwise the input is truncated to the maximum sequence length of the model.
+        window_size (`int`): Maximum window length in words (characters for Chinese). Only useful for documents.
+        window_overlap (`int`): Maximum number of words repeated from the previous window. Only useful for documents.
+        decoding (`Union[str, Dict]`): Decoding profile. Selected in ['accurate', 'fast', 'speculative']. `fast` uses
+            greedy search with an output length cap derived from the input length, and `speculative` produces the same
+            outputs with fewer decoder steps by verifying spans copied from the input.
+        cache (`ResultCache`, *optional*): Cache of previous results. See `infer_batch`.
+        precision (`str`): Precision of the default models. Selected in ['fp32', 'bf16', 'int8']. See `infer_batch`.
     
     Returns:
         results (`List`): Predicted results. The format is 
@@ -103,48 +336,195 @@ def infer(text, model=None, tokenizer=None, triggers=None, schema="ace", task="E
             } 
         ]
     """
-    assert schema in ['ace', 'kbp', 'ere', 'maven', 'leven', 'duee', 'fewfc']
-    assert task in ['ED', 'EAE', 'EE']
-    schema = f"<{schema}>"
-    # get device.
-    if device == 'auto':
-        device = torch.device("cpu")
-        if torch.cuda.is_available():
-            device = 'cuda'
+    if document:
+        windows = split_into_windows(text, get_language(f"<{schema}>"), window_size, window_overlap)
+        window_results = infer_batch([text[start:end] for start, end in windows],
+                                     model=model,
+                                     tokenizer=tokenizer,
+                                     triggers=assign_triggers_to_windows(triggers, windows) if triggers else None,
+                                     schemas=schema,
+                                     task=task,
+                                     device=device,
+                                     batch_size=batch_size,
+                                     decoding=decoding,
+                                     cache=cache,
+                                     precision=precision)
+        results = [merge_window_results(text, windows, window_results)]
     else:
-        device = torch.device(device)
-
-    if task == "ED":
-        if model is None or tokenizer is None:
-            ed_model, ed_tokenizer = get_pretrained("s2s-mt5-ed", device)
-        else:
-            ed_model, ed_tokenizer = model, tokenizer
-        events = do_event_detection(ed_model, ed_tokenizer, [text], [schema], device)
-        results = get_ed_result([text], events)
-    elif task == "EAE":
-        if model is None or tokenizer is None:
-            eae_model, eae_tokenizer = get_pretrained("s2s-mt5-eae", device)
-        else:
-            eae_model, eae_tokenizer = model, tokenizer
-        instances = prepare_for_eae_from_input([text], [triggers], [schema])
-        arguments = do_event_argument_extraction(eae_model, eae_tokenizer, instances, device)
-        results = get_eae_result(instances, arguments)
-    elif task == "EE":
-        if model is None or tokenizer is None:
-            ed_model, ed_tokenizer = get_pretrained("s2s-mt5-ed", device)
-            eae_model, eae_tokenizer = get_pretrained("s2s-mt5-eae", device)
-        else:
-            ed_model, ed_tokenizer = model[0], tokenizer[0]
-            eae_model, eae_tokenizer = model[1], tokenizer[1]
-        events = do_event_detection(ed_model, ed_tokenizer, [text], [schema], device)
-        instances = prepare_for_eae_from_pred([text], events, [schema])
-        if len(instances[0]["triggers"]) == 0:
-            results = [{
-                "text": instances[0]["text"],
-                "events": []
-            }]
-            return results
-        arguments = do_event_argument_extraction(eae_model, eae_tokenizer, instances, device)
-        results = get_eae_result(instances, arguments)
+        results = infer_batch([text],
+                              model=model,
+                              tokenizer=tokenizer,
+                              triggers=[triggers] if triggers is not None else None,
+                              schemas=schema,
+                              task=task,
+                              device=device,
+                              batch_size=batch_size,
+                              decoding=decoding,
+                              cache=cache,
+                              precision=precision)
     print(results)
     return results
+
+
+def infer_scheduled(key, items, deadline=None):
+    """Runs the requests batched by `SCHEDULER`. Every item is a `(text, triggers, schema)` tuple."""
+    task, model, tokenizer, device, decoding, cache, precision = key
+    texts, triggers, schemas = zip(*items)
+    return infer_batch(list(texts),
+                       model=model,
+                       tokenizer=tokenizer,
+                       triggers=list(triggers) if task == "EAE" else None,
+                       schemas=list(schemas),
+                       task=task,
+                       device=device,
+                       batch_size=SCHEDULER.max_batch_size,
+                       decoding=decoding,
+                       cache=cache,
+                       precision=precision,
+                       deadline=deadline)
+
+
+SCHEDULER = BatchScheduler(infer_scheduled,
+                           max_batch_size=int(os.environ.get("OMNIEVENT_COALESCE_BATCH_SIZE", 32)),
+                           max_wait_ms=float(os.environ.get("OMNIEVENT_COALESCE_WINDOW", 0.005)) * 1000)
+
+
+async def ainfer(text, model=None, tokenizer=None, triggers=None, schema="ace", task="ED", device='auto',
+                 document=False, window_size=96, window_overlap=32, decoding="accurate", cache=None, precision="fp32",
+                 timeout=None):
+    """Asynchronous infer method.
+
+    Takes the same arguments as `infer`, and returns the same results without blocking the event loop. Concurrent
+    calls with the same task, models, device, decoding profile, cache and precision are batched by `SCHEDULER`, the
+    `BatchScheduler` that `InferenceEngine` also uses, into `infer_batch` calls, which run in a background thread. The
+    batching window and the maximum batch size are set through the `max_wait` (seconds) and `max_batch_size`
+    attributes of `SCHEDULER`, or the `OMNIEVENT_COALESCE_WINDOW` (seconds) and `OMNIEVENT_COALESCE_BATCH_SIZE`
+    environment variables.
+
+    Args:
+        timeout (`float`, *optional*): Seconds after which the results are not waited for, and generation stops.
+            Raises `DeadlineExceededError` when it passes first.
+    """
+    device = get_device(device)
+    if task == "EE" and model is not None:
+        model, tokenizer = tuple(model), tuple(tokenizer)
+    key = (task, model, tokenizer, device, decoding, cache, precision)
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    if document:
+        windows = split_into_windows(text, get_language(f"<{schema}>"), window_size, window_overlap)
+        window_triggers = assign_triggers_to_windows(triggers, windows) if triggers else [None] * len(windows)
+        window_results = await SCHEDULER.submit(key, [(text[start:end], window_triggers[i], schema)
+                                                      for i, (start, end) in enumerate(windows)], deadline, block=True)
+        return [merge_window_results(text, windows, window_results)]
+    return await SCHEDULER.submit(key, [(text, triggers, schema)], deadline, block=True)
+
+
+def infer_file(input_file, output_file, model=None, tokenizer=None, schema="ace", task="ED", input_format="unified",
+               device='auto', batch_size=16, chunk_size=1024, resume=True, decoding="accurate",
+               cache=None, precision="fp32"):
+    """Streaming infer method for large JSONL files.
+
+    Reads `input_file` lazily in chunks of `chunk_size` lines, sorts every chunk by text length so that each
+    micro-batch holds similarly long inputs, and appends the results to `output_file` in input order. After each chunk
+    a checkpoint (`output_file` + ".ckpt") records the last committed line, so an interrupted job resumes from there.
+
+    Args:
+        input_file (`str`): Input JSONL file.
+        output_file (`str`): Output JSONL file. Every line holds the `id` of the input and its result in the format of
+            `infer`.
+        input_format (`str`): Selected in ['unified', 'text']. See `parse_instance`.
+        chunk_size (`int`): Number of lines held in memory at a time.
+        resume (`bool`): Whether to continue from the checkpoint of a previous run.
+        cache (`ResultCache`, *optional*): Cache of previous results, e.g. backed by a SQLite file so that repeated
+            texts are only decoded once across runs. See `infer_batch`.
+        precision (`str`): Precision of the default models. Selected in ['fp32', 'bf16', 'int8']. See `infer_batch`.
+    """
+    device = get_device(device)
+    checkpoint = StreamCheckpoint(output_file + ".ckpt")
+    start_line, offset = checkpoint.load() if resume else (0, 0)
+    if start_line > 0:
+        logger.info(f"Resuming {input_file} from line {start_line}")
+        os.truncate(output_file, offset)
+    else:
+        open(output_file, "wb").close()
+
+    num_lines = start_line
+    with open(output_file, "ab") as f:
+        for chunk in iter_chunks(read_instances(input_file, input_format, start_line), chunk_size):
+            instances = [instance for _, instance in chunk if instance is not None]
+            order = sorted(range(len(instances)), key=lambda i: len(instances[i]["text"]))
+            results = infer_batch([instances[i]["text"] for i in order],
+                                  model=model,
+                                  tokenizer=tokenizer,
+                                  triggers=[instances[i]["triggers"] for i in order],
+                                  schemas=schema,
+                                  task=task,
+                                  device=device,
+                                  batch_size=batch_size,
+                                  decoding=decoding,
+                                  cache=cache,
+                                  precision=precision) if len(instances) > 0 else []
+            ordered_results = [None] * len(instances)
+            for i, result in zip(order, results):
+                ordered_results[i] = result
+            for instance, result in zip(instances, ordered_results):
+                line = json.dumps({"id": instance["id"], **result}, ensure_ascii=False) + "\n"
+                f.write(line.encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+            num_lines = chunk[-1][0] + 1
+            checkpoint.save(num_lines, f.tell())
+            logger.info(f"Processed {num_lines} lines of {input_file}")
+    return num_lines
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Streaming event extraction over a JSONL file.")
+    arg_parser.add_argument("--input_file", type=str, required=True)
+    arg_parser.add_argument("--output_file", type=str, required=True)
+    arg_parser.add_argument("--input_format", type=str, default="unified", choices=["unified", "text"])
+    arg_parser.add_argument("--task", type=str, default="ED", choices=["ED", "EAE", "EE"])
+    arg_parser.add_argument("--schema", type=str, default="ace", choices=SCHEMAS)
+    arg_parser.add_argument("--ed_model", type=str, default="s2s-mt5-ed")
+    arg_parser.add_argument("--eae_model", type=str, default="s2s-mt5-eae")
+    arg_parser.add_argument("--device", type=str, default="auto")
+    arg_parser.add_argument("--batch_size", type=int, default=16)
+    arg_parser.add_argument("--chunk_size", type=int, default=1024)
+    arg_parser.add_argument("--decoding", type=str, default="accurate", choices=list(DECODING_PROFILES.keys()))
+    arg_parser.add_argument("--precision", type=str, default="fp32", choices=PRECISIONS)
+    arg_parser.add_argument("--no_resume", action="store_true")
+    arg_parser.add_argument("--cache_file", type=str, default=None,
+                            help="SQLite file caching results across runs.")
+    args = arg_parser.parse_args()
+
+    logging.basicConfig(
+        format="%(asctime)s - %(levelname)s - %(name)s - %(message)s",
+        datefmt="%m/%d/%Y %H:%M:%S",
+        level=logging.INFO,
+    )
+    device = get_device(args.device)
+    if args.task == "ED":
+        model, tokenizer = get_pretrained(args.ed_model, device, precision=args.precision)
+    elif args.task == "EAE":
+        model, tokenizer = get_pretrained(args.eae_model, device, precision=args.precision)
+    else:
+        ed_model, ed_tokenizer = get_pretrained(args.ed_model, device, precision=args.precision)
+        eae_model, eae_tokenizer = get_pretrained(args.eae_model, device, precision=args.precision)
+        model, tokenizer = (ed_model, eae_model), (ed_tokenizer, eae_tokenizer)
+    infer_file(args.input_file,
+               args.output_file,
+               model=model,
+               tokenizer=tokenizer,
+               schema=args.schema,
+               task=args.task,
+               input_format=args.input_format,
+               device=device,
+               batch_size=args.batch_size,
+               chunk_size=args.chunk_size,
+               resume=not args.no_resume,
+               decoding=args.decoding,
+               cache=ResultCache(path=args.cache_file) if args.cache_file is not None else None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+import time
+import asyncio
+
+from concurrent.futures import ThreadPoolExecutor
+
+
+class QueueFullError(Exception):
+    """Raised when a request arrives while `max_queue_size` requests are already waiting."""
+
+
+class DeadlineExceededError(Exception):
+    """Raised when the deadline of a request passes before its results are ready."""
+
+
+class BatchScheduler():
+    """Micro-batches concurrent requests into single ED / EAE passes.
+
+    Requests go into a queue. A worker takes the first waiting request, then drains further requests with the
+    same key until it holds `max_batch_size` items or `max_wait_ms` have passed, and runs `process(key, items,
+    deadline)` once for all of them in a background thread, so the event loop keeps accepting requests meanwhile. Each
+    request's future then receives the results of its own items.
+
+    Requests may carry a deadline, as a `time.monotonic()` value. A request whose deadline passes while it waits is
+    dropped before its batch starts, and `process` gets the latest deadline of the batch, after which no request of
+    the batch waits for the results anymore.
+
+    It batches the requests of both `InferenceEngine` and `ainfer`. The queue is bounded, so that the server can shed
+    load, while `ainfer` waits for a free slot.
+
+    Args:
+        process (`Callable`): Called as `process(key, items, deadline)`, returns one result per item, in order.
+            `deadline` is `None` if a request of the batch has none.
+        max_batch_size (`int`): Maximum number of items per batch. A larger request is run on its own.
+        max_wait_ms (`float`): Milliseconds to wait for more requests after the first one arrives.
+        max_queue_size (`int`): Maximum number of requests waiting for their batch to start, whether they are queued,
+            set aside for a later batch of another key, or in the batch being collected.
+        on_batch (`Callable`, *optional*): Called as `on_batch(key, num_items, waits)` when a batch starts, where
+            `waits` are the seconds every request of the batch waited in the queue.
+    """
+    def __init__(self, process, max_batch_size=16, max_wait_ms=10, max_queue_size=1024, on_batch=None):
+        self.process = process
+        self.on_batch = on_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_queue_size = max_queue_size
+        # a single thread, so batches never compete for the device
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="omnievent-batch")
+        self._loop = None
+        self._queue = None
+        self._slots = None
+        self._depth = 0
+        self._worker = None
+        self._pending = []
+
+    @property
+    def queue_depth(self):
+        """Number of requests waiting for their batch to start, which `max_queue_size` bounds."""
+        return self._depth
+
+    def start(self):
+        # the queue and the worker belong to one event loop, and are recreated if the server runs in another one
+        loop = asyncio.get_running_loop()
+        if self._worker is None or self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            # a request holds a slot from its submission until its batch starts, so that requests set aside by
+            # `_collect` count against the limit too
+            self._slots = asyncio.Semaphore(self.max_queue_size)
+            self._depth = 0
+            self._pending = []
+            self._worker = loop.create_task(self._run())
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            await asyncio.gather(self._worker, return_exceptions=True)
+            self._worker = None
+            self._queue = None
+            self._slots = None
+            self._depth = 0
+            self._pending = []
+
+    async def run_exclusive(self, function, *args):
+        """Runs `function(*args)` in the thread running the batches, so that it does not compete with them for the
+        device."""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, function, *args)
+
+    async def submit(self, key, items, deadline=None, block=False):
+        """Returns the results of `items`, computed in a batch with concurrent requests with the same key.
+
+        Raises `QueueFullError` if the queue is full, unless `block`, in which case the request waits for a free slot,
+        and `DeadlineExceededError` if `deadline` passes before the results are ready.
+        """
+        items = list(items)
+        if len(items) == 0:
+            return []
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        request = (key, items, future, time.monotonic(), deadline)
+        timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+        try:
+            if block:
+                await asyncio.wait_for(self._slots.acquire(), timeout)
+            elif self._slots.locked():
+                raise QueueFullError(f"The queue is full, with {self.max_queue_size} requests waiting")
+            else:
+                await self._slots.acquire()
+            self._depth += 1
+            self._queue.put_nowait(request)
+            # a timeout cancels the future, so the worker skips the request if its batch has not started yet
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            raise DeadlineExceededError("The request deadline passed before its results were ready")
+
+    async def _next_request(self, timeout=None):
+        if len(self._pending) > 0:
+            return self._pending.pop(0)
+        getter = asyncio.ensure_future(self._queue.get())
+        done, _ = await asyncio.wait([getter], timeout=timeout)
+        if getter not in done:
+            getter.cancel()
+            return None
+        return getter.result()
+
+    async def _collect(self):
+        """Waits for a first request, then for requests with the same key until the batch is full or the wait ends."""
+        key, items, future, enqueued_at, deadline = await self._next_request()
+        batch, size = [(items, future, enqueued_at, deadline)], len(items)
+        loop = asyncio.get_running_loop()
+        wait_end = loop.time() + self.max_wait
+        skipped = []
+        while size < self.max_batch_size:
+            remaining = wait_end - loop.time()
+            if remaining <= 0 and len(self._pending) == 0:
+                break
+            request = await self._next_request(max(remaining, 0))
+            if request is None:
+                break
+            if request[0] == key and size + len(request[1]) <= self.max_batch_size:
+                batch.append(request[1:])
+                size += len(request[1])
+            else:
+                skipped.append(request)
+        # requests of other keys keep their place in line
+        self._pending = skipped + self._pending
+        return key, batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            key, batch = await self._collect()
+            # the requests of the batch stop waiting, including the ones failed or dropped below
+            self._depth -= len(batch)
+            for _ in batch:
+                self._slots.release()
+            now = time.monotonic()
+            for _, future, _, deadline in batch:
+                if deadline is not None and deadline <= now and not future.done():
+                    future.set_exception(DeadlineExceededError("The request deadline passed while it was queued"))
+            # requests that expired or whose client went away are not computed
+            batch = [request for request in batch if not request[1].done()]
+            if len(batch) == 0:
+                continue
+            all_items = [item for items, _, _, _ in batch for item in items]
+            deadlines = [deadline for _, _, _, deadline in batch]
+            batch_deadline = None if None in deadlines else max(deadlines)
+            if self.on_batch is not None:
+                self.on_batch(key, len(all_items), [now - enqueued_at for _, _, enqueued_at, _ in batch])
+            work = loop.run_in_executor(self._executor, self.process, key, all_items, batch_deadline)
+            # errors go to the requests of the batch, and never stop the worker
+            await asyncio.wait([work])
+            if work.exception() is not None:
+                for _, future, _, _ in batch:
+                    if not future.done():
+                        future.set_exception(work.exception())
+                continue
+            results = work.result()
+            start = 0
+            for items, future, _, _ in batch:
+                if not future.done():
+                    future.set_result(results[start:start+len(items)])
+                start += len(items)
@@ -0,0 +1,213 @@
+import json
+import time
+import asyncio
+import sqlite3
+import hashlib
+import threading
+
+from collections import OrderedDict
+
+from .batching import DeadlineExceededError
+
+
+def model_fingerprint(model):
+    """Identifies the weights behind `model`, so cached results are not shared between different checkpoints.
+
+    Uses the `fingerprint` attribute if the model has one, and otherwise hashes its path, config, parameter dtype and
+    module types, the latter telling quantized models apart.
+    """
+    if getattr(model, "fingerprint", None) is not None:
+        return model.fingerprint
+    config = getattr(model, "config", None)
+    if config is None:
+        return f"{type(model).__name__}-{id(model)}"
+    parameter = next(model.parameters(), None) if hasattr(model, "parameters") else None
+    content = json.dumps([
+        getattr(model, "name_or_path", ""),
+        config.to_json_string() if hasattr(config, "to_json_string") else str(config),
+        str(parameter.dtype) if parameter is not None else "",
+        sorted({f"{type(module).__module__}.{type(module).__name__}" for module in model.modules()})
+        if hasattr(model, "modules") else []
+    ])
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+def make_cache_key(text, schema, task, fingerprint, triggers=None, decoding="accurate"):
+    content = json.dumps([text, schema, task, fingerprint, triggers, decoding], ensure_ascii=False, sort_keys=True,
+                         default=str)
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+class Uncached():
+    """Wraps a value returned by the `compute` of `ResultCache.get_or_compute` that must not be cached nor shared,
+    such as outputs cut short by the deadline of the request computing them."""
+    def __init__(self, value):
+        self.value = value
+
+
+class ResultCache():
+    """Cache of inference results with an in-memory LRU tier and an optional on-disk SQLite tier.
+
+    Lookups try memory first and then disk, promoting disk hits into memory. Values must be JSON-serializable; copies
+    are returned, so callers may modify them freely.
+
+    It serves both `infer_batch`, which caches whole results, and `InferenceEngine`, which caches the raw ED / EAE
+    outputs and computes missing ones through `get_or_compute`, so that identical concurrent requests decode once.
+
+    Args:
+        max_size (`int`): Maximum number of results kept in memory. `0` disables the memory tier.
+        path (`str`, *optional*): SQLite file backing the disk tier. Without it, only the memory tier is used.
+        ttl_seconds (`float`, *optional*): Seconds after which a result expires, in either tier. Results never expire
+            without it.
+    """
+    def __init__(self, max_size=10000, path=None, ttl_seconds=None):
+        self.max_size = max_size
+        self.path = path
+        self.ttl = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        # every key maps to its JSON value and its expiry time, `None` for never
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._connection = None
+        # the futures of the keys being computed by `get_or_compute`, which belong to one event loop
+        self._inflight = {}
+        if path is not None:
+            self._connection = sqlite3.connect(path, check_same_thread=False)
+            self._connection.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value TEXT, "
+                                     "expires_at REAL)")
+            # files written before results could expire
+            columns = [row[1] for row in self._connection.execute("PRAGMA table_info(results)")]
+            if "expires_at" not in columns:
+                self._connection.execute("ALTER TABLE results ADD COLUMN expires_at REAL")
+            self._connection.commit()
+
+    def get(self, key):
+        """Returns a copy of the result of `key`, or `None` if it is not cached or expired."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and entry[1] is not None and entry[1] <= now:
+                del self._memory[key]
+                entry = None
+            if entry is not None:
+                self._memory.move_to_end(key)
+            elif self._connection is not None:
+                row = self._connection.execute("SELECT value, expires_at FROM results WHERE key = ? AND "
+                                               "(expires_at IS NULL OR expires_at > ?)", (key, now)).fetchone()
+                if row is not None:
+                    entry = tuple(row)
+                    self._put_memory(key, entry)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(entry[0])
+
+    def set(self, key, result):
+        self.set_many([(key, result)])
+
+    def set_many(self, items):
+        """Stores `(key, result)` pairs, with a single disk commit."""
+        expires_at = time.time() + self.ttl if self.ttl is not None else None
+        items = [(key, json.dumps(result, ensure_ascii=False), expires_at) for key, result in items]
+        with self._lock:
+            for key, value, expires_at in items:
+                self._put_memory(key, (value, expires_at))
+            if self._connection is not None:
+                self._connection.executemany("INSERT OR REPLACE INTO results (key, value, expires_at) "
+                                             "VALUES (?, ?, ?)", items)
+                self._connection.commit()
+
+    def _put_memory(self, key, entry):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_size:
+            self._memory.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._connection is not None:
+                self._connection.execute("DELETE FROM results")
+                self._connection.commit()
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def __len__(self):
+        with self._lock:
+            return len(self._memory)
+
+    async def get_or_compute(self, keys, compute, deadline=None, on_lookup=None):
+        """Returns the result of every key of `keys`, and computes the missing ones in a single call. A key that is
+        already being computed by another request is not computed again: the request waits for the running
+        computation and shares its result, or its error.
+
+        `compute` is called as `await compute(indices)` with the indices of the keys that are neither cached nor being
+        computed, and returns their results, in order. Computed results are returned as they are, without copies,
+        to this request and the ones sharing the computation, except results wrapped in `Uncached`, which are returned
+        to this request only. Waiting for the computation of another request gives up at `deadline`, a `time.monotonic()` value, with
+        an `asyncio.TimeoutError`. `on_lookup`, if given, is called as `on_lookup(outcome)` for every key, where
+        `outcome` is `hit`, `shared` (joined a running computation) or `miss`.
+
+        A computation that is cancelled, or that misses the deadline of the request running it, is retried by the
+        requests waiting for it, whose deadlines may be later, and so is a computation returning `Uncached` results.
+        """
+        loop = asyncio.get_running_loop()
+        values = [None] * len(keys)
+        todo = list(range(len(keys)))
+        while len(todo) > 0:
+            owned, waiting = [], []
+            for i in todo:
+                value = self.get(keys[i])
+                if value is not None:
+                    values[i] = value
+                    outcome = "hit"
+                elif keys[i] in self._inflight:
+                    # also covers a key repeated within `keys`
+                    waiting.append((i, self._inflight[keys[i]]))
+                    outcome = "shared"
+                else:
+                    future = loop.create_future()
+                    # a failure nobody waited for is not reported as a never retrieved exception
+                    future.add_done_callback(lambda f: f.cancelled() or f.exception())
+                    self._inflight[keys[i]] = future
+                    owned.append(i)
+                    outcome = "miss"
+                if on_lookup is not None:
+                    on_lookup(outcome)
+            if len(owned) > 0:
+                try:
+                    results = await compute(owned)
+                except BaseException as e:
+                    for i in owned:
+                        future = self._inflight.pop(keys[i])
+                        if isinstance(e, (asyncio.CancelledError, asyncio.TimeoutError, DeadlineExceededError)):
+                            future.cancel()
+                        else:
+                            future.set_exception(e)
+                    raise
+                cached = []
+                for i, value in zip(owned, results):
+                    if isinstance(value, Uncached):
+                        self._inflight.pop(keys[i]).cancel()
+                        values[i] = value.value
+                        continue
+                    cached.append((keys[i], value))
+                    self._inflight.pop(keys[i]).set_result(value)
+                    values[i] = value
+                if len(cached) > 0:
+                    self.set_many(cached)
+            todo = []
+            for i, future in waiting:
+                timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+                try:
+                    values[i] = await asyncio.wait_for(asyncio.shield(future), timeout)
+                except asyncio.CancelledError:
+                    if not future.cancelled():
+                        raise
+                    todo.append(i)
+        return values
@@ -0,0 +1,110 @@
+import re
+
+from bisect import bisect_right
+
+
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+|(?<=[。！？；])")
+
+
+def get_units(text, language):
+    """Returns the char spans of the words (English) or characters (Chinese) of `text`."""
+    if language == "English":
+        return [match.span() for match in re.finditer(r"\S+", text)]
+    elif language == "Chinese":
+        return [(i, i+1) for i, char in enumerate(text) if not char.isspace()]
+    else:
+        raise NotImplementedError
+
+
+def split_sentences(text):
+    """Returns the char spans of the sentences of `text`."""
+    spans = []
+    start = 0
+    for match in SENTENCE_BOUNDARY.finditer(text):
+        spans.append((start, match.start()))
+        start = match.end()
+    spans.append((start, len(text)))
+    return [(start, end) for start, end in spans if text[start:end].strip() != ""]
+
+
+def split_into_windows(text, language, window_size=96, window_overlap=32):
+    """Splits `text` into overlapping windows of whole sentences.
+
+    Each window holds at most `window_size` units (words for English, characters for Chinese) and repeats up to
+    `window_overlap` units of trailing sentences of the previous window, so that events near a window border keep their
+    context. Sentences longer than `window_size` are cut into pieces of `window_size` units.
+
+    Returns:
+        windows (`List[Tuple[int, int]]`): Char spans of the windows in `text`.
+    """
+    units = get_units(text, language)
+    if len(units) == 0:
+        return []
+    unit_starts = [start for start, _ in units]
+    pieces = []
+    for sentence_start, sentence_end in split_sentences(text):
+        first = bisect_right(unit_starts, sentence_start - 1)
+        last = bisect_right(unit_starts, sentence_end - 1)
+        for start in range(first, last, window_size):
+            pieces.append((start, min(start + window_size, last)))
+
+    windows = []
+    i = 0
+    while i < len(pieces):
+        window_start = pieces[i][0]
+        j = i + 1
+        while j < len(pieces) and pieces[j][1] - window_start <= window_size:
+            j += 1
+        windows.append((units[window_start][0], units[pieces[j-1][1]-1][1]))
+        if j == len(pieces):
+            break
+        # the next window starts with the trailing pieces of this one, but always moves forward
+        k = j
+        while k - 1 > i and pieces[j-1][1] - pieces[k-1][0] <= window_overlap:
+            k -= 1
+        i = k
+    return windows
+
+
+def assign_triggers_to_windows(triggers, windows):
+    """Assigns every trigger `(mention, char start, char end)` to the window where it is farthest from the borders,
+    and converts its offsets to be relative to that window."""
+    window_triggers = [[] for _ in windows]
+    for mention, start, end in triggers:
+        best, best_margin = None, None
+        for i, (window_start, window_end) in enumerate(windows):
+            if start < window_start or end > window_end:
+                continue
+            margin = min(start - window_start, window_end - end)
+            if best is None or margin > best_margin:
+                best, best_margin = i, margin
+        if best is not None:
+            window_start = windows[best][0]
+            window_triggers[best].append((mention, start - window_start, end - window_start))
+    return window_triggers
+
+
+def merge_window_results(text, windows, window_results):
+    """Shifts the offsets of per-window results back to `text` and merges events found in several windows."""
+    events = {}
+    for (window_start, _), result in zip(windows, window_results):
+        for event in result["events"]:
+            offset = [event["offset"][0] + window_start, event["offset"][1] + window_start]
+            key = (event["type"], tuple(offset))
+            if key not in events:
+                events[key] = dict(event, offset=offset)
+                if "arguments" in event:
+                    events[key]["arguments"] = []
+            if "arguments" not in event:
+                continue
+            merged_arguments = events[key]["arguments"]
+            for argument in event["arguments"]:
+                argument_offset = [argument["offset"][0] + window_start, argument["offset"][1] + window_start]
+                if any(argument["role"] == merged["role"] and argument_offset == merged["offset"]
+                       for merged in merged_arguments):
+                    continue
+                merged_arguments.append(dict(argument, offset=argument_offset))
+    return {
+        "text": text,
+        "events": list(events.values())
+    }
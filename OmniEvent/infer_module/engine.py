@@ -0,0 +1,299 @@
+import time
+import asyncio
+
+from contextlib import contextmanager
+from collections import defaultdict
+
+from .batching import BatchScheduler, DeadlineExceededError
+from .cache import Uncached, make_cache_key
+from .seq2seq import (
+    SpanResolver,
+    group_by_instance,
+    get_ed_result,
+    get_eae_result,
+    prepare_for_eae_from_input,
+    prepare_for_eae_from_pred,
+    do_event_detection,
+    do_event_argument_extraction,
+    stream_event_detection,
+    supports_streaming
+)
+
+
+class StageTimer():
+    """Accumulates the seconds spent in every stage of a batch or a request, along with counts such as tokens."""
+    def __init__(self):
+        self.seconds = defaultdict(float)
+        self.counts = defaultdict(int)
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] += time.perf_counter() - start
+
+    def count(self, name, value):
+        self.counts[name] += value
+
+    def merge(self, other):
+        for name, seconds in other.seconds.items():
+            self.seconds[name] += seconds
+        for name, value in other.counts.items():
+            self.counts[name] += value
+
+    def server_timing(self):
+        """Formats the stages as a `Server-Timing` header value, in milliseconds."""
+        return ", ".join(f"{name};dur={seconds * 1000:.2f}" for name, seconds in self.seconds.items())
+
+
+def get_schema(ontology):
+    return f"<{ontology.lower()}>"
+
+
+class InferenceEngine():
+    """Runs ED, EAE and EE requests through shared batching, caching and decoding backends.
+
+    Requests are split into ED and EAE items. Items are looked up in `cache`, and the missing ones go to a
+    `BatchScheduler`, which runs concurrent items with the same model and decoding profile in one `generate()` call.
+    The backends are pluggable: `models` decides what decodes (PyTorch or ONNX models, through its `load_fn`),
+    `scheduler_fn` how items are batched, and `cache` where outputs are kept. The decoding profile, e.g. "accurate" or
+    "speculative", is chosen per request.
+
+    Unlike `infer_batch`, which runs a whole request in the calling thread, the engine serves concurrent asyncio
+    requests, with admission control and deadlines, and streams triggers as they are decoded.
+
+    Args:
+        models (`ModelManager`): Resolves and loads the ED and EAE models of every ontology.
+        scheduler_fn (`Callable`, *optional*): Called as `scheduler_fn(process)` and returns the scheduler running the
+            batches, e.g. a `functools.partial` of `BatchScheduler` with its settings. Defaults to `BatchScheduler`.
+        cache (`ResultCache`, *optional*): Cache of the ED / EAE outputs. Without it, every item is decoded.
+        on_batch (`Callable`, *optional*): Called as `on_batch(task, timer, num_items)` after every batch, with the
+            `StageTimer` of the batch.
+        on_cache_lookup (`Callable`, *optional*): Called as `on_cache_lookup(task, outcome)` for every item looked up
+            in `cache`, where `outcome` is `hit`, `shared` or `miss`, see `ResultCache.get_or_compute`.
+    """
+    def __init__(self, models, scheduler_fn=BatchScheduler, cache=None, on_batch=None, on_cache_lookup=None):
+        self.models = models
+        self.scheduler = scheduler_fn(self.run_batch)
+        self.cache = cache
+        self.on_batch = on_batch
+        self.on_cache_lookup = on_cache_lookup
+
+    def run_batch(self, key, items, deadline=None):
+        """Runs one batched pass. ED items are `(text, schema)` pairs and EAE items are instances; the results are the
+        triggers of every text, and the arguments of every trigger of every instance, respectively.
+        Every result comes with the `StageTimer` of the batch, and whether generation stopped early at `deadline`, in
+        which case the results may be truncated.
+        """
+        task, name, decoding = key
+        timer = StageTimer()
+        # the batch keeps this model even if it is swapped meanwhile
+        loaded = self.models.get(name)
+        device = getattr(loaded.model, "device", self.models.device)
+        if task == "ED":
+            texts, schemas = [item[0] for item in items], [item[1] for item in items]
+            triggers = group_by_instance(do_event_detection(loaded.model, loaded.tokenizer, texts, schemas, device,
+                                                            decoding=decoding, timer=timer, deadline=deadline))
+            # every text is the first and only one of its request
+            results = [[(0, *trigger[1:]) for trigger in triggers[i]] for i in range(len(items))]
+        elif task == "EAE":
+            arguments = do_event_argument_extraction(loaded.model, loaded.tokenizer, items, device,
+                                                     decoding=decoding, timer=timer, deadline=deadline)
+            results, start = [], 0
+            for instance in items:
+                results.append(arguments[start:start+len(instance["triggers"])])
+                start += len(instance["triggers"])
+        else:
+            raise ValueError(f"Unknown task: {task}")
+        truncated = deadline is not None and time.monotonic() >= deadline
+        if self.on_batch is not None:
+            self.on_batch(task, timer, len(items))
+        return [(result, timer, truncated) for result in results]
+
+    def get_key(self, task, ontology, decoding):
+        """Returns the scheduler key of the ED or EAE items of `ontology`."""
+        return (task, self.models.resolve(task, ontology), decoding)
+
+    async def get_fingerprint(self, name):
+        """Returns the name, path and version of the serving model of `name`, which are only known once the model is
+        loaded."""
+        if self.models.version(name) == 0:
+            loaded = await asyncio.get_running_loop().run_in_executor(None, self.models.get, name)
+        else:
+            loaded = self.models.get(name)
+        return [name, loaded.path, loaded.version]
+
+    @staticmethod
+    def get_cache_key(key, fingerprint, item):
+        """Returns the cache key of an ED or EAE item. It holds the `fingerprint` of the serving model, so that the
+        outputs of a swapped-out model are not served anymore."""
+        task, _, decoding = key
+        if task == "ED":
+            text, schema = item
+            return make_cache_key(text, schema, task, fingerprint, decoding=decoding)
+        triggers = [(trigger["mention"], trigger["offset"], trigger.get("type")) for trigger in item["triggers"]]
+        return make_cache_key(item["text"], item["schema"], task, fingerprint, triggers, decoding)
+
+    async def submit(self, key, items, timer=None, deadline=None, block=False):
+        """Returns the results of `items`, from the cache or from the scheduler, and adds the stages of the batches
+        they ran in to `timer`. Items that identical concurrent requests are already computing are not submitted
+        again, and results truncated by `deadline` are not cached."""
+        items = list(items)
+        if len(items) == 0:
+            return []
+
+        async def compute(indices):
+            outputs = await self.scheduler.submit(key, [items[i] for i in indices], deadline, block)
+            if timer is not None:
+                for batch_timer in {id(batch_timer): batch_timer for _, batch_timer, _ in outputs}.values():
+                    timer.merge(batch_timer)
+            return [Uncached(result) if truncated else result for result, _, truncated in outputs]
+
+        if self.cache is None:
+            return [value.value if isinstance(value, Uncached) else value for value in await compute(range(len(items)))]
+        fingerprint = await self.get_fingerprint(key[1])
+        try:
+            keys = [self.get_cache_key(key, fingerprint, item) for item in items]
+            on_lookup = None
+            if self.on_cache_lookup is not None:
+                on_lookup = lambda outcome: self.on_cache_lookup(key[0], outcome)
+            return await self.cache.get_or_compute(keys, compute, deadline, on_lookup)
+        except asyncio.TimeoutError:
+            raise DeadlineExceededError("The request deadline passed before its results were ready")
+
+    async def run(self, texts, task="ED", ontology="ace", triggers=None, decoding="accurate", timer=None,
+                  deadline=None, block=False):
+        """Runs ED, EAE or EE over `texts`, in batches with concurrent requests, and returns the result of every text,
+        as `infer` does.
+
+        Args:
+            texts (`List[str]`): Texts sharing `ontology`.
+            task (`str`): Selected in ["ED", "EAE", "EE"].
+            triggers (`List[List[Tuple]]`, *optional*): The `(mention, char start, char end)` triggers of every text,
+                for EAE.
+            timer (`StageTimer`, *optional*): Receives the stages of the batches the texts ran in, and the time spent
+                mapping mentions to offsets as the `offsets` stage.
+            deadline (`float`, *optional*): `time.monotonic()` value after which the results are not waited for,
+                and generation stops.
+            block (`bool`): Whether to wait for a free slot when the scheduler queue is full, instead of raising
+                `QueueFullError`.
+
+        Raises `DeadlineExceededError` if `deadline` passes before the results are ready.
+        """
+        timer = timer if timer is not None else StageTimer()
+        schemas = [get_schema(ontology)] * len(texts)
+        ed_key = self.get_key("ED", ontology, decoding)
+        if task == "ED":
+            events = await self.submit(ed_key, zip(texts, schemas), timer, deadline, block)
+            with timer.stage("offsets"):
+                return [get_ed_result([text], events_in_text)[0] for text, events_in_text in zip(texts, events)]
+        elif task == "EAE":
+            instances = prepare_for_eae_from_input(texts, triggers, schemas)
+        elif task == "EE":
+            events = await self.submit(ed_key, zip(texts, schemas), timer, deadline, block)
+            instances = [prepare_for_eae_from_pred([text], events_in_text, [schema])[0]
+                         for text, events_in_text, schema in zip(texts, events, schemas)]
+        else:
+            raise ValueError(f"Unknown task: {task}")
+        # instances without triggers have no arguments to extract
+        with_triggers = [instance for instance in instances if len(instance["triggers"]) > 0]
+        eae_key = self.get_key("EAE", ontology, decoding)
+        arguments = iter(await self.submit(eae_key, with_triggers, timer, deadline, block))
+        with timer.stage("offsets"):
+            return [get_eae_result([instance], next(arguments) if len(instance["triggers"]) > 0 else [])[0]
+                    for instance in instances]
+
+    async def iter_triggers(self, key, text, schema, deadline=None):
+        """Yields the triggers of `text` in batches, as soon as they are decoded. Cached triggers come in one batch, and
+        so do the triggers of models that do not stream, which run like in `run`."""
+        task, name, decoding = key
+        fingerprint = await self.get_fingerprint(name)
+        if not supports_streaming(self.models.get(name).model):
+            yield (await self.submit(key, [(text, schema)], deadline=deadline))[0]
+            return
+        # streamed triggers are decoded greedily, and do not share the cache entries of the profile
+        cache_key = self.get_cache_key((task, name, ("greedy-stream", decoding)), fingerprint, (text, schema))
+        triggers = self.cache.get(cache_key) if self.cache is not None else None
+        if triggers is not None:
+            yield triggers
+            return
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+
+        def run():
+            loaded = self.models.get(name)
+            device = getattr(loaded.model, "device", self.models.device)
+            return stream_event_detection(loaded.model, loaded.tokenizer, text, schema,
+                                          lambda triggers: loop.call_soon_threadsafe(queue.put_nowait, triggers),
+                                          device, decoding=decoding, deadline=deadline)
+
+        # decoding runs between batches, and the triggers reach the queue before the end of the work
+        work = asyncio.ensure_future(self.scheduler.run_exclusive(run))
+        work.add_done_callback(lambda _: queue.put_nowait(None))
+        triggers = await queue.get()
+        while triggers is not None:
+            yield triggers
+            triggers = await queue.get()
+        triggers = await work
+        # triggers cut short by the deadline are not cached
+        if self.cache is not None and (deadline is None or time.monotonic() < deadline):
+            self.cache.set(cache_key, triggers)
+
+    async def stream(self, text, task="ED", ontology="ace", triggers=None, decoding="accurate", deadline=None):
+        """Yields the messages of a streamed request: every trigger as soon as ED decodes it, then the arguments of
+        every trigger as soon as its EAE batch finishes, and finally the whole result, as `run` returns it.
+
+        Every message has an `event` field: `trigger` (with the `index` of the trigger, its `type`, `trigger` and
+        `offset`), `arguments` (with the `index` of the trigger and its `arguments`) or `done` (with the `text` and
+        its `events`). Errors are raised.
+        """
+        schema = get_schema(ontology)
+        eae_key = self.get_key("EAE", ontology, decoding)
+        tasks = {}
+
+        async def extract_arguments(index, instance):
+            arguments = (await self.submit(eae_key, [instance], deadline=deadline))[0]
+            return index, get_eae_result([instance], arguments)[0]["events"][0]["arguments"]
+
+        try:
+            if task == "EAE":
+                triggers = prepare_for_eae_from_input([text], [triggers], [schema])[0]["triggers"]
+            elif task in ["ED", "EE"]:
+                ed_key = self.get_key("ED", ontology, decoding)
+                triggers = []
+                span_resolver, position = SpanResolver(text), 0
+                async for new_triggers in self.iter_triggers(ed_key, text, schema, deadline):
+                    for _, type, mention in new_triggers:
+                        offset = span_resolver.resolve(mention, position, forward=True)
+                        if offset is None:
+                            continue
+                        position = offset[0]
+                        trigger = {"type": type, "mention": mention, "offset": offset}
+                        yield {"event": "trigger", "index": len(triggers), "type": type, "trigger": mention,
+                               "offset": offset}
+                        if task == "EE":
+                            # EAE requests queue up while ED decodes, and run in one batch
+                            instance = {"text": text, "schema": schema, "triggers": [trigger]}
+                            tasks[len(triggers)] = asyncio.ensure_future(extract_arguments(len(triggers), instance))
+                        triggers.append(trigger)
+            else:
+                raise ValueError(f"Unknown task: {task}")
+            if task == "EAE":
+                for index, trigger in enumerate(triggers):
+                    instance = {"text": text, "schema": schema, "triggers": [trigger]}
+                    tasks[index] = asyncio.ensure_future(extract_arguments(index, instance))
+            events = [{"type": trigger.get("type", "NA"), "offset": trigger["offset"], "trigger": trigger["mention"]}
+                      for trigger in triggers]
+            for future in asyncio.as_completed(list(tasks.values())):
+                index, arguments = await future
+                events[index]["arguments"] = arguments
+                yield {"event": "arguments", "index": index, "arguments": arguments}
+            yield {"event": "done", "text": text, "events": events}
+        finally:
+            for future in tasks.values():
+                future.cancel()
+
+    async def stop(self):
+        await self.scheduler.stop()
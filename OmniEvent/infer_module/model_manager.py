@@ -0,0 +1,116 @@
+import time
+import logging
+import threading
+
+
+logger = logging.getLogger(__name__)
+
+
+def load_model(path, device):
+    # imported here, since `infer` imports the inference modules
+    from ..infer import load_pretrained
+    return load_pretrained(path, device)
+
+
+class LoadedModel():
+    """A loaded checkpoint. Batches hold on to it while they run, so a swapped-out model serves them to the end."""
+    def __init__(self, name, path, model, tokenizer, version):
+        self.name = name
+        self.path = path
+        self.model = model
+        self.tokenizer = tokenizer
+        self.version = version
+        self.loaded_at = time.time()
+
+    def status(self):
+        return {
+            "name": self.name,
+            "path": self.path,
+            "version": self.version,
+            "loaded_at": self.loaded_at
+        }
+
+
+class ModelManager():
+    """Loads models on first use, and swaps checkpoints without interrupting requests.
+
+    Models are named `ED` and `EAE`, optionally specialized per ontology as `ED:<ontology>` / `EAE:<ontology>`. A model
+    is loaded by the first request that needs it, or ahead of time by `preload`. `swap` loads the new checkpoint next
+    to the serving one and replaces it in a single assignment: batches that already got the old model finish on it,
+    and later ones get the new one.
+
+    Unlike `ModelRegistry`, which shares models by path, models are served under stable names whose checkpoint can
+    change, and every load gets a new version, which `InferenceEngine` uses to tell cached results of different
+    checkpoints apart.
+
+    Args:
+        paths (`Dict[str, str]`): Checkpoint path of every model name.
+        device: Device the models are placed on.
+        load_fn (`Callable`): Called as `load_fn(path, device)` and returns a `(model, tokenizer)` pair, e.g. an
+            `OnnxSeq2SeqModel` and its tokenizer. Defaults to `load_pretrained`.
+    """
+    def __init__(self, paths, device, load_fn=load_model):
+        self.paths = dict(paths)
+        self.device = device
+        self.load_fn = load_fn
+        self._models = {}
+        self._version = 0
+        self._lock = threading.Lock()
+        # one lock per model name, so that a model is loaded once, while other models keep serving
+        self._load_locks = {}
+
+    def resolve(self, task, ontology):
+        """Returns the name of the model serving `task` ("ED" or "EAE") for `ontology`."""
+        name = f"{task}:{ontology.lower()}"
+        return name if name in self.paths else task
+
+    def _get_load_lock(self, name):
+        with self._lock:
+            return self._load_locks.setdefault(name, threading.Lock())
+
+    def _load(self, name, path):
+        logger.info(f"Loading {name} from {path}")
+        model, tokenizer = self.load_fn(path, self.device)
+        with self._lock:
+            self._version += 1
+            return LoadedModel(name, path, model, tokenizer, self._version)
+
+    def get(self, name):
+        """Returns the serving `LoadedModel` of `name`, loading it if needed."""
+        loaded = self._models.get(name)
+        if loaded is not None:
+            return loaded
+        if name not in self.paths:
+            raise KeyError(f"Unknown model: {name}")
+        with self._get_load_lock(name):
+            if name not in self._models:
+                self._models[name] = self._load(name, self.paths[name])
+            return self._models[name]
+
+    def version(self, name):
+        """Returns the version of the serving model of `name`, or `0` if it is not loaded yet."""
+        loaded = self._models.get(name)
+        return loaded.version if loaded is not None else 0
+
+    def swap(self, name, path):
+        """Loads the checkpoint at `path` and makes it the serving model of `name`."""
+        with self._get_load_lock(name):
+            loaded = self._load(name, path)
+            with self._lock:
+                self.paths[name] = path
+                self._models[name] = loaded
+        logger.info(f"Swapped {name} to {path} (version {loaded.version})")
+        return loaded
+
+    def preload(self, names):
+        for name in names:
+            try:
+                self.get(name)
+            except Exception:
+                logger.exception(f"Failed to preload {name}")
+
+    def status(self):
+        return {
+            name: self._models[name].status() if name in self._models else {"name": name, "path": path}
+            for name, path in dict(self.paths).items()
+        }
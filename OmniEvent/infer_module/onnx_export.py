@@ -0,0 +1,161 @@
+import os
+import json
+import inspect
+import argparse
+
+import torch
+
+
+ENCODER_FILE = "encoder.onnx"
+DECODER_FILE = "decoder_step.onnx"
+CONFIG_FILE = "onnx_config.json"
+
+
+def get_export_kwargs(opset_version):
+    kwargs = {"opset_version": opset_version}
+    # recent versions of PyTorch default to the dynamo exporter, while the graphs are traced with the TorchScript one
+    if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+        kwargs["dynamo"] = False
+    return kwargs
+
+
+class EncoderGraph(torch.nn.Module):
+    """Encodes the input and projects it to the cross-attention keys and values of every decoder layer, which stay
+    fixed during decoding."""
+    def __init__(self, model):
+        super().__init__()
+        self.encoder = model.get_encoder()
+        self.decoder = model.get_decoder()
+        self.num_heads = model.config.num_heads
+        self.d_kv = model.config.d_kv
+
+    def forward(self, input_ids, attention_mask):
+        hidden_states = self.encoder(input_ids=input_ids, attention_mask=attention_mask, return_dict=True)[0]
+        outputs = [hidden_states]
+        for block in self.decoder.block:
+            attention = block.layer[1].EncDecAttention
+            for projection in [attention.k, attention.v]:
+                states = projection(hidden_states).view(hidden_states.shape[0], -1, self.num_heads, self.d_kv)
+                outputs.append(states.transpose(1, 2))
+        return tuple(outputs)
+
+
+class DecoderStepGraph(torch.nn.Module):
+    """Runs one decoding step: takes the last token and the self-attention cache, and returns the next-token logits
+    and the extended cache."""
+    def __init__(self, model):
+        super().__init__()
+        self.decoder = model.get_decoder()
+        self.lm_head = model.get_output_embeddings()
+        self.tie_word_embeddings = model.config.tie_word_embeddings
+        self.model_dim = model.config.d_model
+        self.num_layers = model.config.num_decoder_layers
+
+    def forward(self, decoder_input_ids, encoder_hidden_states, encoder_attention_mask, *cache):
+        self_cache, cross_cache = cache[:2*self.num_layers], cache[2*self.num_layers:]
+        past_key_values = tuple(
+            (self_cache[2*i], self_cache[2*i+1], cross_cache[2*i], cross_cache[2*i+1])
+            for i in range(self.num_layers)
+        )
+        outputs = self.decoder(input_ids=decoder_input_ids,
+                               encoder_hidden_states=encoder_hidden_states,
+                               encoder_attention_mask=encoder_attention_mask,
+                               past_key_values=past_key_values,
+                               use_cache=True,
+                               return_dict=True)
+        hidden_states = outputs.last_hidden_state[:, -1]
+        if self.tie_word_embeddings:
+            hidden_states = hidden_states * (self.model_dim ** -0.5)
+        logits = self.lm_head(hidden_states)
+        present = []
+        for layer_cache in outputs.past_key_values:
+            present.extend(layer_cache[:2])
+        return (logits, *present)
+
+
+def export_onnx(model, output_dir, tokenizer=None, opset_version=14):
+    """Exports a `MT5ForConditionalGeneration` model into an encoder graph and a decoder-step graph with a KV cache.
+
+    The graphs are consumed by `OnnxSeq2SeqModel`. The tokenizer, if given, is saved next to them, so that the output
+    directory can be loaded like a model directory.
+
+    Args:
+        model (`MT5ForConditionalGeneration`): Model to export.
+        output_dir (`str`): Directory the graphs are written to.
+        tokenizer (`PreTrainedTokenizer`, *optional*): Tokenizer of the model.
+        opset_version (`int`): ONNX opset version.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    model = model.to("cpu", dtype=torch.float32).eval()
+    config = model.config
+    num_layers = config.num_decoder_layers
+    batch_size, input_length, past_length = 2, 8, 3
+
+    input_ids = torch.ones(batch_size, input_length, dtype=torch.long)
+    attention_mask = torch.ones(batch_size, input_length, dtype=torch.long)
+    cache_names = [f"{kind}.{i}" for i in range(num_layers) for kind in ["key", "value"]]
+    # the wrappers share their modules with `model`, and the exporter restores their training mode afterwards
+    encoder = EncoderGraph(model).eval()
+    decoder = DecoderStepGraph(model).eval()
+    with torch.no_grad():
+        encoder_outputs = encoder(input_ids, attention_mask)
+        torch.onnx.export(
+            encoder,
+            (input_ids, attention_mask),
+            os.path.join(output_dir, ENCODER_FILE),
+            input_names=["input_ids", "attention_mask"],
+            output_names=["encoder_hidden_states", *[f"cross_{name}" for name in cache_names]],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "input_length"},
+                "attention_mask": {0: "batch", 1: "input_length"},
+                "encoder_hidden_states": {0: "batch", 1: "input_length"},
+                **{f"cross_{name}": {0: "batch", 2: "input_length"} for name in cache_names}
+            },
+            **get_export_kwargs(opset_version)
+        )
+
+        decoder_input_ids = torch.zeros(batch_size, 1, dtype=torch.long)
+        self_cache = [torch.zeros(batch_size, config.num_heads, past_length, config.d_kv) for _ in cache_names]
+        torch.onnx.export(
+            decoder,
+            (decoder_input_ids, encoder_outputs[0], attention_mask, *self_cache, *encoder_outputs[1:]),
+            os.path.join(output_dir, DECODER_FILE),
+            input_names=["decoder_input_ids", "encoder_hidden_states", "encoder_attention_mask",
+                         *[f"past_{name}" for name in cache_names], *[f"cross_{name}" for name in cache_names]],
+            output_names=["logits", *[f"present_{name}" for name in cache_names]],
+            dynamic_axes={
+                "decoder_input_ids": {0: "batch"},
+                "encoder_hidden_states": {0: "batch", 1: "input_length"},
+                "encoder_attention_mask": {0: "batch", 1: "input_length"},
+                **{f"past_{name}": {0: "batch", 2: "past_length"} for name in cache_names},
+                **{f"cross_{name}": {0: "batch", 2: "input_length"} for name in cache_names},
+                "logits": {0: "batch"},
+                **{f"present_{name}": {0: "batch", 2: "present_length"} for name in cache_names}
+            },
+            **get_export_kwargs(opset_version)
+        )
+
+    with open(os.path.join(output_dir, CONFIG_FILE), "w", encoding="utf-8") as f:
+        json.dump({
+            "num_layers": num_layers,
+            "num_heads": config.num_heads,
+            "d_kv": config.d_kv,
+            "decoder_start_token_id": config.decoder_start_token_id,
+            "eos_token_id": config.eos_token_id,
+            "pad_token_id": config.pad_token_id
+        }, f, indent=2)
+    if tokenizer is not None:
+        tokenizer.save_pretrained(output_dir)
+
+
+if __name__ == "__main__":
+    from ..infer import get_pretrained
+
+    arg_parser = argparse.ArgumentParser(description="Export a Seq2Seq model to ONNX encoder / decoder-step graphs.")
+    arg_parser.add_argument("--model", type=str, default="s2s-mt5-ed")
+    arg_parser.add_argument("--output_dir", type=str, required=True)
+    arg_parser.add_argument("--opset_version", type=int, default=14)
+    args = arg_parser.parse_args()
+
+    model, tokenizer = get_pretrained(args.model, "cpu", use_registry=False)
+    export_onnx(model, args.output_dir, tokenizer, args.opset_version)
@@ -0,0 +1,208 @@
+import os
+import json
+
+import numpy as np
+import torch
+
+from .onnx_export import ENCODER_FILE, DECODER_FILE, CONFIG_FILE
+
+
+def log_softmax(logits):
+    logits = logits - logits.max(axis=-1, keepdims=True)
+    return logits - np.log(np.exp(logits).sum(axis=-1, keepdims=True))
+
+
+class BeamHypotheses():
+    """Finished hypotheses of one input, scored like `transformers` beam search without early stopping."""
+    def __init__(self, num_beams, length_penalty):
+        self.num_beams = num_beams
+        self.length_penalty = length_penalty
+        self.beams = []
+        self.worst_score = 1e9
+
+    def add(self, tokens, sum_logprobs, generated_length):
+        score = sum_logprobs / (generated_length ** self.length_penalty)
+        if len(self.beams) < self.num_beams or score > self.worst_score:
+            self.beams.append((score, tokens))
+            if len(self.beams) > self.num_beams:
+                sorted_scores = sorted([(s, i) for i, (s, _) in enumerate(self.beams)])
+                del self.beams[sorted_scores[0][1]]
+                self.worst_score = sorted_scores[1][0]
+            else:
+                self.worst_score = min(score, self.worst_score)
+
+    def is_done(self, best_sum_logprobs, generated_length):
+        if len(self.beams) < self.num_beams:
+            return False
+        return self.worst_score >= best_sum_logprobs / (generated_length ** self.length_penalty)
+
+    def best(self):
+        return sorted(self.beams, key=lambda beam: beam[0])[-1][1]
+
+
+class OnnxSeq2SeqModel():
+    """Greedy / beam search over the graphs written by `export_onnx`, without the `transformers` generation stack.
+
+    Exposes the subset of `generate()` used by `do_event_detection` and `do_event_argument_extraction`, so it can be
+    passed to them in place of the PyTorch model, and produces the same sequences as `generate()` up to floating point
+    differences between the runtimes.
+
+    Args:
+        encoder_session (`onnxruntime.InferenceSession`): Session of the encoder graph.
+        decoder_session (`onnxruntime.InferenceSession`): Session of the decoder-step graph.
+        config (`Dict`): Contents of the exported `onnx_config.json`.
+    """
+    # constrained decoding and streaming need logits processors, which the search loops do not run
+    supports_logits_processor = False
+
+    def __init__(self, encoder_session, decoder_session, config):
+        self.encoder_session = encoder_session
+        self.decoder_session = decoder_session
+        self.config = config
+        self.num_layers = config["num_layers"]
+        self.fingerprint = config.get("fingerprint")
+
+    @classmethod
+    def from_pretrained(cls, path, num_threads=None, providers=("CPUExecutionProvider",)):
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads is not None:
+            options.intra_op_num_threads = num_threads
+        with open(os.path.join(path, CONFIG_FILE), "r", encoding="utf-8") as f:
+            config = json.load(f)
+        config.setdefault("fingerprint", os.path.abspath(path))
+        encoder_session = onnxruntime.InferenceSession(os.path.join(path, ENCODER_FILE), options,
+                                                       providers=list(providers))
+        decoder_session = onnxruntime.InferenceSession(os.path.join(path, DECODER_FILE), options,
+                                                       providers=list(providers))
+        return cls(encoder_session, decoder_session, config)
+
+    def encode(self, input_ids, attention_mask):
+        outputs = self.encoder_session.run(None, {"input_ids": input_ids, "attention_mask": attention_mask})
+        return outputs[0], outputs[1:]
+
+    def decode_step(self, decoder_input_ids, encoder_hidden_states, attention_mask, self_cache, cross_cache):
+        feeds = {
+            "decoder_input_ids": decoder_input_ids,
+            "encoder_hidden_states": encoder_hidden_states,
+            "encoder_attention_mask": attention_mask
+        }
+        for i in range(self.num_layers):
+            for j, kind in enumerate(["key", "value"]):
+                feeds[f"past_{kind}.{i}"] = self_cache[2*i+j]
+                feeds[f"cross_{kind}.{i}"] = cross_cache[2*i+j]
+        outputs = self.decoder_session.run(None, feeds)
+        return outputs[0], outputs[1:]
+
+    def empty_cache(self, batch_size):
+        shape = (batch_size, self.config["num_heads"], 0, self.config["d_kv"])
+        return [np.zeros(shape, dtype=np.float32) for _ in range(2 * self.num_layers)]
+
+    def generate(self, input_ids, attention_mask=None, num_beams=1, max_length=128, length_penalty=1.0,
+                 prefix_allowed_tokens_fn=None, logits_processor=None, **kwargs):
+        if prefix_allowed_tokens_fn is not None or logits_processor is not None:
+            raise NotImplementedError("Constrained decoding is not supported by the ONNX runtime.")
+        device = input_ids.device
+        input_ids = input_ids.cpu().numpy().astype(np.int64)
+        if attention_mask is None:
+            attention_mask = np.ones_like(input_ids)
+        else:
+            attention_mask = attention_mask.cpu().numpy().astype(np.int64)
+        if num_beams == 1:
+            sequences = self.greedy_search(input_ids, attention_mask, max_length)
+        else:
+            sequences = self.beam_search(input_ids, attention_mask, num_beams, max_length, length_penalty)
+        return torch.from_numpy(sequences).to(device)
+
+    def greedy_search(self, input_ids, attention_mask, max_length):
+        eos_token_id, pad_token_id = self.config["eos_token_id"], self.config["pad_token_id"]
+        batch_size = input_ids.shape[0]
+        encoder_hidden_states, cross_cache = self.encode(input_ids, attention_mask)
+        self_cache = self.empty_cache(batch_size)
+        sequences = np.full((batch_size, 1), self.config["decoder_start_token_id"], dtype=np.int64)
+        unfinished = np.ones(batch_size, dtype=bool)
+        while sequences.shape[1] < max_length:
+            logits, self_cache = self.decode_step(sequences[:, -1:], encoder_hidden_states, attention_mask,
+                                                  self_cache, cross_cache)
+            next_tokens = np.where(unfinished, logits.argmax(axis=-1), pad_token_id)
+            sequences = np.concatenate([sequences, next_tokens[:, None]], axis=1)
+            unfinished &= next_tokens != eos_token_id
+            if not unfinished.any():
+                break
+        return sequences
+
+    def beam_search(self, input_ids, attention_mask, num_beams, max_length, length_penalty=1.0):
+        eos_token_id, pad_token_id = self.config["eos_token_id"], self.config["pad_token_id"]
+        batch_size = input_ids.shape[0]
+        encoder_hidden_states, cross_cache = self.encode(input_ids, attention_mask)
+        # every input is encoded once, and its states are repeated once per beam
+        encoder_hidden_states = np.repeat(encoder_hidden_states, num_beams, axis=0)
+        cross_cache = [np.repeat(cache, num_beams, axis=0) for cache in cross_cache]
+        attention_mask = np.repeat(attention_mask, num_beams, axis=0)
+        self_cache = self.empty_cache(batch_size * num_beams)
+        sequences = np.full((batch_size * num_beams, 1), self.config["decoder_start_token_id"], dtype=np.int64)
+        # only the first beam is live at the start, so that the beams do not all pick the same tokens
+        beam_scores = np.zeros((batch_size, num_beams), dtype=np.float32)
+        beam_scores[:, 1:] = -1e9
+        beam_scores = beam_scores.reshape(-1)
+        hypotheses = [BeamHypotheses(num_beams, length_penalty) for _ in range(batch_size)]
+        done = [False] * batch_size
+
+        while True:
+            logits, self_cache = self.decode_step(sequences[:, -1:], encoder_hidden_states, attention_mask,
+                                                  self_cache, cross_cache)
+            vocab_size = logits.shape[-1]
+            scores = log_softmax(logits.astype(np.float32)) + beam_scores[:, None]
+            scores = scores.reshape(batch_size, num_beams * vocab_size)
+            # keep 2 candidates per beam, so that enough non-EOS candidates are left
+            candidates = np.argpartition(-scores, 2 * num_beams, axis=1)[:, :2 * num_beams]
+            candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+            order = np.argsort(-candidate_scores, axis=1, kind="stable")
+            candidates = np.take_along_axis(candidates, order, axis=1)
+            candidate_scores = np.take_along_axis(candidate_scores, order, axis=1)
+
+            generated_length = sequences.shape[1]
+            next_scores = np.zeros((batch_size, num_beams), dtype=np.float32)
+            next_tokens = np.full((batch_size, num_beams), pad_token_id, dtype=np.int64)
+            next_indices = np.zeros((batch_size, num_beams), dtype=np.int64)
+            for i in range(batch_size):
+                if done[i]:
+                    continue
+                num_kept = 0
+                for rank, (candidate, score) in enumerate(zip(candidates[i], candidate_scores[i])):
+                    beam, token = i * num_beams + candidate // vocab_size, candidate % vocab_size
+                    if token == eos_token_id:
+                        if rank < num_beams:
+                            hypotheses[i].add(sequences[beam].copy(), float(score), generated_length)
+                    else:
+                        next_scores[i, num_kept] = score
+                        next_tokens[i, num_kept] = token
+                        next_indices[i, num_kept] = beam
+                        num_kept += 1
+                    if num_kept == num_beams:
+                        break
+                done[i] = hypotheses[i].is_done(float(candidate_scores[i].max()), generated_length)
+
+            beam_scores = next_scores.reshape(-1)
+            beam_indices = next_indices.reshape(-1)
+            sequences = np.concatenate([sequences[beam_indices], next_tokens.reshape(-1, 1)], axis=1)
+            self_cache = [cache[beam_indices] for cache in self_cache]
+            if all(done) or sequences.shape[1] >= max_length:
+                break
+
+        for i in range(batch_size):
+            if done[i]:
+                continue
+            for beam in range(i * num_beams, (i + 1) * num_beams):
+                hypotheses[i].add(sequences[beam], float(beam_scores[beam]), sequences.shape[1])
+        best = [hypothesis.best() for hypothesis in hypotheses]
+        # EOS is appended to the hypotheses that fit
+        output_length = min(max(len(tokens) for tokens in best) + 1, max_length)
+        outputs = np.full((batch_size, output_length), pad_token_id, dtype=np.int64)
+        for i, tokens in enumerate(best):
+            outputs[i, :len(tokens)] = tokens
+            if len(tokens) < output_length:
+                outputs[i, len(tokens)] = eos_token_id
+        return outputs
@@ -0,0 +1,65 @@
+import queue
+import threading
+import contextlib
+
+
+_DONE = object()
+
+
+class PipelinedExecutor():
+    """Overlaps two dependent stages over a sequence of batches.
+
+    A worker thread runs `first_stage` on batch k+1 while the calling thread runs `second_stage` on the output for batch
+    k, so the total time approaches the slower of the two stages instead of their sum. PyTorch releases the GIL inside
+    its kernels, which is what lets the two `generate()` calls overlap.
+
+    Args:
+        first_stage (`Callable`): Called on every input batch in the worker thread.
+        second_stage (`Callable`): Called on every output of `first_stage` in the calling thread.
+        queue_size (`int`): Number of finished first-stage batches allowed to wait for the second stage.
+        first_stage_context (`Callable`, *optional*): Returns a context manager entered by the worker thread, e.g. a
+            dedicated `torch.cuda.stream`.
+    """
+    def __init__(self, first_stage, second_stage, queue_size=2, first_stage_context=None):
+        self.first_stage = first_stage
+        self.second_stage = second_stage
+        self.queue_size = queue_size
+        self.first_stage_context = first_stage_context or contextlib.nullcontext
+
+    def _produce(self, batches, outputs, stop):
+        try:
+            with self.first_stage_context():
+                for batch in batches:
+                    if stop.is_set():
+                        break
+                    outputs.put(self.first_stage(batch))
+        except BaseException as e:
+            outputs.put(e)
+        finally:
+            outputs.put(_DONE)
+
+    def run(self, batches):
+        """Returns the second-stage outputs for `batches`, in order."""
+        outputs = queue.Queue(maxsize=self.queue_size)
+        stop = threading.Event()
+        worker = threading.Thread(target=self._produce, args=(batches, outputs, stop), daemon=True)
+        worker.start()
+        results = []
+        try:
+            while True:
+                output = outputs.get()
+                if output is _DONE:
+                    break
+                if isinstance(output, BaseException):
+                    raise output
+                results.append(self.second_stage(output))
+        finally:
+            stop.set()
+            # unblock the worker if it waits on a full queue
+            while worker.is_alive():
+                try:
+                    outputs.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            worker.join()
+        return results
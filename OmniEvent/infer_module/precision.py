@@ -0,0 +1,46 @@
+import logging
+
+import torch
+
+
+logger = logging.getLogger(__name__)
+
+
+PRECISIONS = ["fp32", "bf16", "int8"]
+
+
+def is_bf16_supported(device):
+    device = torch.device(device)
+    if device.type == "cuda":
+        return torch.cuda.is_bf16_supported()
+    if device.type == "cpu":
+        # bf16 matmuls are only fast with native (AVX512-BF16 / AMX) support, and emulated otherwise
+        return hasattr(torch.ops.mkldnn, "_is_mkldnn_bf16_supported") and torch.ops.mkldnn._is_mkldnn_bf16_supported()
+    return False
+
+
+def get_precision_dtype(precision, device):
+    """Maps a precision name to the dtype the model is loaded with, which also keys the loaded model in the registry.
+
+    `int8` maps to `torch.qint8`, i.e. dynamic int8 quantization of the Linear layers, and is only available on CPU.
+    `bf16` falls back to fp32 on devices without native bf16 support.
+    """
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision: {precision}. Selected in {PRECISIONS}")
+    if precision == "fp32":
+        return None
+    elif precision == "bf16":
+        if not is_bf16_supported(device):
+            logger.warning(f"bf16 is not supported on {device}, falling back to fp32.")
+            return None
+        return torch.bfloat16
+    elif precision == "int8":
+        if torch.device(device).type != "cpu":
+            raise ValueError("int8 precision is only supported on CPU.")
+        return torch.qint8
+
+
+def quantize_dynamic_int8(model):
+    """Replaces the Linear layers of `model` with dynamically quantized int8 ones. Weights are quantized once, and
+    activations are quantized on the fly, so no calibration data is needed."""
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
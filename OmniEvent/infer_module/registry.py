@@ -0,0 +1,95 @@
+import copy
+import weakref
+import threading
+
+from collections import OrderedDict
+
+
+class ModelRegistry():
+    """Process-wide cache of loaded `(model, tokenizer)` pairs.
+
+    Entries are keyed by `(model name, device, dtype)` and evicted in least-recently-used order once more than
+    `max_models` are loaded. Loading is guarded by a per-key lock, so concurrent callers asking for the same model wait
+    for a single load instead of loading it several times, while different models load in parallel.
+
+    Args:
+        max_models (`int`): Maximum number of models kept alive. `None` disables eviction.
+    """
+    def __init__(self, max_models=4):
+        self.max_models = max_models
+        self._entries = OrderedDict()
+        self._key_locks = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @staticmethod
+    def make_key(model_name_or_path, device, dtype=None):
+        return (model_name_or_path, str(device), str(dtype) if dtype is not None else None)
+
+    def _get_key_lock(self, key):
+        with self._lock:
+            if key not in self._key_locks:
+                self._key_locks[key] = threading.Lock()
+            return self._key_locks[key]
+
+    def get(self, model_name_or_path, device, dtype, loader):
+        """Returns the cached entry, calling `loader(model_name_or_path, device, dtype)` on a miss."""
+        key = self.make_key(model_name_or_path, device, dtype)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+        with self._get_key_lock(key):
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    return self._entries[key]
+            entry = loader(model_name_or_path, device, dtype)
+            with self._lock:
+                self._entries[key] = entry
+                self._evict()
+        return entry
+
+    def local_copy(self, value):
+        """Returns the calling thread's copy of `value`, made on its first use in the thread.
+
+        Fast tokenizers are not thread-safe: encoding with truncation or padding mutates their Rust state, so
+        concurrent calls on one shared tokenizer fail with "Already borrowed". Copies are dropped along with `value`.
+        """
+        copies = getattr(self._local, "copies", None)
+        if copies is None:
+            copies = self._local.copies = weakref.WeakKeyDictionary()
+        if value not in copies:
+            copies[value] = copy.deepcopy(value)
+        return copies[value]
+
+    def _evict(self):
+        if self.max_models is None:
+            return
+        while len(self._entries) > self.max_models:
+            key, _ = self._entries.popitem(last=False)
+            self._key_locks.pop(key, None)
+
+    def unload(self, model_name_or_path=None, device=None, dtype=None):
+        """Drops matching entries. Arguments left as `None` match every entry. Returns the number of dropped entries."""
+        with self._lock:
+            keys = [key for key in self._entries
+                    if (model_name_or_path is None or key[0] == model_name_or_path)
+                    and (device is None or key[1] == str(device))
+                    and (dtype is None or key[2] == str(dtype))]
+            for key in keys:
+                del self._entries[key]
+                self._key_locks.pop(key, None)
+        return len(keys)
+
+    def keys(self):
+        with self._lock:
+            return list(self._entries.keys())
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
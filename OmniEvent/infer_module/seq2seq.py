@@ -1,8 +1,13 @@
 import re 
+import time
 import torch 
 
+from bisect import bisect_left
+from contextlib import nullcontext
 from collections import defaultdict
+from transformers import LogitsProcessor, LogitsProcessorList, StoppingCriteria, StoppingCriteriaList
 from .io_format import Result, Event
+from .speculative import speculative_greedy_search
 
 
 split_word = ":"
@@ -17,98 +22,99 @@ def get_words(text, language):
     return words
 
 
-class EDProcessor():
-    def __init__(self, tokenizer, max_seq_length=160):
-        self.tokenizer = tokenizer 
-        self.max_seq_length = max_seq_length
+def get_language(schema):
+    if schema in ["<duee>", "<fewfc>", "<leven>"]:
+        return "Chinese"
+    return "English"
 
-    def tokenize_per_instance(self, text, schema):
-        if schema in ["<duee>", "<fewfc>", "<leven>"]:
-            words = get_words(schema+text, "Chinese")
-        else:
-            words = get_words(schema+text, "English")
-        input_context = self.tokenizer(words,
-                                       truncation=True,
-                                       padding="max_length",
-                                       max_length=self.max_seq_length,
-                                       is_split_into_words=True)
-        return dict(
-            input_ids=torch.tensor(input_context["input_ids"], dtype=torch.long),
-            attention_mask=torch.tensor(input_context["attention_mask"], dtype=torch.float32)
-        )
 
+def get_length_buckets(lengths, batch_size=None, sort_by_length=False):
+    """Splits row indices into batches of at most `batch_size` rows.
 
-    def tokenize(self, texts, schemas, device):
-        batch = []
-        for text, schema in zip(texts, schemas):
-            batch.append(self.tokenize_per_instance(text, schema))
-        # output batch features 
-        output_batch = defaultdict(list)
-        for key in batch[0].keys():
-            output_batch[key] = torch.stack([x[key] for x in batch], dim=0)
-        # truncate
-        input_length = int(output_batch["attention_mask"].sum(-1).max())
-        for key in ["input_ids", "attention_mask", "token_type_ids"]:
-            if key not in output_batch:
-                continue
-            output_batch[key] = output_batch[key][:, :input_length].to(device)
-        return output_batch
+    With `sort_by_length`, rows are ordered by length first so that every batch holds similarly long rows and little
+    padding. Callers scatter the outputs back through the returned indices to restore the original order.
+    """
+    indices = list(range(len(lengths)))
+    if sort_by_length:
+        indices.sort(key=lambda i: lengths[i])
+    if batch_size is None:
+        batch_size = max(len(indices), 1)
+    return [indices[i:i+batch_size] for i in range(0, len(indices), batch_size)]
 
 
-class EAEProcessor():
+class Seq2SeqInferProcessor():
     def __init__(self, tokenizer, max_seq_length=160):
         self.tokenizer = tokenizer 
         self.max_seq_length = max_seq_length
 
-    def insert_marker(self, text, trigger_pos, whitespace=True):
+    def encode(self, batch_words):
+        """Tokenizes all rows in one fast-tokenizer call, without padding."""
+        if len(batch_words) == 0:
+            return {"input_ids": [], "attention_mask": []}
+        return self.tokenizer(batch_words,
+                              truncation=True,
+                              max_length=self.max_seq_length,
+                              is_split_into_words=True)
+
+    def collate(self, encodings, indices, device):
+        """Pads the selected rows to the longest one among them."""
+        rows = [encodings["input_ids"][i] for i in indices]
+        input_length = max(len(row) for row in rows)
+        pad_token_id = self.tokenizer.pad_token_id
+        input_ids = torch.tensor([row + [pad_token_id] * (input_length - len(row)) for row in rows], dtype=torch.long)
+        attention_mask = torch.tensor([[1] * len(row) + [0] * (input_length - len(row)) for row in rows],
+                                      dtype=torch.long)
+        return {
+            "input_ids": input_ids.to(device),
+            "attention_mask": attention_mask.to(device)
+        }
+
+
+class EDProcessor(Seq2SeqInferProcessor):
+    def get_input_words(self, text, schema):
+        return get_words(schema+text, get_language(schema))
+
+    def encode_texts(self, texts, schemas):
+        return self.encode([self.get_input_words(text, schema) for text, schema in zip(texts, schemas)])
+
+    def tokenize(self, texts, schemas, device):
+        encodings = self.encode_texts(texts, schemas)
+        return self.collate(encodings, range(len(texts)), device)
+
+
+class EAEProcessor(Seq2SeqInferProcessor):
+    def insert_marker(self, words, trigger_pos, whitespace=True):
+        """Surrounds the words of the trigger with `<event>` and `</event>` words, like `EAESeq2SeqProcessor` in training."""
         space = " " if whitespace else ""
-        markered_text = ""
-        tokens = text.split()
+        markered_words = []
         char_pos = 0
-        for i, token in enumerate(tokens):
+        for word in words:
             if char_pos == trigger_pos[0]:
-                markered_text += "<event>" + space
-            char_pos += len(token) + len(space)
-            markered_text += token + space
+                markered_words.append("<event>")
+            char_pos += len(word) + len(space)
+            markered_words.append(word)
             if char_pos == trigger_pos[1] + len(space):
-                markered_text += "</event>" + space
-        markered_text = markered_text.strip()
-        return markered_text
+                markered_words.append("</event>")
+        return markered_words
 
-    def tokenize_per_instance(self, text, trigger, schema):
-        if schema in ["<duee>", "<fewfc>", "<leven>"]:
-            language = "Chinese"
-        else:
-            language = "English"
+    def get_input_words(self, text, trigger, schema):
+        language = get_language(schema)
         whitespace = True if language == "English" else False
-        text = self.insert_marker(text, trigger["offset"], whitespace)
-        words = get_words(text, language)
-        input_context = self.tokenizer(words,
-                                       truncation=True,
-                                       padding="max_length",
-                                       max_length=self.max_seq_length,
-                                       is_split_into_words=True)
-        return dict(
-            input_ids=torch.tensor(input_context["input_ids"], dtype=torch.long),
-            attention_mask=torch.tensor(input_context["attention_mask"], dtype=torch.float32)
-        )
+        words = self.insert_marker(get_words(text, language), trigger["offset"], whitespace)
+        # the schema is a word of its own, as in training
+        return [schema] + words
+
+    def encode_instances(self, instances):
+        """Encodes one row per trigger, in the order of `instances`."""
+        batch_words = []
+        for instance in instances:
+            for trigger in instance["triggers"]:
+                batch_words.append(self.get_input_words(instance["text"], trigger, instance["schema"]))
+        return self.encode(batch_words)
 
     def tokenize(self, instances, device):
-        batch = []
-        for i, instance in enumerate(instances):
-            for trigger in instance["triggers"]:
-                batch.append(self.tokenize_per_instance(instance["text"], trigger, instance["schema"]))
-        # output batch features 
-        output_batch = defaultdict(list)
-        for key in batch[0].keys():
-            output_batch[key] = torch.stack([x[key] for x in batch], dim=0)
-        # truncate
-        input_length = int(output_batch["attention_mask"].sum(-1).max())
-        for key in ["input_ids", "attention_mask", "token_type_ids"]:
-            if key not in output_batch:
-                continue
-            output_batch[key] = output_batch[key][:, :input_length].to(device)
-        return output_batch
+        encodings = self.encode_instances(instances)
+        return self.collate(encodings, range(len(encodings["input_ids"])), device)
 
 
 def find_position(mention, text):
@@ -117,18 +123,83 @@ def find_position(mention, text):
     return [char_start, char_end]
 
 
+class SpanResolver():
+    """Resolves generated mentions to char spans in one text.
+
+    The occurrences of every distinct mention are collected once, so resolving many mentions does not rescan the text
+    for each of them. Unlike `find_position`, which always returns the first occurrence, repeated mentions resolve to the
+    occurrence closest to a position hint.
+    """
+    def __init__(self, text):
+        self.text = text
+        self._occurrences = {}
+
+    def is_word_aligned(self, start, end):
+        return (start == 0 or not self.text[start-1].isalnum()) and \
+            (end == len(self.text) or not self.text[end].isalnum())
+
+    def find_all(self, mention):
+        """Returns the starts of all occurrences of `mention`. Occurrences that are whole words take precedence over
+        ones inside other words (e.g. "on" in "Monday")."""
+        if mention not in self._occurrences:
+            starts = []
+            start = self.text.find(mention)
+            while start != -1:
+                starts.append(start)
+                start = self.text.find(mention, start + 1)
+            aligned_starts = [start for start in starts if self.is_word_aligned(start, start + len(mention))]
+            self._occurrences[mention] = aligned_starts if len(aligned_starts) > 0 else starts
+        return self._occurrences[mention]
+
+    def resolve(self, mention, position=0, forward=False):
+        """Returns `[char start, char end]` of the occurrence of `mention` nearest to `position`, or `None`.
+
+        With `forward`, the first occurrence starting at or after `position` wins, falling back to the last one. This
+        follows the left-to-right order in which triggers are generated.
+        """
+        starts = self.find_all(mention)
+        if len(starts) == 0:
+            return None
+        if forward:
+            i = bisect_left(starts, position)
+            char_start = starts[i] if i < len(starts) else starts[-1]
+        else:
+            char_start = min(starts, key=lambda start: abs(start - position))
+        return [char_start, char_start + len(mention)]
+
+    def resolve_in_order(self, mentions):
+        """Resolves mentions in generation order, each one at or after the previous resolved mention."""
+        offsets = []
+        position = 0
+        for mention in mentions:
+            offset = self.resolve(mention, position, forward=True)
+            if offset is not None:
+                position = offset[0]
+            offsets.append(offset)
+        return offsets
+
+
+def group_by_instance(predictions):
+    """Groups flat `(instance_id, ...)` prediction tuples by their instance id."""
+    grouped = defaultdict(list)
+    for prediction in predictions:
+        grouped[prediction[0]].append(prediction)
+    return grouped
+
+
 def get_ed_result(texts, triggers):
     results = []
+    triggers_per_text = group_by_instance(triggers)
     for i, text in enumerate(texts):
-        triggers_in_text = [trigger for trigger in triggers if trigger[0]==i]
+        triggers_in_text = triggers_per_text[i]
         result = Result()
         events = []
-        for trigger in triggers_in_text:
+        offsets = SpanResolver(text).resolve_in_order([trigger[2] for trigger in triggers_in_text])
+        for trigger, offset in zip(triggers_in_text, offsets):
             type = trigger[1]
             mention = trigger[2]
-            if mention not in text:
+            if offset is None:
                 continue
-            offset = find_position(mention, text)
             event = {
                 "type": type,
                 "trigger": mention,
@@ -144,18 +215,22 @@ def get_ed_result(texts, triggers):
 
 def get_eae_result(instances, arguments):
     results = []
+    # `arguments` is flattened over the triggers of all instances
+    arguments = iter(arguments)
     for i, instance in enumerate(instances):
         result = Result()
         events = []
+        span_resolver = SpanResolver(instance["text"])
         for trigger, argus_in_trigger in zip(instance["triggers"], arguments):
             event = Event()
             event_arguments = []
             for argu in argus_in_trigger:
                 role = argu[1]
                 mention = argu[2]
-                if mention not in instance["text"]:
+                # arguments are taken to be the occurrence closest to their trigger
+                offset = span_resolver.resolve(mention, trigger["offset"][0])
+                if offset is None:
                     continue
-                offset = find_position(mention, instance["text"])
                 argument = {
                     "mention": mention,
                     "offset": offset,
@@ -194,19 +269,20 @@ def prepare_for_eae_from_input(texts, all_triggers, schemas):
 
 def prepare_for_eae_from_pred(texts, triggers, schemas):
     instances = []
+    triggers_per_text = group_by_instance(triggers)
     for i, text in enumerate(texts):
-        triggers_in_text = [trigger for trigger in triggers if trigger[0]==i]
+        triggers_in_text = triggers_per_text[i]
         instance = {
             "text": text,
             "schema": schemas[i],
             "triggers": []
         }
-        for trigger in triggers_in_text:
+        offsets = SpanResolver(text).resolve_in_order([trigger[2] for trigger in triggers_in_text])
+        for trigger, offset in zip(triggers_in_text, offsets):
             type = trigger[1]
             mention = trigger[2]
-            if mention not in text:
+            if offset is None:
                 continue
-            offset = find_position(mention, text)
             instance["triggers"].append({
                 "type": type, 
                 "mention": mention,
@@ -228,57 +304,220 @@ def extract_argument(raw_text, instance_id, template=re.compile(r"<|>")):
         value = words[1].strip().replace(" ", "")
         if role != "" and value != "":
             arguments.append((instance_id, role, value))
-    arguments = list(set(arguments))
+    # de-duplicate, keeping the generation order
+    arguments = list(dict.fromkeys(arguments))
     return arguments
 
 
-def generate(model, tokenizer, inputs):
-    gen_kwargs = {
-        "max_length": 128,
+DECODING_PROFILES = {
+    # beam search, as used for training-time evaluation
+    "accurate": {
         "num_beams": 4,
-        "synced_gpus": False,
-        "prefix_allowed_tokens_fn": None 
+        "max_length": 128
+    },
+    # greedy search that stops once every row emitted EOS, with an output length cap derived from the input length
+    "fast": {
+        "num_beams": 1,
+        "max_length": 128,
+        "length_ratio": 1.0,
+        "length_margin": 16
+    },
+    # the greedy search of "fast", verifying spans copied from the input in one decoder forward each
+    "speculative": {
+        "num_beams": 1,
+        "max_length": 128,
+        "length_ratio": 1.0,
+        "length_margin": 16,
+        "draft_length": 8
     }
+}
+
 
-    if "attention_mask" in inputs:
-        gen_kwargs["attention_mask"] = inputs.get("attention_mask", None)
+def get_generation_kwargs(decoding, input_length):
+    """Builds `generate()` keyword arguments from a profile name in `DECODING_PROFILES` or a profile dict.
 
-    generation_inputs = inputs["input_ids"]
+    A profile with `length_ratio` caps the output at `length_ratio * input_length + length_margin` tokens, never
+    exceeding its `max_length`. A profile may also hold a `constraint_decoder` (see `get_constraint_decoder`), which
+    restricts the output to the given labels followed by spans of the input, and a `draft_length`, which enables the
+    speculative greedy search of `speculative_greedy_search`.
+    """
+    profile = dict(DECODING_PROFILES[decoding] if isinstance(decoding, str) else decoding)
+    length_ratio = profile.pop("length_ratio", None)
+    length_margin = profile.pop("length_margin", 0)
+    if length_ratio is not None:
+        profile["max_length"] = min(profile["max_length"], int(length_ratio * input_length) + length_margin)
+    return profile
 
-    generated_tokens = model.generate(
-        generation_inputs,
-        **gen_kwargs,
-    )
-    return tokenizer.batch_decode(generated_tokens, skip_special_tokens=False)
 
+def timed(timer, stage):
+    return timer.stage(stage) if timer is not None else nullcontext()
 
-def do_event_detection(model, tokenizer, texts, schemas, device):
+
+class DeadlineCriteria(StoppingCriteria):
+    """Stops generation once `time.monotonic()` passes `deadline`. Beam search then returns its best hypotheses so
+    far, so the output is truncated rather than lost."""
+    def __init__(self, deadline):
+        self.deadline = deadline
+
+    def __call__(self, input_ids, scores, **kwargs):
+        return time.monotonic() >= self.deadline
+
+
+def generate(model, tokenizer, inputs, decoding="accurate", timer=None, deadline=None, logits_processors=None):
+    """Decodes `inputs` and returns the decoded outputs.
+
+    Args:
+        timer (`StageTimer`, *optional*): Receives the time spent in the `generate` and `decode` stages, and the
+            number of `rows`, `tokens_in` and `tokens_out`.
+        deadline (`float`, *optional*): `time.monotonic()` value at which generation stops.
+        logits_processors (`List[LogitsProcessor]`, *optional*): Run at every step, after the constraint decoder.
+    """
+    gen_kwargs = {
+        "synced_gpus": False,
+        "prefix_allowed_tokens_fn": None,
+        **get_generation_kwargs(decoding, inputs["input_ids"].shape[1])
+    }
+    constraint_decoder = gen_kwargs.pop("constraint_decoder", None)
+    draft_length = gen_kwargs.pop("draft_length", None)
+    # only PyTorch models are decoded speculatively, others run the equivalent greedy search
+    if draft_length is not None and hasattr(model, "get_encoder"):
+        if gen_kwargs.get("num_beams", 1) != 1 or constraint_decoder is not None:
+            raise ValueError("Speculative decoding only supports unconstrained greedy search.")
+        with timed(timer, "generate"):
+            generated_tokens = speculative_greedy_search(model,
+                                                         inputs["input_ids"],
+                                                         inputs.get("attention_mask", None),
+                                                         gen_kwargs["max_length"],
+                                                         draft_length,
+                                                         deadline)
+    else:
+        processors = list(logits_processors or [])
+        if constraint_decoder is not None:
+            processors.insert(0, constraint_decoder.get_logits_processor(inputs["input_ids"],
+                                                                         gen_kwargs.get("num_beams", 1), flat=True))
+        if len(processors) > 0:
+            gen_kwargs["logits_processor"] = LogitsProcessorList(processors)
+        if deadline is not None:
+            gen_kwargs["stopping_criteria"] = StoppingCriteriaList([DeadlineCriteria(deadline)])
+
+        if "attention_mask" in inputs:
+            gen_kwargs["attention_mask"] = inputs.get("attention_mask", None)
+
+        generation_inputs = inputs["input_ids"]
+
+        with timed(timer, "generate"):
+            generated_tokens = model.generate(
+                generation_inputs,
+                **gen_kwargs,
+            )
+    if timer is not None:
+        timer.count("rows", inputs["input_ids"].shape[0])
+        timer.count("tokens_in", int(inputs["attention_mask"].sum()) if "attention_mask" in inputs
+                    else inputs["input_ids"].numel())
+        # the decoder start token is not generated
+        timer.count("tokens_out", int((generated_tokens[:, 1:] != tokenizer.pad_token_id).sum()))
+    with timed(timer, "decode"):
+        return tokenizer.batch_decode(generated_tokens, skip_special_tokens=False)
+
+
+def batch_generate(model, tokenizer, data_processor, encodings, device, batch_size=None, sort_by_length=False,
+                   decoding="accurate", timer=None, deadline=None):
+    """Generates for every encoded row, `batch_size` rows per forward pass, and returns the outputs in row order."""
+    lengths = [len(input_ids) for input_ids in encodings["input_ids"]]
+    decoded_preds = [None] * len(lengths)
+    for indices in get_length_buckets(lengths, batch_size, sort_by_length):
+        with timed(timer, "tokenize"):
+            inputs = data_processor.collate(encodings, indices, device)
+        for i, pred in zip(indices, generate(model, tokenizer, inputs, decoding, timer, deadline)):
+            decoded_preds[i] = pred
+    return decoded_preds
+
+
+def clean_output(tokenizer, output):
+    for to_remove_token in [tokenizer.eos_token, tokenizer.pad_token]:
+        output = output.replace(to_remove_token, '')
+    return output.strip()
+
+
+def do_event_detection(model, tokenizer, texts, schemas, device, batch_size=None, sort_by_length=False,
+                       decoding="accurate", timer=None, deadline=None):
+    """`timer` (a `StageTimer`) and `deadline` (a `time.monotonic()` value), if given, are passed on to `generate`.
+    `timer` also receives the `tokenize` and `extract` stages."""
     data_processor = EDProcessor(tokenizer)
-    inputs = data_processor.tokenize(texts, schemas, device)
-    decoded_preds = generate(model, tokenizer, inputs)
-    def clean_str(x_str):
-        for to_remove_token in [tokenizer.eos_token, tokenizer.pad_token]:
-            x_str = x_str.replace(to_remove_token, '')
-        return x_str.strip()
+    with timed(timer, "tokenize"):
+        encodings = data_processor.encode_texts(texts, schemas)
+    decoded_preds = batch_generate(model, tokenizer, data_processor, encodings, device, batch_size, sort_by_length,
+                                   decoding, timer, deadline)
     pred_triggers = []
-    for i, pred in enumerate(decoded_preds):
-        pred = clean_str(pred)
-        pred_triggers.extend(extract_argument(pred, i))
+    with timed(timer, "extract"):
+        for i, pred in enumerate(decoded_preds):
+            pred_triggers.extend(extract_argument(clean_output(tokenizer, pred), i))
     return pred_triggers
 
 
-def do_event_argument_extraction(model, tokenizer, instances, device="cuda"):
+def do_event_argument_extraction(model, tokenizer, instances, device="cuda", batch_size=None, sort_by_length=False,
+                                 decoding="accurate", timer=None, deadline=None):
+    """Returns the arguments of every trigger of every instance. `timer` and `deadline` are used as in
+    `do_event_detection`."""
     data_processor = EAEProcessor(tokenizer)
-    inputs = data_processor.tokenize(instances, device)
-    decoded_preds = generate(model, tokenizer, inputs)
-    def clean_str(x_str):
-        for to_remove_token in [tokenizer.eos_token, tokenizer.pad_token]:
-            x_str = x_str.replace(to_remove_token, '')
-        return x_str.strip()
+    with timed(timer, "tokenize"):
+        encodings = data_processor.encode_instances(instances)
+    decoded_preds = batch_generate(model, tokenizer, data_processor, encodings, device, batch_size, sort_by_length,
+                                   decoding, timer, deadline)
     pred_triggers = []
-    for i, pred in enumerate(decoded_preds):
-        pred = clean_str(pred)
-        pred_triggers.append(extract_argument(pred, i))
+    with timed(timer, "extract"):
+        for i, pred in enumerate(decoded_preds):
+            pred_triggers.append(extract_argument(clean_output(tokenizer, pred), i))
     return pred_triggers
 
+
+class GroupStreamer(LogitsProcessor):
+    """Calls `on_output(output_ids)` with the output generated so far for the single row being decoded, every time
+    `<extra_id_1>` closes an `<extra_id_0> type : mention <extra_id_1>` group. It only observes the generated tokens,
+    and leaves the scores untouched."""
+    def __init__(self, tokenizer, on_output, group_end="<extra_id_1>"):
+        self.group_end_id = tokenizer.convert_tokens_to_ids(group_end)
+        self.on_output = on_output
+
+    def __call__(self, input_ids, scores):
+        if input_ids[0, -1] == self.group_end_id:
+            self.on_output(input_ids[0])
+        return scores
+
+
+def supports_streaming(model):
+    """Whether `stream_event_detection` can run `model`, whose `generate()` has to take a `logits_processor`. Models
+    without it, such as `OnnxSeq2SeqModel`, set `supports_logits_processor` to `False`."""
+    return getattr(model, "supports_logits_processor", True)
+
+
+def stream_event_detection(model, tokenizer, text, schema, on_triggers, device, decoding="accurate", deadline=None):
+    """Runs ED on one text, and calls `on_triggers(triggers)` with the new triggers every time one is decoded, before
+    the rest of the output is generated. Decoding is greedy whatever the profile, since the prefix of the best beam can
+    still change. Returns all the triggers.
+    """
+    if not supports_streaming(model):
+        raise ValueError(f"{type(model).__name__} does not support streaming.")
+    data_processor = EDProcessor(tokenizer)
+    inputs = data_processor.tokenize([text], [schema], device)
+    triggers = []
+
+    def on_output(pred):
+        # the predictions of a prefix are a prefix of the predictions
+        new_triggers = extract_argument(clean_output(tokenizer, pred), 0)[len(triggers):]
+        if len(new_triggers) > 0:
+            triggers.extend(new_triggers)
+            on_triggers(new_triggers)
+
+    profile = dict(DECODING_PROFILES[decoding] if isinstance(decoding, str) else decoding)
+    # speculative decoding verifies several tokens per step, and is replaced by the plain greedy search
+    profile.pop("draft_length", None)
+    profile["num_beams"] = 1
+    streamer = GroupStreamer(tokenizer, lambda output_ids: on_output(tokenizer.decode(output_ids,
+                                                                                      skip_special_tokens=False)))
+    preds = generate(model, tokenizer, inputs, profile, deadline=deadline, logits_processors=[streamer])
+    # groups closed by the last generated token, or cut by the length cap
+    on_output(preds[0])
+    return triggers
+
     
\ No newline at end of file
@@ -0,0 +1,90 @@
+import time
+import torch
+
+from ..model.constraint_decoding import match_sublist
+
+
+def copy_draft(generated, src_sequence, draft_length, max_ngram=3):
+    """Proposes the source tokens following the generated suffix as the next `draft_length` tokens.
+
+    The longest suffix of `generated`, of at most `max_ngram` tokens, that occurs in `src_sequence` is matched like in
+    `generated_search_src_sequence`, and the tokens after its first occurrence are copied. Returns an empty draft if no
+    suffix occurs in the source.
+    """
+    for n in range(min(max_ngram, len(generated)), 0, -1):
+        for _, end in match_sublist(the_list=src_sequence, to_match=generated[-n:]):
+            if end + 1 < len(src_sequence):
+                return src_sequence[end+1:end+1+draft_length]
+    return []
+
+
+def crop_cache(past_key_values, length):
+    """Keeps the first `length` positions of the self-attention cache. The cross-attention cache is left as is."""
+    if hasattr(past_key_values, "crop"):
+        past_key_values.crop(length)
+        return past_key_values
+    return tuple((key[:, :, :length], value[:, :, :length], *cross_cache)
+                 for key, value, *cross_cache in past_key_values)
+
+
+def speculative_greedy_search(model, input_ids, attention_mask=None, max_length=128, draft_length=8, deadline=None):
+    """Greedy search where every decoder forward verifies a draft copied from the source.
+
+    The outputs of the event models are mostly spans copied from the input, so at every step `copy_draft` proposes
+    the source continuation of the generated tokens, and one decoder forward over the last token and the draft scores
+    all of them at once. The longest prefix of the draft matching the greedy choice of the model is accepted, together
+    with the model's own next token, and the self-attention cache is cropped to the accepted tokens. The output is the
+    same as `model.generate(num_beams=1)` up to floating point differences between single- and multi-token forwards,
+    with far fewer decoder steps per copied span.
+
+    Rows are decoded one by one, since they accept drafts of different lengths, and only the encoder runs batched.
+
+    Args:
+        model (`MT5ForConditionalGeneration`): Encoder-decoder model.
+        input_ids (`torch.LongTensor`): Input ids of shape (batch_size, input_length).
+        attention_mask (`torch.LongTensor`, *optional*): Attention mask of the inputs.
+        max_length (`int`): Maximum output length, including the decoder start token.
+        draft_length (`int`): Maximum number of tokens proposed per step.
+        deadline (`float`, *optional*): `time.monotonic()` value at which decoding stops, like `DeadlineCriteria`.
+            The row being decoded keeps its tokens so far, and the remaining rows are left empty.
+
+    Returns:
+        sequences (`torch.LongTensor`): Generated ids of shape (batch_size, output_length), padded like `generate()`.
+    """
+    config = model.config
+    if attention_mask is None:
+        attention_mask = torch.ones_like(input_ids)
+    with torch.no_grad():
+        encoder_outputs = model.get_encoder()(input_ids=input_ids, attention_mask=attention_mask, return_dict=True)
+        all_tokens = []
+        for i in range(input_ids.shape[0]):
+            src_sequence = input_ids[i][attention_mask[i].bool()].tolist()
+            row_encoder_outputs = (encoder_outputs.last_hidden_state[i:i+1],)
+            tokens = [config.decoder_start_token_id]
+            past_key_values = None
+            while len(tokens) < max_length:
+                if deadline is not None and time.monotonic() >= deadline:
+                    break
+                draft = copy_draft(tokens[1:], src_sequence, min(draft_length, max_length - len(tokens) - 1))
+                outputs = model(encoder_outputs=row_encoder_outputs,
+                                attention_mask=attention_mask[i:i+1],
+                                decoder_input_ids=input_ids.new_tensor([tokens[-1:] + draft]),
+                                past_key_values=past_key_values,
+                                use_cache=True,
+                                return_dict=True)
+                greedy_tokens = outputs.logits[0].argmax(dim=-1).tolist()
+                num_accepted = 0
+                while num_accepted < len(draft) and draft[num_accepted] == greedy_tokens[num_accepted]:
+                    num_accepted += 1
+                new_tokens = draft[:num_accepted] + [greedy_tokens[num_accepted]]
+                if config.eos_token_id in new_tokens:
+                    tokens += new_tokens[:new_tokens.index(config.eos_token_id)+1]
+                    break
+                # the cache holds every token but the last one, which is fed at the next step
+                past_key_values = crop_cache(outputs.past_key_values, len(tokens) + num_accepted)
+                tokens += new_tokens
+            all_tokens.append(tokens)
+    sequences = input_ids.new_full((len(all_tokens), max(len(tokens) for tokens in all_tokens)), config.pad_token_id)
+    for i, tokens in enumerate(all_tokens):
+        sequences[i, :len(tokens)] = input_ids.new_tensor(tokens)
+    return sequences
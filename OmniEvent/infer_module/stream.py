@@ -0,0 +1,81 @@
+import os
+import json
+
+
+def parse_instance(line, line_no, input_format="unified"):
+    """Converts one input line into an instance with `id`, `text` and `triggers`. Returns `None` for blank lines.
+
+    Args:
+        line (`str`): Raw input line.
+        line_no (`int`): Index of the line in the input file. Used as the id if the line has none.
+        input_format (`str`): Selected in ['unified', 'text']. `unified` lines are JSON objects in the unified
+            OmniEvent format, of which only `id`, `text` and the triggers of `events` are used. `text` lines are
+            plain sentences.
+    """
+    if line.strip() == "":
+        return None
+    if input_format == "text":
+        return {
+            "id": line_no,
+            "text": line.rstrip("\r\n"),
+            "triggers": []
+        }
+    elif input_format == "unified":
+        item = json.loads(line)
+        triggers = []
+        for event in item.get("events", []):
+            for trigger in event["triggers"]:
+                triggers.append((trigger["trigger_word"], trigger["position"][0], trigger["position"][1]))
+        return {
+            "id": item.get("id", line_no),
+            "text": item["text"],
+            "triggers": triggers
+        }
+    else:
+        raise ValueError(f"Unknown input format: {input_format}")
+
+
+def read_instances(input_file, input_format="unified", start_line=0):
+    """Lazily yields `(line_no, instance)` for every line from `start_line` on. `instance` is `None` for blank lines."""
+    with open(input_file, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f):
+            if line_no < start_line:
+                continue
+            yield line_no, parse_instance(line, line_no, input_format)
+
+
+def iter_chunks(iterable, chunk_size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if len(chunk) > 0:
+        yield chunk
+
+
+class StreamCheckpoint():
+    """Records how far a streaming job got: the number of input lines consumed and the byte size of the output file
+    at that point. The file is replaced atomically, so it always describes a fully written prefix of the output."""
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return 0, 0
+        with open(self.path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        return state["line"], state["offset"]
+
+    def save(self, line, offset):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"line": line, "offset": offset}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
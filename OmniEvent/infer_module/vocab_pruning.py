@@ -0,0 +1,234 @@
+import os
+import json
+import glob
+import logging
+import argparse
+
+import yaml
+import torch
+
+from ..input_engineering.input_utils import get_words, get_plain_label
+from ..input_engineering.seq2seq_processor import type_start, type_end, split_word
+
+
+logger = logging.getLogger(__name__)
+
+
+SCHEMA_TOKENS = ["<ace>", "<kbp>", "<ere>", "<maven>", "<leven>", "<duee>", "<fewfc>"]
+MARKER_TOKENS = ["<event>", "</event>"]
+CHINESE_SOURCES = ["<duee>", "<fewfc>", "<leven>"]
+
+
+def get_label_words(label, mention):
+    """Words of one target span, split the way the Seq2Seq processors split the target sequence."""
+    return f"{type_start} {label}{split_word} {mention} {type_end}".split()
+
+
+def collect_words_from_data(data_file, language="English"):
+    """Collects the input and target words of a unified jsonl file, for both ED and EAE.
+
+    The language of an instance follows its `source` field when it has one, as in the Seq2Seq processors.
+    """
+    words = set()
+    with open(data_file, "r", encoding="utf-8") as f:
+        for line in f:
+            item = json.loads(line.strip())
+            item_language = language
+            if "source" in item:
+                words.add(item["source"])
+                item_language = "Chinese" if item["source"] in CHINESE_SOURCES else "English"
+            words.update(get_words(text=item["text"], language=item_language))
+            for event in item.get("events", []):
+                type = get_plain_label(event["type"])
+                for trigger in event["triggers"]:
+                    words.update(get_label_words(type, trigger["trigger_word"]))
+                    for argument in trigger.get("arguments", []):
+                        role = get_plain_label(argument["role"])
+                        for mention in argument["mentions"]:
+                            words.update(get_label_words(role, mention["mention"]))
+    return words
+
+
+def collect_words_from_schema(schema_file):
+    """Collects the target words of every label in a `label2id.json` / `role2id.json` file."""
+    with open(schema_file, "r", encoding="utf-8") as f:
+        label2id = json.load(f)
+    words = set()
+    for label in label2id:
+        words.add(f"{get_plain_label(label)}{split_word}")
+    return words
+
+
+def resolve_config_files(config_files, base_dir=None):
+    """Returns the data files and schema files referenced by training configs, e.g. `config/all-datasets/ed/s2s/*.yaml`.
+
+    Paths in the configs are relative to the directory the training scripts run from (`examples/ED`, `examples/EAE`),
+    which is given by `base_dir`.
+    """
+    data_files, schema_files, languages = [], [], []
+    for config_file in config_files:
+        with open(config_file, "r", encoding="utf-8") as f:
+            config = yaml.safe_load(f)
+        language = config.get("language", "English")
+        for key in ["train_file", "validation_file", "test_file"]:
+            if config.get(key) is not None:
+                data_files.append(config[key])
+                languages.append(language)
+        for key in ["type2id_path", "role2id_path"]:
+            if config.get(key) is not None:
+                schema_files.append(config[key])
+    if base_dir is not None:
+        data_files = [os.path.join(base_dir, path) for path in data_files]
+        schema_files = [os.path.join(base_dir, path) for path in schema_files]
+    return data_files, schema_files, languages
+
+
+def get_kept_token_ids(tokenizer, words, keep_single_chars=True):
+    """Returns the sorted ids of the tokens kept in the pruned vocabulary.
+
+    These are the tokens of `words`, the special and added tokens, and, if `keep_single_chars`, every single-character
+    piece, so that texts outside the corpora can still be segmented into characters rather than unknown tokens.
+    """
+    kept_ids = set(tokenizer.all_special_ids)
+    kept_ids.update(tokenizer.convert_tokens_to_ids(list(tokenizer.get_added_vocab())))
+    kept_ids.update(range(3))
+    words = sorted(words)
+    batch_size = 10000
+    for i in range(0, len(words), batch_size):
+        for ids in tokenizer(words[i:i+batch_size], add_special_tokens=False)["input_ids"]:
+            kept_ids.update(ids)
+    if keep_single_chars:
+        vocab = json.loads(tokenizer.backend_tokenizer.to_str())["model"]["vocab"]
+        for id, (piece, _) in enumerate(vocab):
+            if len(piece.lstrip("▁")) <= 1:
+                kept_ids.add(id)
+    return sorted(kept_ids)
+
+
+def prune_tokenizer_files(output_dir, kept_ids):
+    """Rewrites the tokenizer saved in `output_dir` to the vocabulary of `kept_ids`, where token `kept_ids[i]` is
+    given id `i`."""
+    old2new = {old_id: new_id for new_id, old_id in enumerate(kept_ids)}
+    tokenizer_file = os.path.join(output_dir, "tokenizer.json")
+    with open(tokenizer_file, "r", encoding="utf-8") as f:
+        tokenizer_json = json.load(f)
+    model = tokenizer_json["model"]
+    if model["type"] != "Unigram":
+        raise ValueError(f"Only Unigram (SentencePiece) tokenizers can be pruned, got {model['type']}.")
+    model["vocab"] = [model["vocab"][id] for id in kept_ids if id < len(model["vocab"])]
+    if model.get("unk_id") is not None:
+        model["unk_id"] = old2new[model["unk_id"]]
+    for added_token in tokenizer_json.get("added_tokens", []):
+        added_token["id"] = old2new[added_token["id"]]
+    post_processor = tokenizer_json.get("post_processor") or {}
+    for special_token in post_processor.get("special_tokens", {}).values():
+        special_token["ids"] = [old2new[id] for id in special_token["ids"]]
+    with open(tokenizer_file, "w", encoding="utf-8") as f:
+        json.dump(tokenizer_json, f, ensure_ascii=False, indent=2)
+
+    tokenizer_config_file = os.path.join(output_dir, "tokenizer_config.json")
+    with open(tokenizer_config_file, "r", encoding="utf-8") as f:
+        tokenizer_config = json.load(f)
+    if "added_tokens_decoder" in tokenizer_config:
+        tokenizer_config["added_tokens_decoder"] = {
+            str(old2new[int(id)]): token for id, token in tokenizer_config["added_tokens_decoder"].items()
+        }
+    # `add_prefix_space` makes `transformers` rebuild the fast tokenizer from the SentencePiece model, while the
+    # pre-tokenizer saved in `tokenizer.json` already prepends the space
+    tokenizer_config.pop("add_prefix_space", None)
+    with open(tokenizer_config_file, "w", encoding="utf-8") as f:
+        json.dump(tokenizer_config, f, ensure_ascii=False, indent=2)
+
+    # the SentencePiece model still holds the full vocabulary, so only the fast tokenizer is kept
+    spiece_file = os.path.join(output_dir, "spiece.model")
+    if os.path.exists(spiece_file):
+        os.remove(spiece_file)
+
+
+def prune_model(model, kept_ids):
+    """Keeps the rows of `kept_ids` in the shared embedding and the LM head of a `MT5ForConditionalGeneration` model."""
+    index = torch.tensor(kept_ids, dtype=torch.long)
+    old_embeddings = model.get_input_embeddings()
+    new_embeddings = torch.nn.Embedding(len(kept_ids), old_embeddings.embedding_dim)
+    new_embeddings.weight.data = old_embeddings.weight.data[index].clone()
+    model.set_input_embeddings(new_embeddings)
+    old_lm_head = model.get_output_embeddings()
+    if model.config.tie_word_embeddings:
+        model.tie_weights()
+    else:
+        new_lm_head = torch.nn.Linear(old_lm_head.in_features, len(kept_ids), bias=False)
+        new_lm_head.weight.data = old_lm_head.weight.data[index].clone()
+        model.set_output_embeddings(new_lm_head)
+    model.config.vocab_size = len(kept_ids)
+    return model
+
+
+def prune_vocab(model, tokenizer, output_dir, data_files=(), schema_files=(), languages=None, keep_single_chars=True):
+    """Saves a copy of a Seq2Seq model and its tokenizer restricted to the vocabulary of the given corpora and schemas.
+
+    Outputs of the event models only contain schema labels, separators and copied source tokens, so the rows of the
+    embedding and the LM head of other tokens are dropped, which shrinks the model and the per-step softmax. The output
+    directory is loadable by `get_pretrained`. Texts tokenized with tokens outside the corpora are segmented into
+    smaller pieces instead, and their predictions may differ from the full model.
+
+    Args:
+        model (`MT5ForConditionalGeneration`): Model to prune. It is modified in place.
+        tokenizer (`MT5TokenizerFast`): Tokenizer of the model, with a Unigram (SentencePiece) vocabulary.
+        output_dir (`str`): Directory the pruned checkpoint is saved to.
+        data_files (`List[str]`): Unified jsonl files whose inputs and targets are kept. Missing files are skipped.
+        schema_files (`List[str]`): `label2id.json` / `role2id.json` files whose labels are kept.
+        languages (`List[str]`, *optional*): Language of each data file, used for instances without a `source`.
+        keep_single_chars (`bool`): Whether to keep every single-character piece.
+
+    Returns:
+        kept_ids (`List[int]`): Ids of the kept tokens in the original vocabulary, in the order of the new one.
+    """
+    languages = languages or ["English"] * len(data_files)
+    words = set(SCHEMA_TOKENS + MARKER_TOKENS + [split_word])
+    for data_file, language in zip(data_files, languages):
+        if not os.path.exists(data_file):
+            logger.warning(f"{data_file} does not exist, skipping.")
+            continue
+        words.update(collect_words_from_data(data_file, language))
+    for schema_file in schema_files:
+        if not os.path.exists(schema_file):
+            logger.warning(f"{schema_file} does not exist, skipping.")
+            continue
+        words.update(collect_words_from_schema(schema_file))
+
+    kept_ids = get_kept_token_ids(tokenizer, words, keep_single_chars)
+    # generation relies on the pad / EOS / start token ids, which stay in place as the lowest ids
+    assert kept_ids[:3] == [0, 1, 2]
+    logger.info(f"Keeping {len(kept_ids)} of {model.config.vocab_size} tokens.")
+
+    os.makedirs(output_dir, exist_ok=True)
+    tokenizer.save_pretrained(output_dir)
+    prune_tokenizer_files(output_dir, kept_ids)
+    prune_model(model, kept_ids).save_pretrained(output_dir)
+    return kept_ids
+
+
+if __name__ == "__main__":
+    from ..infer import get_pretrained
+
+    arg_parser = argparse.ArgumentParser(description="Prune the vocabulary of a Seq2Seq model to the given corpora.")
+    arg_parser.add_argument("--model", type=str, default="s2s-mt5-ed")
+    arg_parser.add_argument("--output_dir", type=str, required=True)
+    arg_parser.add_argument("--config", type=str, nargs="*", default=[],
+                            help="Training configs (glob patterns) whose data and schema files are kept.")
+    arg_parser.add_argument("--base_dir", type=str, default=None,
+                            help="Directory the paths in the configs are relative to, e.g. `examples/ED`.")
+    arg_parser.add_argument("--data_file", type=str, nargs="*", default=[])
+    arg_parser.add_argument("--schema_file", type=str, nargs="*", default=[])
+    arg_parser.add_argument("--no_single_chars", action="store_true")
+    args = arg_parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    config_files = sorted(path for pattern in args.config for path in glob.glob(pattern))
+    data_files, schema_files, languages = resolve_config_files(config_files, args.base_dir)
+    data_files += args.data_file
+    schema_files += args.schema_file
+    languages += ["English"] * len(args.data_file)
+
+    model, tokenizer = get_pretrained(args.model, "cpu", use_registry=False)
+    prune_vocab(model, tokenizer, args.output_dir, data_files, schema_files, languages, not args.no_single_chars)
@@ -15,6 +15,9 @@ import pdb
 debug = False
 debug_step = False 
 
+import torch
+from transformers import LogitsProcessor
+
 from ..input_engineering.seq2seq_processor import type_start, type_end
 
 
@@ -86,6 +89,134 @@ def get_constraint_decoder(tokenizer, type_schema, source_prefix=None):
     return StruConstraintDecoder(tokenizer=tokenizer, type_schema=type_schema, source_prefix=source_prefix)
 
 
+class StruConstraintLogitsProcessor(LogitsProcessor):
+    """Batched equivalent of `StruConstraintDecoder.constraint_decoding` for `generate(logits_processor=...)`.
+
+    Instead of rescanning every generated prefix at every step, each beam keeps an automaton state, advanced by one
+    token per step: the bracket depth, the node reached in the label name trie, and the end positions in the source of
+    the span generated so far. The positions are extended through an index from source tokens to their positions, so
+    a step costs O(number of matches) per beam. The allowed tokens of all beams are then applied as one boolean mask
+    on the device of the scores.
+
+    States are looked up by the prefix of their beam, so they survive the reordering of beams by beam search.
+
+    Args:
+        constraint_decoder (`StruConstraintDecoder`): Decoder providing the label name trie and the special tokens.
+        src_input_ids (`torch.LongTensor`): Input ids of the batch, of shape (batch_size, input_length).
+        num_beams (`int`): Number of beams per input.
+        flat (`bool`): Whether the target is a flat list of `<extra_id_0> label span <extra_id_1>` records, as produced by
+            the OmniEvent Seq2Seq models, instead of records nested in an outer `<extra_id_0> ... <extra_id_1>` pair as
+            expected by `StruConstraintDecoder`.
+    """
+    def __init__(self, constraint_decoder, src_input_ids, num_beams=1, flat=False):
+        self.type_tree = constraint_decoder.type_tree
+        self.tree_end = constraint_decoder.tree_end
+        self.type_start = constraint_decoder.type_start
+        self.type_end = constraint_decoder.type_end
+        self.pad_token_id = constraint_decoder.tokenizer.pad_token_id
+        self.eos_token_id = constraint_decoder.tokenizer.eos_token_id
+        self.num_beams = num_beams
+        self.span_depth = 1 if flat else 2
+        self.root_tokens = list(self.type_tree.keys())
+        if flat:
+            self.start_tokens = [self.type_start, self.eos_token_id]
+            self.depth_tokens = {0: [self.type_start, self.eos_token_id]}
+        else:
+            self.start_tokens = [self.type_start]
+            self.depth_tokens = {0: [self.eos_token_id], 1: [self.type_start, self.type_end]}
+
+        prefix_length = len(constraint_decoder.source_prefix_tokenized)
+        self.sources, self.source_positions = [], []
+        for src_sentence in src_input_ids.tolist():
+            src_sentence = src_sentence[prefix_length:]
+            if self.eos_token_id in src_sentence:
+                src_sentence = src_sentence[:src_sentence.index(self.eos_token_id)]
+            positions = dict()
+            for index, token in enumerate(src_sentence):
+                positions.setdefault(token, []).append(index)
+            self.sources.append(src_sentence)
+            self.source_positions.append(positions)
+        self._states = dict()
+
+    def initial_state(self):
+        # (bracket depth, whether a bracket was generated, tail state after the last bracket)
+        return 0, False, ("label", self.type_tree)
+
+    def advance(self, state, token, batch_id):
+        depth, seen_bracket, tail = state
+        if token == self.type_start:
+            return depth + 1, True, ("label", self.type_tree)
+        if token == self.type_end:
+            return depth - 1, True, ("label", self.type_tree)
+        kind, value = tail
+        if kind == "label":
+            node = value.get(token)
+            if node is None:
+                tail = ("invalid", None)
+            elif self.tree_end in node:
+                # the label is complete, and the span starts anywhere in the source
+                tail = ("span", None)
+            else:
+                tail = ("label", node)
+        elif kind == "span":
+            source, positions = self.sources[batch_id], self.source_positions[batch_id]
+            if value is None:
+                value = positions.get(token, [])
+            else:
+                value = [index + 1 for index in value if index + 1 < len(source) and source[index + 1] == token]
+            tail = ("span", value)
+        return depth, seen_bracket, tail
+
+    def allowed_tokens(self, state, last_token, batch_id):
+        depth, seen_bracket, (kind, value) = state
+        if last_token == self.pad_token_id:
+            return self.start_tokens
+        if not seen_bracket:
+            return [self.eos_token_id]
+        if depth != self.span_depth:
+            return self.depth_tokens.get(depth, [self.eos_token_id])
+        if last_token == self.type_start:
+            return self.root_tokens
+        if last_token == self.type_end or kind == "invalid":
+            return [self.eos_token_id]
+        if kind == "label":
+            return list(value.keys())
+        source = self.sources[batch_id]
+        if value is None:
+            return source
+        return [source[index + 1] for index in value if index + 1 < len(source)] + [self.type_end]
+
+    def get_state(self, prefix, batch_id):
+        key = (batch_id, prefix.tobytes())
+        if key not in self._states:
+            parent_key = (batch_id, prefix[:-1].tobytes())
+            if len(prefix) > 1 and parent_key in self._states:
+                self._states[key] = self.advance(self._states[parent_key], int(prefix[-1]), batch_id)
+            else:
+                state = self.initial_state()
+                for token in prefix.tolist():
+                    state = self.advance(state, token, batch_id)
+                self._states[key] = state
+        return self._states[key]
+
+    def __call__(self, input_ids, scores):
+        prefixes = input_ids.cpu().numpy()
+        rows, tokens, states = [], [], dict()
+        for row, prefix in enumerate(prefixes):
+            batch_id = row // self.num_beams
+            state = self.get_state(prefix, batch_id)
+            states[(batch_id, prefix.tobytes())] = state
+            allowed = self.allowed_tokens(state, int(prefix[-1]), batch_id)
+            rows.extend([row] * len(allowed))
+            tokens.extend(allowed)
+        # only the states of the current step are needed by the next one
+        self._states = states
+        mask = torch.ones_like(scores, dtype=torch.bool)
+        mask[torch.tensor(rows, dtype=torch.long, device=scores.device),
+             torch.tensor(tokens, dtype=torch.long, device=scores.device)] = False
+        return scores.masked_fill(mask, -float("inf"))
+
+
 class ConstraintDecoder:
     def __init__(self, tokenizer, source_prefix):
         self.tokenizer = tokenizer
@@ -134,6 +265,10 @@ class StruConstraintDecoder(ConstraintDecoder):
         self.type_start = self.tokenizer.convert_tokens_to_ids([type_start])[0]
         self.type_end = self.tokenizer.convert_tokens_to_ids([type_end])[0]
 
+    def get_logits_processor(self, src_input_ids, num_beams=1, flat=False):
+        """Returns a `StruConstraintLogitsProcessor` constraining the generation for the inputs `src_input_ids`."""
+        return StruConstraintLogitsProcessor(self, src_input_ids, num_beams, flat)
+
     def check_state(self, tgt_generated):
         if tgt_generated[-1] == self.tokenizer.pad_token_id:
             return 'start', -1
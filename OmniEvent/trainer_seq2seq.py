@@ -19,6 +19,7 @@ from torch import nn
 from torch.utils.data import Dataset
 import logging
 
+from transformers import LogitsProcessorList
 from transformers.trainer_seq2seq import (
     is_deepspeed_zero3_enabled,
     PredictionOutput
@@ -292,13 +293,6 @@ class ConstrainedSeq2SeqTrainer(Seq2SeqTrainer):
             Tuple[Optional[float], Optional[torch.Tensor], Optional[torch.Tensor]]: A tuple with the loss, logits and
             labels (each being optional).
         """
-        def prefix_allowed_tokens_fn(batch_id, sent):
-            """Performs constraint decoding on the given batch and sentences."""
-            src_sentence = inputs['input_ids'][batch_id]
-            return self.constraint_decoder.constraint_decoding(batch_id=batch_id,
-                                                               src_sentence=src_sentence,
-                                                               tgt_generated=sent)
-
         if not self.args.predict_with_generate or prediction_loss_only:
             return super().prediction_step(
                 model, inputs, prediction_loss_only=prediction_loss_only, ignore_keys=ignore_keys
@@ -312,8 +306,12 @@ class ConstrainedSeq2SeqTrainer(Seq2SeqTrainer):
             "max_length": self._max_length if self._max_length is not None else self.model.config.max_length,
             "num_beams": self._num_beams if self._num_beams is not None else self.model.config.num_beams,
             "synced_gpus": True if is_deepspeed_zero3_enabled() else False,
-            "prefix_allowed_tokens_fn": prefix_allowed_tokens_fn if self.constraint_decoder else None,
         }
+        if self.constraint_decoder:
+            # the constraints are applied to all beams at once, see `StruConstraintLogitsProcessor`
+            gen_kwargs["logits_processor"] = LogitsProcessorList([
+                self.constraint_decoder.get_logits_processor(inputs["input_ids"], gen_kwargs["num_beams"])
+            ])
 
         if "attention_mask" in inputs:
             gen_kwargs["attention_mask"] = inputs.get("attention_mask", None)
@@ -0,0 +1,82 @@
+import os
+import sys
+import json
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../.."))
+
+DEFAULT_DATA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                 "../data_processing/ace2005-oneie/data/test.oneie.json")
+
+
+def normalize_type(event_type):
+    """Maps ACE types such as "Personnel:Start-Position" and predicted labels such as "startposition" to one form."""
+    event_type = event_type.split(":")[-1].lower()
+    for char in ["-", "_", " "]:
+        event_type = event_type.replace(char, "")
+    return event_type
+
+
+def load_sentences(data_file=DEFAULT_DATA_FILE, limit=None):
+    """Reads the bundled OneIE-format ACE 2005 sentences.
+
+    Returns:
+        instances (`List[Dict]`): Every instance has the whitespace-joined `text` and its gold `triggers` as a set of
+            `(normalized type, char start, char end)`.
+    """
+    instances = []
+    with open(data_file, "r", encoding="utf-8") as f:
+        for line in f:
+            item = json.loads(line)
+            char_starts, char_pos = [], 0
+            for token in item["tokens"]:
+                char_starts.append(char_pos)
+                char_pos += len(token) + 1
+            triggers = set()
+            for event in item["event_mentions"]:
+                start, end = event["trigger"]["start"], event["trigger"]["end"]
+                char_end = char_starts[end-1] + len(item["tokens"][end-1])
+                triggers.add((normalize_type(event["event_type"]), char_starts[start], char_end))
+            instances.append({
+                "text": " ".join(item["tokens"]),
+                "triggers": triggers
+            })
+            if limit is not None and len(instances) == limit:
+                break
+    return instances
+
+
+def trigger_f1(results, instances):
+    """Micro F1 of trigger classification, matching on type and char offsets."""
+    num_pred, num_gold, num_correct = 0, 0, 0
+    for result, instance in zip(results, instances):
+        preds = set((normalize_type(event["type"]), *event["offset"]) for event in result["events"])
+        num_pred += len(preds)
+        num_gold += len(instance["triggers"])
+        num_correct += len(preds & instance["triggers"])
+    precision = num_correct / num_pred if num_pred > 0 else 0.0
+    recall = num_correct / num_gold if num_gold > 0 else 0.0
+    return 2 * precision * recall / (precision + recall) if precision + recall > 0 else 0.0
+
+
+def percentile(values, q):
+    values = sorted(values)
+    if len(values) == 0:
+        return 0.0
+    return values[min(int(q / 100 * len(values)), len(values) - 1)]
+
+
+def timed_batches(fn, items, batch_size):
+    """Calls `fn` on consecutive batches of `items`. Returns the concatenated outputs and the per-batch latencies."""
+    outputs, latencies = [], []
+    for start in range(0, len(items), batch_size):
+        begin = time.perf_counter()
+        outputs.extend(fn(items[start:start+batch_size]))
+        latencies.append(time.perf_counter() - begin)
+    return outputs, latencies
+
+
+def print_table(header, rows):
+    widths = [max(len(str(row[i])) for row in [header] + rows) for i in range(len(header))]
+    for row in [header] + rows:
+        print(" | ".join(str(cell).ljust(width) for cell, width in zip(row, widths)))
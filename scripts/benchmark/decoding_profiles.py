@@ -0,0 +1,37 @@
+import argparse
+
+from common import DEFAULT_DATA_FILE, load_sentences, trigger_f1, percentile, timed_batches, print_table
+from OmniEvent.infer import infer_batch, get_pretrained, get_device
+from OmniEvent.infer_module.seq2seq import DECODING_PROFILES
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Latency / F1 trade-off of the ED decoding profiles.")
+    arg_parser.add_argument("--data_file", type=str, default=DEFAULT_DATA_FILE)
+    arg_parser.add_argument("--model", type=str, default="s2s-mt5-ed")
+    arg_parser.add_argument("--profiles", type=str, nargs="+", default=list(DECODING_PROFILES.keys()))
+    arg_parser.add_argument("--batch_size", type=int, default=16)
+    arg_parser.add_argument("--limit", type=int, default=None)
+    arg_parser.add_argument("--device", type=str, default="auto")
+    args = arg_parser.parse_args()
+
+    device = get_device(args.device)
+    model, tokenizer = get_pretrained(args.model, device)
+    instances = load_sentences(args.data_file, args.limit)
+    texts = [instance["text"] for instance in instances]
+
+    rows = []
+    for profile in args.profiles:
+        predict = lambda batch: infer_batch(batch, model=model, tokenizer=tokenizer, schemas="ace", task="ED",
+                                            device=device, batch_size=args.batch_size, decoding=profile)
+        # warm up
+        predict(texts[:args.batch_size])
+        results, latencies = timed_batches(predict, texts, args.batch_size)
+        rows.append([
+            profile,
+            f"{len(texts) / sum(latencies):.1f}",
+            f"{percentile(latencies, 50) * 1000:.1f}",
+            f"{percentile(latencies, 95) * 1000:.1f}",
+            f"{trigger_f1(results, instances) * 100:.2f}"
+        ])
+    print_table(["profile", "sentences/s", "p50 batch ms", "p95 batch ms", "trigger F1"], rows)
@@ -0,0 +1,56 @@
+import os
+import argparse
+import tempfile
+
+from common import DEFAULT_DATA_FILE, load_sentences, trigger_f1, percentile, timed_batches, print_table
+from OmniEvent.infer import infer_batch, get_pretrained
+from OmniEvent.infer_module.seq2seq import DECODING_PROFILES
+from OmniEvent.infer_module.onnx_export import export_onnx, CONFIG_FILE
+from OmniEvent.infer_module.onnx_runtime import OnnxSeq2SeqModel
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="CPU latency / F1 of the ED model in PyTorch and ONNX Runtime.")
+    arg_parser.add_argument("--data_file", type=str, default=DEFAULT_DATA_FILE)
+    arg_parser.add_argument("--model", type=str, default="s2s-mt5-ed")
+    arg_parser.add_argument("--onnx_dir", type=str, default=None,
+                            help="Directory of the exported model. It is exported there if missing, or to a temporary one.")
+    arg_parser.add_argument("--profiles", type=str, nargs="+", default=list(DECODING_PROFILES.keys()))
+    arg_parser.add_argument("--batch_size", type=int, default=16)
+    arg_parser.add_argument("--num_threads", type=int, default=None)
+    arg_parser.add_argument("--limit", type=int, default=None)
+    args = arg_parser.parse_args()
+
+    model, tokenizer = get_pretrained(args.model, "cpu", use_registry=False)
+    tmp_dir = tempfile.TemporaryDirectory() if args.onnx_dir is None else None
+    onnx_dir = tmp_dir.name if tmp_dir is not None else args.onnx_dir
+    if not os.path.exists(os.path.join(onnx_dir, CONFIG_FILE)):
+        export_onnx(model, onnx_dir, tokenizer)
+    onnx_model = OnnxSeq2SeqModel.from_pretrained(onnx_dir, num_threads=args.num_threads)
+    instances = load_sentences(args.data_file, args.limit)
+    texts = [instance["text"] for instance in instances]
+
+    rows = []
+    for profile in args.profiles:
+        baseline = None
+        for backend, backend_model in [("pytorch", model), ("onnx", onnx_model)]:
+            predict = lambda batch: infer_batch(batch, model=backend_model, tokenizer=tokenizer, schemas="ace",
+                                                task="ED", device="cpu", batch_size=args.batch_size,
+                                                decoding=profile)
+            # warm up
+            predict(texts[:args.batch_size])
+            results, latencies = timed_batches(predict, texts, args.batch_size)
+            baseline = baseline or results
+            rows.append([
+                profile,
+                backend,
+                f"{len(texts) / sum(latencies):.1f}",
+                f"{percentile(latencies, 50) * 1000:.1f}",
+                f"{percentile(latencies, 95) * 1000:.1f}",
+                f"{trigger_f1(results, instances) * 100:.2f}",
+                f"{sum(a == b for a, b in zip(results, baseline)) / len(texts) * 100:.1f}%"
+            ])
+    print_table(["profile", "backend", "sentences/s", "p50 batch ms", "p95 batch ms", "trigger F1",
+                 "same as pytorch"], rows)
+    if tmp_dir is not None:
+        tmp_dir.cleanup()
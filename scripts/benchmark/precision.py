@@ -0,0 +1,46 @@
+import argparse
+
+from common import DEFAULT_DATA_FILE, load_sentences, trigger_f1, percentile, timed_batches, print_table
+from OmniEvent.infer import infer_batch, get_pretrained, get_device
+from OmniEvent.infer_module.precision import PRECISIONS
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Latency / F1 of the ED model under reduced precision.")
+    arg_parser.add_argument("--data_file", type=str, default=DEFAULT_DATA_FILE)
+    arg_parser.add_argument("--model", type=str, default="s2s-mt5-ed")
+    arg_parser.add_argument("--precisions", type=str, nargs="+", default=PRECISIONS)
+    arg_parser.add_argument("--decoding", type=str, default="accurate")
+    arg_parser.add_argument("--batch_size", type=int, default=16)
+    arg_parser.add_argument("--limit", type=int, default=None)
+    arg_parser.add_argument("--device", type=str, default="cpu")
+    args = arg_parser.parse_args()
+
+    device = get_device(args.device)
+    instances = load_sentences(args.data_file, args.limit)
+    texts = [instance["text"] for instance in instances]
+
+    rows, baseline = [], None
+    # fp32 goes first, as the reference of the F1 delta and of the agreement
+    for precision in sorted(args.precisions, key=lambda precision: precision != "fp32"):
+        model, tokenizer = get_pretrained(args.model, device, precision=precision)
+        predict = lambda batch: infer_batch(batch, model=model, tokenizer=tokenizer, schemas="ace", task="ED",
+                                            device=device, batch_size=args.batch_size, decoding=args.decoding)
+        # warm up
+        predict(texts[:args.batch_size])
+        results, latencies = timed_batches(predict, texts, args.batch_size)
+        f1 = trigger_f1(results, instances)
+        if baseline is None and precision == "fp32":
+            baseline = (f1, results)
+        rows.append([
+            precision,
+            f"{len(texts) / sum(latencies):.1f}",
+            f"{percentile(latencies, 50) * 1000:.1f}",
+            f"{percentile(latencies, 95) * 1000:.1f}",
+            f"{f1 * 100:.2f}",
+            f"{(f1 - baseline[0]) * 100:+.2f}" if baseline is not None else "-",
+            f"{sum(a == b for a, b in zip(results, baseline[1])) / len(texts) * 100:.1f}%"
+            if baseline is not None else "-"
+        ])
+    print_table(["precision", "sentences/s", "p50 batch ms", "p95 batch ms", "trigger F1", "delta F1",
+                 "same as fp32"], rows)
@@ -0,0 +1,184 @@
+import os
+import re
+import json
+import time
+import random
+import asyncio
+import argparse
+
+from collections import Counter, defaultdict
+
+import httpx
+
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts", "data_processing",
+                              "ace2005-oneie", "data", "test.oneie.json")
+BUCKET_LINE = re.compile(r'^omnievent_batch_size_bucket\{task="([^"]+)",le="([^"]+)"\} (\S+)$')
+
+
+def load_corpus(path, min_words=3):
+    """Reads sentences from a JSONL file, from the `sentence` or `text` field of every line, or from a plain text
+    file with one sentence per line."""
+    sentences = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith("{"):
+                obj = json.loads(line)
+                line = obj.get("sentence", obj.get("text", ""))
+            if len(line.split()) >= min_words:
+                sentences.append(line)
+    return sentences
+
+
+def get_batch_sizes(metrics_text):
+    """Parses the batch size histogram of a `/metrics` page into `{task: {bound: cumulative count}}`."""
+    buckets = defaultdict(dict)
+    for line in metrics_text.splitlines():
+        match = BUCKET_LINE.match(line)
+        if match is not None:
+            buckets[match.group(1)][match.group(2)] = float(match.group(3))
+    return buckets
+
+
+def get_batch_size_distribution(before, after):
+    """Returns the number of batches of every size bucket run between two `get_batch_sizes` snapshots."""
+    distribution = {}
+    for task, bounds in after.items():
+        counts, previous = {}, 0
+        for bound, cumulative in bounds.items():
+            cumulative -= before.get(task, {}).get(bound, 0)
+            counts[bound] = int(cumulative - previous)
+            previous = cumulative
+        distribution[task] = {bound: count for bound, count in counts.items() if count > 0}
+    return distribution
+
+
+def percentile(sorted_values, q):
+    if len(sorted_values) == 0:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(q / 100 * len(sorted_values)))]
+
+
+async def run_load(client, sentences, num_requests, concurrency, rate=None, payload=None):
+    """Sends `num_requests` queries, cycling through `sentences`.
+
+    Without `rate`, `concurrency` clients send one query after another (closed loop). With `rate`, queries arrive as a
+    Poisson process of `rate` queries per second, whatever the server's latency (open loop), with at most
+    `concurrency` of them in flight.
+
+    Returns the latency in seconds and the status code of every query, and the total seconds taken.
+    """
+    latencies, statuses = [], Counter()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def query(i):
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                body = {**(payload or {}), "text": sentences[i % len(sentences)]}
+                response = await client.post("/api/query", json=body)
+                statuses[response.status_code] += 1
+            except httpx.HTTPError as e:
+                statuses[type(e).__name__] += 1
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    if rate is None:
+        async def client_loop(worker):
+            for i in range(worker, num_requests, concurrency):
+                await query(i)
+        await asyncio.gather(*[client_loop(worker) for worker in range(concurrency)])
+    else:
+        tasks = []
+        for i in range(num_requests):
+            tasks.append(asyncio.ensure_future(query(i)))
+            await asyncio.sleep(random.expovariate(rate))
+        await asyncio.gather(*tasks)
+    return latencies, statuses, time.perf_counter() - start
+
+
+def get_report(latencies, statuses, seconds, batch_sizes):
+    latencies = sorted(latencies)
+    succeeded = statuses.get(200, 0)
+    return {
+        "requests": len(latencies),
+        "statuses": {str(status): count for status, count in statuses.items()},
+        "seconds": round(seconds, 3),
+        "throughput": round(succeeded / seconds, 2) if seconds > 0 else None,
+        "latency_ms": {
+            name: round(percentile(latencies, q) * 1000, 2) if len(latencies) > 0 else None
+            for name, q in [("p50", 50), ("p90", 90), ("p99", 99), ("max", 100)]
+        },
+        "batch_sizes": batch_sizes
+    }
+
+
+def print_report(report):
+    print(f"{report['requests']} requests in {report['seconds']}s, {report['throughput']} succeeded per second")
+    print("statuses: " + ", ".join(f"{status}: {count}" for status, count in report["statuses"].items()))
+    print("latency (ms): " + ", ".join(f"{name} {value}" for name, value in report["latency_ms"].items()))
+    for task, counts in report["batch_sizes"].items():
+        print(f"{task} batch sizes (upper bound: batches): " +
+              ", ".join(f"{bound}: {count}" for bound, count in counts.items()))
+
+
+async def bench(args):
+    sentences = load_corpus(args.corpus)
+    if args.url is None:
+        if args.stub:
+            os.environ.setdefault("OMNIEVENT_DEVICE", "cpu")
+        import main
+        if args.stub:
+            from stub_model import get_stub_loader
+            main.model_manager.load_fn = get_stub_loader(sentences, args.step_ms)
+        if not args.cache:
+            # repeated sentences would otherwise measure the cache rather than the models
+            main.response_cache.max_size = 0
+        transport = httpx.ASGITransport(app=main.app)
+        client = httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=args.timeout)
+    else:
+        client = httpx.AsyncClient(base_url=args.url, timeout=args.timeout)
+    payload = {"task": args.task, "ontology": args.ontology, "decoding": args.decoding}
+    async with client:
+        # the warm-up loads the models, and is not measured
+        await run_load(client, sentences, args.warmup, args.concurrency, payload=payload)
+        before = get_batch_sizes((await client.get("/metrics")).text)
+        latencies, statuses, seconds = await run_load(client, sentences, args.requests, args.concurrency, args.rate,
+                                                      payload)
+        after = get_batch_sizes((await client.get("/metrics")).text)
+    if args.url is None:
+        await main.scheduler.stop()
+    return get_report(latencies, statuses, seconds, get_batch_size_distribution(before, after))
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Load-test the OmniEvent server, in-process or over HTTP.")
+    arg_parser.add_argument("--url", type=str, default=None,
+                            help="Base URL of a running server, e.g. http://127.0.0.1:9621. Defaults to running the "
+                                 "app in-process.")
+    arg_parser.add_argument("--stub", action="store_true",
+                            help="Serve in-process with stub models with a fixed decoding cost per token.")
+    arg_parser.add_argument("--step_ms", type=float, default=2.0, help="Milliseconds per decoding step of the stub.")
+    arg_parser.add_argument("--cache", action="store_true", help="Keep the response cache of an in-process app.")
+    arg_parser.add_argument("--corpus", type=str, default=DEFAULT_CORPUS)
+    arg_parser.add_argument("--requests", type=int, default=200)
+    arg_parser.add_argument("--warmup", type=int, default=4)
+    arg_parser.add_argument("--concurrency", type=int, default=16)
+    arg_parser.add_argument("--rate", type=float, default=None,
+                            help="Arrival rate in queries per second. Defaults to a closed loop of `concurrency` "
+                                 "clients.")
+    arg_parser.add_argument("--task", type=str, default="Event Detection")
+    arg_parser.add_argument("--ontology", type=str, default="ERE")
+    arg_parser.add_argument("--decoding", type=str, default="accurate")
+    arg_parser.add_argument("--timeout", type=float, default=120)
+    arg_parser.add_argument("--output", type=str, default=None, help="Writes the report as JSON.")
+    args = arg_parser.parse_args()
+    if args.stub and args.url is not None:
+        arg_parser.error("--stub serves the app in-process, and cannot be used with --url")
+
+    report = asyncio.run(bench(args))
+    print_report(report)
+    if args.output is not None:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=4)
@@ -0,0 +1,52 @@
+import json
+
+from collections import defaultdict
+
+
+def iter_ndjson(body):
+    """Yields the JSON object of every non-empty line of an NDJSON body, or the parsing error of the line. Lines are
+    parsed one at a time, so only the raw body is held in memory."""
+    start = 0
+    while start < len(body):
+        end = body.find(b"\n", start)
+        end = len(body) if end == -1 else end
+        line = body[start:end]
+        if line.strip():
+            yield parse_line(line)
+        start = end + 1
+
+
+def parse_line(line):
+    try:
+        return json.loads(line)
+    except ValueError as e:
+        return ValueError(f"Invalid JSON: {e}")
+
+
+def iter_chunks(objects, chunk_size):
+    """Groups an iterator into lists of `(index, object)` of at most `chunk_size` items."""
+    chunk = []
+    for index, obj in enumerate(objects):
+        chunk.append((index, obj))
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if len(chunk) > 0:
+        yield chunk
+
+
+def get_length_buckets(indexed_items, batch_size):
+    """Splits `(index, Input)` pairs into batches sharing a task, an ontology, a decoding profile and a timeout, of
+    similarly long texts."""
+    groups = defaultdict(list)
+    for index, item in indexed_items:
+        groups[(item.task, item.ontology.lower(), item.decoding, item.timeout_ms)].append((index, item))
+    batches = []
+    for group in groups.values():
+        group.sort(key=lambda pair: len(pair[1].text))
+        batches.extend(group[i:i+batch_size] for i in range(0, len(group), batch_size))
+    return batches
+
+
+def to_line(obj):
+    return json.dumps(obj, ensure_ascii=False) + "\n"
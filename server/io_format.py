@@ -1,6 +1,6 @@
 import os 
 from pydantic import BaseModel 
-from typing import List, Union, Tuple
+from typing import List, Union, Tuple, Optional, Literal
 
 
 class Input(BaseModel):
@@ -12,12 +12,27 @@ class Input(BaseModel):
         triggers: List of tuple `(trigger word, char offset start in text, char offset end in text)`; 
                     The char offset is left closed right open.
         ontology: Selected in `{"ERE", "MAVEN", "LEVEN", "DuEE", "FewFC"}`
+        decoding: Decoding profile. Selected in `{"accurate", "fast", "speculative"}`. `fast` trades some accuracy for
+                    latency, and `speculative` gives the outputs of `fast` in fewer decoding steps.
+        timeout_ms: Milliseconds after which the server gives up on the input. Generation running at that time stops
+                    early. Defaults to the server's `request_timeout_ms`.
     """
     text: str 
     language: str = "English"
-    task: str = "Event Detection"
+    task: Literal["Event Detection", "Event Argument Extraction", "Event Extraction"] = "Event Detection"
     ontology: str = "ERE"
     triggers: List[Tuple]= []
+    decoding: Literal["accurate", "fast", "speculative"] = "accurate"
+    timeout_ms: Optional[float] = None
+
+
+class ModelUpdate(BaseModel):
+    """Model update format.
+    Args:
+        path: Path of the checkpoint to serve. Only the paths of the `models` setting and the checkpoints under the
+              `model_dirs` setting are accepted.
+    """
+    path: str
 
 
 class Argument:
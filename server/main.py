@@ -1,12 +1,18 @@
 from asyncio.log import logger
 import os 
+import re
+import sys
+import hmac
 import json
-os.environ["CUDA_VISIBLE_DEVICES"] = "0"
+import time
+import asyncio
+import functools
+import threading
 
-from typing import Union, List, Tuple
-from fastapi import FastAPI, Request
+from typing import Union, List, Tuple, Optional
+from fastapi import FastAPI, Request, HTTPException, WebSocket, WebSocketDisconnect, Header
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, StreamingResponse, JSONResponse, PlainTextResponse
 from fastapi.templating import Jinja2Templates
 import logging 
 
@@ -19,16 +25,26 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
-from model.seq2seq import (
-    get_backbone,
-    do_event_detection,
-    do_event_argument_extraction
-)
-from io_format import Result, Event, Argument, Input
-from extract_utils import get_ed_result, get_eae_result
-from extract_utils import (
-    prepare_for_eae_from_input,
-    prepare_for_eae_from_pred
+# the inference engine lives in the package, which is imported from the repository root
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from OmniEvent.infer_module.engine import InferenceEngine, StageTimer
+from OmniEvent.infer_module.batching import BatchScheduler, QueueFullError, DeadlineExceededError
+from OmniEvent.infer_module.cache import ResultCache
+from OmniEvent.infer_module.model_manager import ModelManager
+from io_format import Input, ModelUpdate
+from bulk import iter_ndjson, iter_chunks, get_length_buckets, to_line
+from settings import settings
+from metrics import (
+    REGISTRY,
+    REQUESTS,
+    REQUEST_SECONDS,
+    STAGE_SECONDS,
+    QUEUE_WAIT_SECONDS,
+    REJECTED,
+    CACHE_LOOKUPS,
+    FIRST_RESULT_SECONDS,
+    Gauge,
+    observe_batch
 )
 from fastapi.middleware.cors import CORSMiddleware
 origins = [
@@ -43,20 +59,57 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-app.mount("/static", StaticFiles(directory="static"), name="static")
-templates = Jinja2Templates(directory="static")
+# relative to this file, so that the app can also be imported from elsewhere, e.g. by the tests
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
+templates = Jinja2Templates(directory=STATIC_DIR)
+
+
+# models are loaded on first use, or in the background by `startup`
+model_manager = ModelManager(settings.models, settings.device)
+
+
+def on_batch(key, num_items, waits):
+    for wait in waits:
+        QUEUE_WAIT_SECONDS.observe(wait, task=key[0])
+
 
+def on_cache_lookup(task, outcome):
+    CACHE_LOOKUPS.inc(task=task, outcome=outcome)
 
-# model 
-model_path = "/data/ph/OmniEvent_Model/s2s-mt5-ed"
-ed_model, ed_tokenizer, _ = get_backbone("t5", model_path, model_path)
-ed_model.cuda()
-ed_model.eval()
 
-model_path = "/data/ph/OmniEvent_Model/s2s-mt5-eae"
-eae_model, eae_tokenizer, _ = get_backbone("t5", model_path, model_path)
-eae_model.cuda()
-eae_model.eval()
+# ED outputs are shared by Event Detection and Event Extraction requests on the same text
+response_cache = ResultCache(max_size=settings.cache_size, ttl_seconds=settings.cache_ttl_s)
+engine = InferenceEngine(model_manager,
+                         scheduler_fn=functools.partial(BatchScheduler,
+                                                        max_batch_size=settings.max_batch_size,
+                                                        max_wait_ms=settings.max_wait_ms,
+                                                        max_queue_size=settings.max_queue_size,
+                                                        on_batch=on_batch),
+                         cache=response_cache,
+                         on_batch=observe_batch,
+                         on_cache_lookup=on_cache_lookup)
+scheduler = engine.scheduler
+QUEUE_DEPTH = Gauge("omnievent_queue_depth", "Number of requests waiting to be batched.", lambda: scheduler.queue_depth)
+CACHE_ENTRIES = Gauge("omnievent_cache_entries", "Number of ED / EAE outputs in the response cache.",
+                      lambda: len(response_cache))
+# the tasks of `Input` and their names in the engine
+TASKS = {
+    "Event Detection": "ED",
+    "Event Argument Extraction": "EAE",
+    "Event Extraction": "EE"
+}
+
+
+@app.on_event("startup")
+async def startup():
+    # preloading runs in the background, so the server accepts requests right away
+    threading.Thread(target=model_manager.preload, args=(settings.preload,), daemon=True).start()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await engine.stop()
 
 
 # @app.get("/")
@@ -73,34 +126,224 @@ def root(request: Request):
     )
 
 
+def get_deadline(items):
+    """Returns the `time.monotonic()` deadline of inputs run together, from the earliest `timeout_ms` among them or the
+    `request_timeout_ms` setting, or `None` if they have none."""
+    timeouts = [item.timeout_ms if item.timeout_ms is not None else settings.request_timeout_ms for item in items]
+    timeouts = [timeout for timeout in timeouts if timeout > 0]
+    return time.monotonic() + min(timeouts) / 1000 if len(timeouts) > 0 else None
+
+
+def get_task(task):
+    if task not in TASKS:
+        raise ValueError(f"Unknown task: {task}")
+    return TASKS[task]
+
+
+async def run_inputs(items, timer=None, block=False):
+    """Runs inputs sharing a task, an ontology and a decoding profile in one batch, and returns the result of every
+    input. `timer`, if given, receives the stages of the batches the inputs ran in.
+
+    Raises `QueueFullError` if the scheduler queue is full, unless `block`, in which case the inputs wait for a free
+    slot, and `DeadlineExceededError` if the deadline of the inputs passes first.
+    """
+    timer = timer if timer is not None else StageTimer()
+    task = get_task(items[0].task)
+    results = await engine.run([item.text for item in items],
+                               task,
+                               items[0].ontology,
+                               triggers=[item.triggers for item in items],
+                               decoding=items[0].decoding,
+                               timer=timer,
+                               deadline=get_deadline(items),
+                               block=block)
+    STAGE_SECONDS.observe(timer.seconds["offsets"], task="ED" if task == "ED" else "EAE", stage="offsets")
+    return results
+
+
 @app.post("/api/query")
-async def main(item: Input):
+async def main(item: Input, debug: bool = False):
+    """With `debug` (or the `OMNIEVENT_DEBUG` setting), the time spent in every stage is returned in the
+    `Server-Timing` header.
+
+    Responds with a 503 when the scheduler queue is full, so that clients back off instead of piling up, and with a
+    504 when the input's deadline passes before its results are ready.
+    """
     logger.info(item)
-    schema = f"<{item.ontology.lower()}>"
-    if item.task == "Event Detection":
-        events = do_event_detection(ed_model, ed_tokenizer, [item.text], [schema])
-        results = get_ed_result([item.text], events)
-    elif item.task == "Event Argument Extraction":
-        if len(item.triggers) == 0:
-            results = [{
-                "text": item.text,
-                "events": []
-            }]
-            return results
-        instances = prepare_for_eae_from_input([item.text], [item.triggers], [schema])
-        arguments = do_event_argument_extraction(eae_model, eae_tokenizer, instances)
-        results = get_eae_result(instances, arguments)
-    elif item.task == "Event Extraction":
-        events = do_event_detection(ed_model, ed_tokenizer, [item.text], [schema])
-        instances = prepare_for_eae_from_pred([item.text], events, [schema])
-        if len(instances[0]["triggers"]) == 0:
-            results = [{
-                "text": instances[0]["text"],
-                "events": []
-            }]
-            return results
-        arguments = do_event_argument_extraction(eae_model, eae_tokenizer, instances)
-        results = get_eae_result(instances, arguments)
+    start = time.perf_counter()
+    timer = StageTimer()
+    try:
+        results = await run_inputs([item], timer)
+    except QueueFullError as e:
+        REJECTED.inc(endpoint="query", reason="queue_full")
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except DeadlineExceededError as e:
+        REJECTED.inc(endpoint="query", reason="deadline")
+        raise HTTPException(status_code=504, detail=str(e))
+    REQUESTS.inc(endpoint="query", task=item.task)
+    REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint="query")
     logger.info(results)
+    if debug or settings.debug:
+        return JSONResponse(results, headers={"Server-Timing": timer.server_timing()})
     return results
 
+
+async def stream_batch(objects, debug=False):
+    """Yields one NDJSON line per input as soon as its batch finishes, scheduling one chunk of inputs at a time. With
+    `debug`, every line holds the milliseconds spent in every stage of its batch under `timing`."""
+    for chunk in iter_chunks(objects, settings.bulk_chunk_size):
+        items = []
+        for index, obj in chunk:
+            try:
+                if isinstance(obj, Exception):
+                    raise obj
+                items.append((index, Input(**obj)))
+            except Exception as e:
+                yield to_line({"index": index, "error": str(e)})
+
+        async def run_bucket(bucket):
+            timer = StageTimer()
+            try:
+                # bulk inputs wait for queue slots rather than being rejected
+                return bucket, await run_inputs([item for _, item in bucket], timer, block=True), timer
+            except DeadlineExceededError as e:
+                REJECTED.inc(len(bucket), endpoint="batch", reason="deadline")
+                return bucket, e, timer
+            except Exception as e:
+                return bucket, e, timer
+
+        tasks = [run_bucket(bucket) for bucket in get_length_buckets(items, settings.max_batch_size)]
+        for task in asyncio.as_completed(tasks):
+            bucket, results, timer = await task
+            timing = {}
+            if debug:
+                timing["timing"] = {name: round(seconds * 1000, 2) for name, seconds in timer.seconds.items()}
+            for i, (index, item) in enumerate(bucket):
+                if isinstance(results, Exception):
+                    yield to_line({"index": index, "error": str(results), **timing})
+                else:
+                    # the task of a validated `Input` is one of `TASKS`, which bounds the label values
+                    REQUESTS.inc(endpoint="batch", task=item.task)
+                    yield to_line({"index": index, **results[i], **timing})
+
+
+@app.post("/api/batch")
+async def batch(request: Request, debug: bool = False):
+    """Runs a list of `Input`s, given as a JSON array or as an NDJSON body (`Content-Type: application/x-ndjson`).
+
+    The response is NDJSON with one line per input, in completion order, holding its `index` in the request along with
+    its result, or an `error`. The body is read before the response starts, since a streaming response takes over the
+    receive channel, but NDJSON lines are only parsed when their chunk is scheduled.
+    """
+    if request.headers.get("content-type", "").startswith("application/x-ndjson"):
+        objects = iter_ndjson(await request.body())
+    else:
+        objects = await request.json()
+    return StreamingResponse(stream_batch(objects, debug or settings.debug), media_type="application/x-ndjson")
+
+
+async def stream_events(item):
+    """Yields the messages of `InferenceEngine.stream` for a streamed query, or an `error` message, and records its
+    metrics."""
+    start = time.perf_counter()
+    first = True
+    try:
+        async for message in engine.stream(item.text, get_task(item.task), item.ontology, item.triggers,
+                                           item.decoding, get_deadline([item])):
+            if first and message["event"] in ["trigger", "arguments"]:
+                FIRST_RESULT_SECONDS.observe(time.perf_counter() - start, task=item.task)
+                first = False
+            yield message
+        REQUESTS.inc(endpoint="stream", task=item.task)
+        REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint="stream")
+    except (QueueFullError, DeadlineExceededError) as e:
+        REJECTED.inc(endpoint="stream", reason="queue_full" if isinstance(e, QueueFullError) else "deadline")
+        yield {"event": "error", "error": str(e)}
+    except Exception as e:
+        logger.exception("Streamed query failed")
+        yield {"event": "error", "error": str(e)}
+
+
+@app.websocket("/ws/query")
+async def query_websocket(websocket: WebSocket):
+    """Streams the results of every `Input` sent on the socket, one after another, as the messages of
+    `stream_events`."""
+    await websocket.accept()
+    try:
+        while True:
+            obj = await websocket.receive_json()
+            try:
+                item = Input(**obj)
+            except Exception as e:
+                await websocket.send_json({"event": "error", "error": str(e)})
+                continue
+            async for message in stream_events(item):
+                await websocket.send_json(message)
+    except WebSocketDisconnect:
+        pass
+
+
+@app.post("/api/query/stream")
+async def query_stream(item: Input):
+    """Streams the messages of `stream_events` as NDJSON, for clients without WebSockets."""
+    async def iter_lines():
+        async for message in stream_events(item):
+            yield to_line(message)
+    return StreamingResponse(iter_lines(), media_type="application/x-ndjson")
+
+
+@app.get("/metrics")
+async def metrics():
+    """Exposes latency, throughput and batching metrics in the Prometheus text format."""
+    return PlainTextResponse(REGISTRY.exposition(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/api/models")
+async def list_models():
+    return model_manager.status()
+
+
+MODEL_NAME = re.compile(r"^(ED|EAE)(:[a-z0-9_-]+)?$")
+
+
+def is_allowed_path(path):
+    """Whether `path` is a configured model path, or lies under one of the `model_dirs`. Loading a checkpoint unpickles
+    it, so only trusted files may be loaded."""
+    if path in settings.models.values():
+        return True
+    path = os.path.realpath(path)
+    for model_dir in settings.model_dirs:
+        model_dir = os.path.realpath(model_dir)
+        if os.path.commonpath([path, model_dir]) == model_dir:
+            return True
+    return False
+
+
+def check_admin(authorization):
+    if settings.admin_token is None:
+        raise HTTPException(status_code=403, detail="Model swaps are disabled. Set OMNIEVENT_ADMIN_TOKEN to enable "
+                                                    "them.")
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token.encode(), settings.admin_token.encode()):
+        raise HTTPException(status_code=401, detail="Invalid admin token", headers={"WWW-Authenticate": "Bearer"})
+
+
+@app.post("/api/models/{name}")
+async def swap_model(name: str, update: ModelUpdate, authorization: Optional[str] = Header(None)):
+    """Loads the checkpoint at `update.path` and swaps it in for `name`, which may also add a model for a new ontology,
+    e.g. `ED:maven`. Requests keep being served meanwhile.
+
+    Requires the `admin_token` setting, sent as `Authorization: Bearer <token>`, and only loads the configured model
+    paths and the checkpoints under the `model_dirs` setting.
+    """
+    check_admin(authorization)
+    if MODEL_NAME.match(name) is None:
+        raise HTTPException(status_code=400, detail=f"Invalid model name: {name}")
+    if not is_allowed_path(update.path):
+        raise HTTPException(status_code=403, detail=f"{update.path} is not a configured model path, nor under the "
+                                                    "model_dirs setting")
+    try:
+        loaded = await asyncio.get_running_loop().run_in_executor(None, model_manager.swap, name, update.path)
+    except (OSError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return loaded.status()
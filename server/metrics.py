@@ -0,0 +1,143 @@
+import threading
+
+from collections import defaultdict
+
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+
+def escape_label(value):
+    """Escapes a label value for the Prometheus text format."""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labels):
+    if len(labels) == 0:
+        return ""
+    return "{" + ",".join(f'{name}="{escape_label(value)}"' for name, value in labels) + "}"
+
+
+class Metric():
+    type = None
+
+    def __init__(self, name, documentation, registry=None):
+        self.name = name
+        self.documentation = documentation
+        self._lock = threading.Lock()
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def collect(self):
+        raise NotImplementedError
+
+    def exposition(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        return "\n".join(lines + self.collect())
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name, documentation, registry=None):
+        super().__init__(name, documentation, registry)
+        self._values = defaultdict(float)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] += amount
+
+    def collect(self):
+        with self._lock:
+            return [f"{self.name}{format_labels(key)} {value}" for key, value in self._values.items()]
+
+
+class Gauge(Metric):
+    """A value read by `function` at scrape time."""
+    type = "gauge"
+
+    def __init__(self, name, documentation, function, registry=None):
+        super().__init__(name, documentation, registry)
+        self.function = function
+
+    def collect(self):
+        return [f"{self.name} {self.function()}"]
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, buckets=LATENCY_BUCKETS, registry=None):
+        super().__init__(name, documentation, registry)
+        self.buckets = tuple(buckets)
+        # per label set: the count of every bucket, then the sum and the total count
+        self._values = {}
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            if key not in self._values:
+                self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            counts, _, _ = values = self._values[key]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            values[1] += value
+            values[2] += 1
+
+    def collect(self):
+        lines = []
+        with self._lock:
+            for key, (counts, total, count) in self._values.items():
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    lines.append(f"{self.name}_bucket{format_labels(key + (('le', bound),))} {cumulative}")
+                lines.append(f"{self.name}_bucket{format_labels(key + (('le', '+Inf'),))} {count}")
+                lines.append(f"{self.name}_sum{format_labels(key)} {total}")
+                lines.append(f"{self.name}_count{format_labels(key)} {count}")
+        return lines
+
+
+class Registry():
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+
+    def exposition(self):
+        """Returns all metrics in the Prometheus text format."""
+        return "\n".join(metric.exposition() for metric in self.metrics) + "\n"
+
+
+REGISTRY = Registry()
+
+
+REQUESTS = Counter("omnievent_requests_total", "Number of inputs served, per endpoint and task.")
+REQUEST_SECONDS = Histogram("omnievent_request_seconds", "End-to-end latency of a request, per endpoint.")
+STAGE_SECONDS = Histogram("omnievent_stage_seconds",
+                          "Seconds spent per batch in every stage: tokenize, generate, decode, extract and offsets.")
+FIRST_RESULT_SECONDS = Histogram("omnievent_first_result_seconds",
+                                 "Seconds until the first trigger or arguments of a streamed query, per task.")
+QUEUE_WAIT_SECONDS = Histogram("omnievent_queue_wait_seconds", "Seconds a request waited for its batch to start.")
+BATCH_SIZE = Histogram("omnievent_batch_size", "Number of requests per batched pass.", buckets=SIZE_BUCKETS)
+BATCH_ROWS = Histogram("omnievent_batch_rows", "Number of sequences decoded per batched pass.", buckets=SIZE_BUCKETS)
+TOKENS_IN = Counter("omnievent_tokens_in_total", "Number of input tokens, padding excluded.")
+TOKENS_OUT = Counter("omnievent_tokens_out_total", "Number of generated tokens, padding excluded.")
+CACHE_LOOKUPS = Counter("omnievent_cache_lookups_total",
+                        "Number of ED / EAE outputs looked up in the response cache, per task and outcome: hit, "
+                        "shared (joined an identical running computation) or miss.")
+REJECTED = Counter("omnievent_rejected_total",
+                   "Number of inputs not served, per endpoint and reason: queue_full or deadline.")
+
+
+def observe_batch(task, timer, num_items):
+    """Records the stages and sizes of one batched pass."""
+    for stage, seconds in timer.seconds.items():
+        STAGE_SECONDS.observe(seconds, task=task, stage=stage)
+    BATCH_SIZE.observe(num_items, task=task)
+    BATCH_ROWS.observe(timer.counts["rows"], task=task)
+    TOKENS_IN.inc(timer.counts["tokens_in"], task=task)
+    TOKENS_OUT.inc(timer.counts["tokens_out"], task=task)
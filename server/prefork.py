@@ -0,0 +1,100 @@
+import os
+import gc
+import signal
+import socket
+import logging
+import argparse
+
+import torch
+import uvicorn
+
+import main
+from settings import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+def bind_socket(host, port):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(sock, num_threads):
+    """Serves the app on the inherited socket, in a forked worker."""
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    # the workers share the cores instead of each one spawning a thread per core
+    torch.set_num_threads(num_threads)
+    server = uvicorn.Server(uvicorn.Config(main.app, log_level="info"))
+    server.run(sockets=[sock])
+
+
+def fork_worker(sock, num_threads):
+    pid = os.fork()
+    if pid == 0:
+        try:
+            run_worker(sock, num_threads)
+        finally:
+            os._exit(0)
+    return pid
+
+
+def serve(host="0.0.0.0", port=9621, workers=2, num_threads=None):
+    """Serves the app with `workers` processes sharing one copy of the model weights.
+
+    The master loads the `preload` models, then forks the workers, which share the weight pages copy-on-write: the
+    weights are only read during inference, so the pages are never copied, and `workers` CPU workers take about the
+    memory of one. Models loaded or swapped after the fork are private to the worker that loaded them. Every worker
+    keeps its own batching queue, cache and metrics. The master restarts workers that exit, and stops them on SIGINT /
+    SIGTERM.
+
+    Args:
+        num_threads: Torch threads per worker. Defaults to the number of cores divided by `workers`.
+    """
+    if settings.device != "cpu":
+        # CUDA contexts do not survive a fork
+        raise ValueError(f"Pre-fork serving runs on CPU, got device {settings.device}")
+    num_threads = num_threads or max(1, (os.cpu_count() or 1) // workers)
+    main.model_manager.preload(settings.preload)
+    # objects created so far are moved out of the collector's reach, so that collections in the workers do not write
+    # to, and thereby copy, the pages holding them
+    gc.freeze()
+    sock = bind_socket(host, port)
+    pids = {fork_worker(sock, num_threads) for _ in range(workers)}
+    logger.info(f"Serving on {host}:{port} with {workers} workers of {num_threads} threads")
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in pids:
+            os.kill(pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    while len(pids) > 0:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        pids.discard(pid)
+        if not stopping:
+            logger.warning(f"Worker {pid} exited with status {status}, restarting it")
+            pids.add(fork_worker(sock, num_threads))
+    sock.close()
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Serve OmniEvent with pre-forked workers sharing model weights.")
+    arg_parser.add_argument("--host", type=str, default="0.0.0.0")
+    arg_parser.add_argument("--port", type=int, default=9621)
+    arg_parser.add_argument("--workers", type=int, default=2)
+    arg_parser.add_argument("--threads", type=int, default=None, help="Torch threads per worker.")
+    args = arg_parser.parse_args()
+    serve(args.host, args.port, args.workers, args.threads)
@@ -0,0 +1,77 @@
+import os
+import json
+
+
+DEFAULT_MODELS = {
+    "ED": "s2s-mt5-ed",
+    "EAE": "s2s-mt5-eae"
+}
+
+
+def get_default_device():
+    import torch
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+
+def get_list(value):
+    """Splits a comma-separated environment variable, so that an empty one is an empty list."""
+    return [item.strip() for item in value.split(",") if item.strip() != ""]
+
+
+class Settings():
+    """Server settings, read from a JSON config file given by `OMNIEVENT_SERVER_CONFIG`, then from environment
+    variables, which take precedence.
+
+    Args:
+        max_batch_size: Maximum number of requests run in one batched ED / EAE pass (`OMNIEVENT_MAX_BATCH_SIZE`).
+        max_wait_ms: Milliseconds the batching worker waits for more requests after the first one arrives
+            (`OMNIEVENT_MAX_WAIT_MS`).
+        max_queue_size: Maximum number of requests waiting to be batched (`OMNIEVENT_MAX_QUEUE_SIZE`). Further
+            `/api/query` requests are rejected with a 503, while `/api/batch` requests wait for a free slot.
+        request_timeout_ms: Default deadline of a request in milliseconds (`OMNIEVENT_REQUEST_TIMEOUT_MS`), which an
+            input can override with its own `timeout_ms`. `0` means no deadline.
+        bulk_chunk_size: Number of inputs of a `/api/batch` request read and scheduled at a time
+            (`OMNIEVENT_BULK_CHUNK_SIZE`).
+        cache_size: Maximum number of ED / EAE outputs kept in the response cache (`OMNIEVENT_CACHE_SIZE`). `0`
+            disables the cache.
+        cache_ttl_s: Seconds after which a cached output expires (`OMNIEVENT_CACHE_TTL_S`).
+        device: Device the models are placed on (`OMNIEVENT_DEVICE`). Defaults to CUDA when available.
+        models: Checkpoint path of every model name. `ED` and `EAE` serve all ontologies, and `ED:<ontology>` /
+            `EAE:<ontology>`, e.g. `ED:maven`, override them for one ontology. The `ED` and `EAE` paths can also be
+            set with `OMNIEVENT_ED_MODEL` and `OMNIEVENT_EAE_MODEL`. Defaults to the released `s2s-mt5-ed` and
+            `s2s-mt5-eae` models, which are downloaded on first use.
+        preload: Model names loaded in the background at startup (`OMNIEVENT_PRELOAD`, comma-separated). The others
+            are loaded on first use.
+        admin_token: Token of the model swap endpoint (`OMNIEVENT_ADMIN_TOKEN`), sent as `Authorization: Bearer
+            <token>`. The endpoint is disabled without it.
+        model_dirs: Directories whose checkpoints may be swapped in (`OMNIEVENT_MODEL_DIRS`, comma-separated), besides
+            the paths of `models`.
+        debug: Whether every response includes the time spent in every stage (`OMNIEVENT_DEBUG`).
+    """
+    def __init__(self):
+        config = {}
+        if os.environ.get("OMNIEVENT_SERVER_CONFIG") is not None:
+            with open(os.environ["OMNIEVENT_SERVER_CONFIG"], "r", encoding="utf-8") as f:
+                config = json.load(f)
+        self.max_batch_size = int(os.environ.get("OMNIEVENT_MAX_BATCH_SIZE", config.get("max_batch_size", 16)))
+        self.max_wait_ms = float(os.environ.get("OMNIEVENT_MAX_WAIT_MS", config.get("max_wait_ms", 10)))
+        self.max_queue_size = int(os.environ.get("OMNIEVENT_MAX_QUEUE_SIZE", config.get("max_queue_size", 1024)))
+        self.request_timeout_ms = float(os.environ.get("OMNIEVENT_REQUEST_TIMEOUT_MS",
+                                                       config.get("request_timeout_ms", 0)))
+        self.bulk_chunk_size = int(os.environ.get("OMNIEVENT_BULK_CHUNK_SIZE", config.get("bulk_chunk_size", 256)))
+        self.cache_size = int(os.environ.get("OMNIEVENT_CACHE_SIZE", config.get("cache_size", 4096)))
+        self.cache_ttl_s = float(os.environ.get("OMNIEVENT_CACHE_TTL_S", config.get("cache_ttl_s", 300)))
+        self.device = os.environ.get("OMNIEVENT_DEVICE", config.get("device")) or get_default_device()
+        self.models = {**DEFAULT_MODELS, **config.get("models", {})}
+        for task in ["ED", "EAE"]:
+            if os.environ.get(f"OMNIEVENT_{task}_MODEL") is not None:
+                self.models[task] = os.environ[f"OMNIEVENT_{task}_MODEL"]
+        preload = os.environ.get("OMNIEVENT_PRELOAD")
+        self.preload = get_list(preload) if preload is not None else config.get("preload", ["ED", "EAE"])
+        self.admin_token = os.environ.get("OMNIEVENT_ADMIN_TOKEN", config.get("admin_token")) or None
+        model_dirs = os.environ.get("OMNIEVENT_MODEL_DIRS")
+        self.model_dirs = get_list(model_dirs) if model_dirs is not None else config.get("model_dirs", [])
+        self.debug = os.environ.get("OMNIEVENT_DEBUG", str(config.get("debug", False))).lower() in ["1", "true"]
+
+
+settings = Settings()
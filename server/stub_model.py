@@ -0,0 +1,76 @@
+import time
+import torch
+
+from tokenizers import Tokenizer, models, pre_tokenizers
+from transformers import PreTrainedTokenizerFast
+
+
+SPECIAL_TOKENS = ["<pad>", "</s>", "<unk>", "<extra_id_0>", "<extra_id_1>", "<event>", "</event>"]
+STUB_TYPE = "attack"
+
+
+def build_stub_tokenizer(texts):
+    """Builds a whitespace tokenizer whose vocabulary is the words of `texts`."""
+    vocab = {token: i for i, token in enumerate(SPECIAL_TOKENS)}
+    for word in [":", STUB_TYPE] + [word for text in texts for word in text.split()]:
+        vocab.setdefault(word, len(vocab))
+    tokenizer = Tokenizer(models.WordLevel(vocab, unk_token="<unk>"))
+    tokenizer.pre_tokenizer = pre_tokenizers.WhitespaceSplit()
+    return PreTrainedTokenizerFast(tokenizer_object=tokenizer,
+                                   pad_token="<pad>",
+                                   eos_token="</s>",
+                                   unk_token="<unk>",
+                                   additional_special_tokens=SPECIAL_TOKENS[3:])
+
+
+class StubModel():
+    """Stands in for a Seq2Seq model, to load-test the server without checkpoints.
+
+    Every word of the input with at least `min_trigger_length` letters, up to `max_groups` of them, is output as an
+    `<extra_id_0> attack : word <extra_id_1>` group, so the output is parsed like real ED and EAE predictions. Every
+    decoding step sleeps `step_ms`, whatever the batch size, as on an accelerator that one batch does not saturate,
+    and is shown to the logits processors, so that streamed decoding can be tested too.
+    """
+    def __init__(self, tokenizer, step_ms=2.0, min_trigger_length=7, max_groups=4):
+        self.tokenizer = tokenizer
+        self.step_ms = step_ms
+        self.max_groups = max_groups
+        self.device = torch.device("cpu")
+        vocab = tokenizer.get_vocab()
+        self.word_ids = {i for word, i in vocab.items() if word.isalpha() and len(word) >= min_trigger_length}
+        self.group_ids = [vocab["<extra_id_0>"], vocab[STUB_TYPE], vocab[":"], None, vocab["<extra_id_1>"]]
+
+    def to(self, device):
+        return self
+
+    def eval(self):
+        return self
+
+    def get_output(self, input_ids):
+        words = [i for i in input_ids if i in self.word_ids][:self.max_groups]
+        output = [self.tokenizer.pad_token_id]
+        for word in words:
+            output.extend(word if i is None else i for i in self.group_ids)
+        return output + [self.tokenizer.eos_token_id]
+
+    def generate(self, input_ids, max_length=128, stopping_criteria=None, logits_processor=None, **kwargs):
+        outputs = [self.get_output(ids)[:max_length] for ids in input_ids.tolist()]
+        length = max(len(output) for output in outputs)
+        outputs = torch.tensor([output + [self.tokenizer.pad_token_id] * (length - len(output)) for output in outputs])
+        # the decoder start token is not generated
+        for step in range(2, length + 1):
+            time.sleep(self.step_ms / 1000)
+            if logits_processor is not None:
+                logits_processor(outputs[:, :step], None)
+            if stopping_criteria is not None and torch.as_tensor(stopping_criteria(outputs[:, :step], None)).all():
+                return outputs[:, :step]
+        return outputs
+
+
+def get_stub_loader(texts, step_ms=2.0):
+    """Returns a `ModelManager` `load_fn` loading `StubModel`s that know the words of `texts`."""
+    tokenizer = build_stub_tokenizer(texts)
+
+    def load_stub(path, device):
+        return StubModel(tokenizer, step_ms), tokenizer
+    return load_stub
@@ -0,0 +1,49 @@
+import torch
+from tokenizers import Tokenizer, models, pre_tokenizers
+from transformers import PreTrainedTokenizerFast
+
+
+SPECIAL_TOKENS = ["<pad>", "</s>", "<unk>", "<extra_id_0>", "<extra_id_1>", "<event>", "</event>", "<ace>"]
+
+
+def get_tokenizer(texts):
+    """Builds a whitespace tokenizer whose vocabulary is the words of `texts`."""
+    vocab = {token: i for i, token in enumerate(SPECIAL_TOKENS)}
+    for word in [":", "attack", "target"] + [word for text in texts for word in text.split()]:
+        vocab.setdefault(word, len(vocab))
+    tokenizer = Tokenizer(models.WordLevel(vocab, unk_token="<unk>"))
+    tokenizer.pre_tokenizer = pre_tokenizers.WhitespaceSplit()
+    return PreTrainedTokenizerFast(tokenizer_object=tokenizer, pad_token="<pad>", eos_token="</s>",
+                                   unk_token="<unk>", additional_special_tokens=SPECIAL_TOKENS[3:])
+
+
+class FakeModel():
+    """Stands in for a Seq2Seq model. Outputs an `attack` group for every input word in `triggers`, or a `target` group
+    for "city" if the input is an EAE one, showing every step to the logits processors."""
+    def __init__(self, tokenizer, triggers=("attacked", "fired")):
+        self.tokenizer = tokenizer
+        self.device = torch.device("cpu")
+        self.vocab = tokenizer.get_vocab()
+        self.trigger_ids = {self.vocab[trigger] for trigger in triggers}
+        self.calls = 0
+
+    def get_output(self, input_ids):
+        vocab = self.vocab
+        if vocab["<event>"] in input_ids:
+            words, role = [vocab["city"]], vocab["target"]
+        else:
+            words, role = [i for i in input_ids if i in self.trigger_ids], vocab["attack"]
+        output = [vocab["<pad>"]]
+        for word in words:
+            output.extend([vocab["<extra_id_0>"], role, vocab[":"], word, vocab["<extra_id_1>"]])
+        return output + [vocab["</s>"]]
+
+    def generate(self, input_ids, logits_processor=None, **kwargs):
+        self.calls += 1
+        outputs = [self.get_output(ids) for ids in input_ids.tolist()]
+        length = max(len(output) for output in outputs)
+        outputs = torch.tensor([output + [self.vocab["<pad>"]] * (length - len(output)) for output in outputs])
+        for step in range(2, length + 1):
+            if logits_processor is not None:
+                logits_processor(outputs[:, :step], None)
+        return outputs
@@ -0,0 +1,106 @@
+import time
+import asyncio
+import unittest
+import sys 
+sys.path.append("..")
+from OmniEvent.infer_module.batching import BatchScheduler, QueueFullError, DeadlineExceededError
+
+
+class TestBatchScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.calls = []
+
+    def process(self, key, items, deadline):
+        self.calls.append((key, list(items), deadline))
+        if key == "slow":
+            time.sleep(0.2)
+        if key == "fail":
+            raise RuntimeError("batch failed")
+        return [f"{key}:{item}" for item in items]
+
+    def test_batch(self):
+        scheduler = BatchScheduler(self.process, max_batch_size=3, max_wait_ms=50)
+        async def run():
+            results = await asyncio.gather(
+                scheduler.submit("ed", [1, 2]),
+                scheduler.submit("eae", [3]),
+                scheduler.submit("ed", [4]),
+                scheduler.submit("ed", [5]),
+                scheduler.submit("ed", [])
+            )
+            await scheduler.stop()
+            return results
+        self.assertEqual(asyncio.run(run()), [["ed:1", "ed:2"], ["eae:3"], ["ed:4"], ["ed:5"], []])
+        self.assertEqual([(key, items) for key, items, _ in self.calls],
+                         [("ed", [1, 2, 4]), ("eae", [3]), ("ed", [5])])
+
+    def test_error(self):
+        scheduler = BatchScheduler(self.process, max_wait_ms=50)
+        async def run():
+            results = await asyncio.gather(scheduler.submit("fail", [1]), scheduler.submit("fail", [2]),
+                                           return_exceptions=True)
+            # the worker keeps serving after a failed batch
+            results.append(await scheduler.submit("ed", [3]))
+            await scheduler.stop()
+            return results
+        errors = asyncio.run(run())
+        self.assertEqual([str(error) for error in errors[:2]], ["batch failed"] * 2)
+        self.assertEqual(errors[2], ["ed:3"])
+        # both requests failed together, in one batch
+        self.assertEqual([(key, items) for key, items, _ in self.calls], [("fail", [1, 2]), ("ed", [3])])
+
+    def test_queue_full(self):
+        scheduler = BatchScheduler(self.process, max_batch_size=1, max_wait_ms=1, max_queue_size=1)
+        async def run():
+            slow = asyncio.ensure_future(scheduler.submit("slow", [1]))
+            await asyncio.sleep(0.05)
+            waiting = asyncio.ensure_future(scheduler.submit("ed", [2]))
+            await asyncio.sleep(0)
+            with self.assertRaises(QueueFullError):
+                await scheduler.submit("ed", [3])
+            blocked = await scheduler.submit("ed", [4], block=True)
+            results = [await slow, await waiting, blocked]
+            await scheduler.stop()
+            return results
+        self.assertEqual(asyncio.run(run()), [["slow:1"], ["ed:2"], ["ed:4"]])
+
+    def test_queue_full_mixed_keys(self):
+        scheduler = BatchScheduler(self.process, max_batch_size=2, max_wait_ms=300, max_queue_size=2)
+        async def run():
+            requests, depths = [], []
+            for i in range(20):
+                requests.append(asyncio.ensure_future(scheduler.submit(["ed", "eae", "ee"][i % 3], [i])))
+                await asyncio.sleep(0.01)
+                depths.append(scheduler.queue_depth)
+            results = await asyncio.gather(*requests, return_exceptions=True)
+            await scheduler.stop()
+            return results, depths
+        results, depths = asyncio.run(run())
+        # requests set aside for a batch of another key still count against the limit
+        self.assertLessEqual(max(depths), 2)
+        rejected = [result for result in results if isinstance(result, QueueFullError)]
+        self.assertGreater(len(rejected), 0)
+        self.assertEqual(len(rejected) + sum(len(items) for _, items, _ in self.calls), 20)
+
+    def test_deadline(self):
+        scheduler = BatchScheduler(self.process, max_batch_size=1, max_wait_ms=1)
+        async def run():
+            slow = asyncio.ensure_future(scheduler.submit("slow", [1]))
+            await asyncio.sleep(0.05)
+            with self.assertRaises(DeadlineExceededError):
+                await scheduler.submit("ed", [2], deadline=time.monotonic() + 0.05)
+            deadline = time.monotonic() + 10
+            result = await scheduler.submit("ed", [3], deadline=deadline)
+            await slow
+            await scheduler.stop()
+            return result, deadline
+        result, deadline = asyncio.run(run())
+        self.assertEqual(result, ["ed:3"])
+        # the expired request is dropped before its batch runs
+        self.assertEqual([(key, items) for key, items, _ in self.calls], [("slow", [1]), ("ed", [3])])
+        self.assertEqual(self.calls[-1][2], deadline)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,130 @@
+import os
+import time
+import sqlite3
+import asyncio
+import unittest
+import tempfile
+import sys 
+sys.path.append("..")
+from OmniEvent.infer_module.batching import DeadlineExceededError
+from OmniEvent.infer_module.cache import ResultCache, Uncached, make_cache_key
+
+
+class TestResultCache(unittest.TestCase):
+
+    def test_key(self):
+        key = make_cache_key("The attack", "<ace>", "ED", ["model"])
+        self.assertEqual(key, make_cache_key("The attack", "<ace>", "ED", ["model"]))
+        self.assertNotEqual(key, make_cache_key("The attack", "<kbp>", "ED", ["model"]))
+        self.assertNotEqual(key, make_cache_key("The attack", "<ace>", "ED", ["other model"]))
+        self.assertNotEqual(key, make_cache_key("The attack", "<ace>", "ED", ["model"], decoding="fast"))
+        self.assertNotEqual(make_cache_key("The attack", "<ace>", "EAE", ["model"], [("attack", 4, 10)]),
+                            make_cache_key("The attack", "<ace>", "EAE", ["model"], []))
+
+    def test_lru(self):
+        cache = ResultCache(max_size=2)
+        cache.set("a", {"events": []})
+        cache.set("b", {"events": []})
+        cache.get("a")
+        cache.set("c", {"events": []})
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), {"events": []})
+        self.assertEqual(len(cache), 2)
+        self.assertEqual((cache.hits, cache.misses), (2, 1))
+
+    def test_copies(self):
+        cache = ResultCache()
+        cache.set("a", {"events": []})
+        cache.get("a")["events"].append("modified")
+        self.assertEqual(cache.get("a"), {"events": []})
+
+    def test_disk(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "cache.db")
+            cache = ResultCache(path=path)
+            cache.set_many([("a", {"text": "a", "events": []}), ("b", {"text": "b", "events": []})])
+            cache.close()
+            cache = ResultCache(max_size=1, path=path)
+            self.assertEqual(cache.get("a"), {"text": "a", "events": []})
+            self.assertEqual(cache.get("b"), {"text": "b", "events": []})
+            self.assertIsNone(cache.get("c"))
+            cache.close()
+
+    def test_ttl(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "cache.db")
+            cache = ResultCache(path=path, ttl_seconds=0.1)
+            cache.set("a", 1)
+            self.assertEqual(cache.get("a"), 1)
+            time.sleep(0.15)
+            # expired in memory and on disk
+            self.assertIsNone(cache.get("a"))
+            cache.close()
+
+    def test_disk_without_expiry(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "cache.db")
+            connection = sqlite3.connect(path)
+            connection.execute("CREATE TABLE results (key TEXT PRIMARY KEY, value TEXT)")
+            connection.execute("INSERT INTO results (key, value) VALUES ('a', '1')")
+            connection.commit()
+            connection.close()
+            cache = ResultCache(path=path)
+            self.assertEqual(cache.get("a"), 1)
+            cache.set("b", 2)
+            self.assertEqual(ResultCache(path=path).get("b"), 2)
+            cache.close()
+
+    def test_single_flight(self):
+        lookups, calls = [], []
+        cache = ResultCache()
+        async def compute(keys, indices):
+            calls.append([keys[i] for i in indices])
+            await asyncio.sleep(0.05)
+            return [keys[i].upper() for i in indices]
+        async def run():
+            first = cache.get_or_compute(["a", "b"], lambda indices: compute(["a", "b"], indices),
+                                         on_lookup=lookups.append)
+            second = cache.get_or_compute(["b", "c"], lambda indices: compute(["b", "c"], indices),
+                                          on_lookup=lookups.append)
+            results = await asyncio.gather(first, second)
+            return results, await cache.get_or_compute(["a"], lambda indices: compute(["a"], indices),
+                                                       on_lookup=lookups.append)
+        self.assertEqual(asyncio.run(run()), ([["A", "B"], ["B", "C"]], ["A"]))
+        self.assertEqual(calls, [["a", "b"], ["c"]])
+        self.assertEqual(sorted(lookups), ["hit", "miss", "miss", "miss", "shared"])
+
+    def test_retry(self):
+        calls = []
+        cache = ResultCache()
+        async def compute(indices, outcome):
+            calls.append(outcome)
+            await asyncio.sleep(0.05)
+            if outcome == "deadline":
+                raise DeadlineExceededError("deadline passed")
+            return [Uncached("A")] if outcome == "truncated" else ["A"]
+        async def run(first_outcome):
+            first = cache.get_or_compute(["a"], lambda indices: compute(indices, first_outcome), time.monotonic())
+            # waits for the first request, without a deadline
+            second = cache.get_or_compute(["a"], lambda indices: compute(indices, "done"))
+            return await asyncio.gather(first, second, return_exceptions=True)
+
+        # the deadline of the first request does not fail the second one, which computes the key again
+        first, second = asyncio.run(run("deadline"))
+        self.assertIsInstance(first, DeadlineExceededError)
+        self.assertEqual(second, ["A"])
+        self.assertEqual(calls, ["deadline", "done"])
+
+        # truncated outputs are returned to their request only, and not cached
+        cache.clear()
+        calls.clear()
+        self.assertEqual(asyncio.run(run("truncated")), [["A"], ["A"]])
+        self.assertEqual(calls, ["truncated", "done"])
+        cache.clear()
+        self.assertEqual(asyncio.run(cache.get_or_compute(["a"], lambda indices: compute(indices, "truncated"))),
+                         ["A"])
+        self.assertIsNone(cache.get("a"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+import random
+import unittest
+import sys 
+sys.path.append("..")
+import torch
+from OmniEvent.model.constraint_decoding import get_constraint_decoder
+
+
+class WordTokenizer():
+    """Whitespace tokenizer with the special tokens used by the constraint decoder."""
+    def __init__(self, words):
+        self.vocab = {"<pad>": 0, "</s>": 1, "<extra_id_0>": 2, "<extra_id_1>": 3}
+        for word in words:
+            self.vocab.setdefault(word, len(self.vocab))
+        self.pad_token_id, self.eos_token_id = 0, 1
+
+    def encode(self, text, add_special_tokens=False):
+        return [self.vocab[word] for word in text.split()]
+
+    def convert_tokens_to_ids(self, tokens):
+        return [self.vocab[token] for token in tokens]
+
+
+class TestStruConstraintLogitsProcessor(unittest.TestCase):
+
+    def setUp(self):
+        words = "attack target die transport person the troops moved to Basra after an aerial attack".split()
+        self.tokenizer = WordTokenizer(words)
+        self.decoder = get_constraint_decoder(self.tokenizer, {"role_list": ["attack", "attack target", "die",
+                                                                            "transport person"]})
+
+    def reference_allowed(self, src_sentence, tgt_generated):
+        try:
+            return set(self.decoder.constraint_decoding(0, src_sentence, tgt_generated))
+        except (IndexError, RuntimeError):
+            # states the reference decoder fails on, which the processor ends with EOS
+            return {self.tokenizer.eos_token_id}
+
+    def test_parity(self):
+        random.seed(0)
+        vocab_size, num_beams = len(self.tokenizer.vocab), 3
+        sentence = self.tokenizer.encode("the troops moved to Basra after an aerial attack")
+        for _ in range(20):
+            src_input_ids = torch.tensor([random.choices(sentence, k=6) + [1, 0, 0], sentence[:5] + [1, 0, 0, 0]])
+            processor = self.decoder.get_logits_processor(src_input_ids, num_beams)
+            input_ids = torch.zeros(2 * num_beams, 1, dtype=torch.long)
+            for step in range(12):
+                scores = processor(input_ids, torch.zeros(len(input_ids), vocab_size))
+                next_tokens = []
+                for row in range(len(input_ids)):
+                    expected = self.reference_allowed(src_input_ids[row // num_beams], input_ids[row])
+                    allowed = set(torch.nonzero(scores[row] == 0).view(-1).tolist())
+                    self.assertEqual(allowed, expected)
+                    if random.random() < 0.1:
+                        next_tokens.append(random.randrange(vocab_size))
+                    else:
+                        next_tokens.append(random.choice(sorted(allowed)))
+                # beams are reordered within each input, as done by beam search
+                order = [batch_id * num_beams + random.randrange(num_beams)
+                         for batch_id in range(2) for _ in range(num_beams)]
+                input_ids = torch.cat([input_ids, torch.tensor(next_tokens).view(-1, 1)], dim=1)[order]
+
+    def test_flat(self):
+        src_input_ids = torch.tensor([self.tokenizer.encode("the troops moved to Basra") + [1]])
+        processor = self.decoder.get_logits_processor(src_input_ids, flat=True)
+        allowed = lambda tokens: set(torch.nonzero(processor(torch.tensor([[0] + self.tokenizer.encode(tokens)]),
+                                                             torch.zeros(1, 20))[0] == 0).view(-1).tolist())
+        self.assertEqual(allowed(""), {2, 1})
+        self.assertEqual(allowed("<extra_id_0>"), set(self.tokenizer.encode("attack die transport")))
+        self.assertEqual(allowed("<extra_id_0> transport person troops"), set(self.tokenizer.encode("moved")) | {3})
+        self.assertEqual(allowed("<extra_id_0> die Basra <extra_id_1>"), {2, 1})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+import sys 
+sys.path.append("..")
+from OmniEvent.infer_module.document import (
+    split_sentences,
+    split_into_windows,
+    assign_triggers_to_windows,
+    merge_window_results
+)
+
+
+class TestDocument(unittest.TestCase):
+
+    def test_split_sentences(self):
+        text = "Troops moved on Basra. An assault pounded Baghdad!  Nothing else."
+        sentences = [text[start:end] for start, end in split_sentences(text)]
+        self.assertEqual(sentences, ["Troops moved on Basra.", "An assault pounded Baghdad!", "Nothing else."])
+        text = "2022年北京市举办了冬奥会。冬奥会很成功！"
+        sentences = [text[start:end] for start, end in split_sentences(text)]
+        self.assertEqual(sentences, ["2022年北京市举办了冬奥会。", "冬奥会很成功！"])
+
+    def test_windows_cover_text(self):
+        text = " ".join(["An aerial assault pounded Baghdad at dawn."] * 10)
+        windows = split_into_windows(text, "English", window_size=20, window_overlap=8)
+        self.assertEqual(windows[0][0], 0)
+        self.assertEqual(windows[-1][1], len(text))
+        for (_, end), (start, _) in zip(windows, windows[1:]):
+            self.assertLess(start, end)
+        for start, end in windows:
+            self.assertLessEqual(len(text[start:end].split()), 20)
+
+    def test_merge_window_results(self):
+        text = "An assault began. The assault ended."
+        windows = [(0, 17), (3, 36)]
+        window_results = [
+            {"events": [{"type": "attack", "trigger": "assault", "offset": [3, 10], "arguments": []}]},
+            {"events": [{"type": "attack", "trigger": "assault", "offset": [0, 7], "arguments": []},
+                        {"type": "attack", "trigger": "assault", "offset": [19, 26], "arguments": []}]}
+        ]
+        result = merge_window_results(text, windows, window_results)
+        self.assertEqual([event["offset"] for event in result["events"]], [[3, 10], [22, 29]])
+        window_triggers = assign_triggers_to_windows([("assault", 22, 29)], windows)
+        self.assertEqual(window_triggers, [[], [("assault", 19, 26)]])
+
+
+if __name__ == "__main__":
+    unittest.main()
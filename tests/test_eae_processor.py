@@ -0,0 +1,37 @@
+import unittest
+import sys
+sys.path.append("..")
+from fake_models import get_tokenizer
+from OmniEvent.infer_module.seq2seq import EAEProcessor
+from OmniEvent.input_engineering.seq2seq_processor import EAESeq2SeqProcessor
+
+
+EXAMPLES = [
+    # text, trigger offset, schema, input words
+    ("Troops attacked the city", [7, 15], "<ace>",
+     ["<ace>", "Troops", "<event>", "attacked", "</event>", "the", "city"]),
+    ("军队袭击了城市", [2, 4], "<duee>",
+     ["<duee>", "军", "队", "<event>", "袭", "击", "</event>", "了", "城", "市"]),
+]
+
+
+class TestEAEProcessor(unittest.TestCase):
+
+    def test_input(self):
+        tokenizer = get_tokenizer([" ".join(words) for _, _, _, words in EXAMPLES])
+        processor = EAEProcessor(tokenizer)
+        vocab = tokenizer.get_vocab()
+        for text, offset, schema, words in EXAMPLES:
+            instance = {"text": text, "schema": schema, "triggers": [{"mention": text[offset[0]:offset[1]],
+                                                                      "offset": offset}]}
+            self.assertEqual(processor.get_input_words(text, instance["triggers"][0], schema), words)
+            self.assertEqual(processor.encode_instances([instance])["input_ids"], [[vocab[word] for word in words]])
+            # the schema, then the words marked as in training
+            whitespace = schema == "<ace>"
+            training_words = text.split() if whitespace else list(text)
+            self.assertEqual(words, [schema] + EAESeq2SeqProcessor.insert_marker(training_words, offset,
+                                                                                 ["<event>", "</event>"], whitespace))
+
+
+if __name__ == "__main__":
+    unittest.main()
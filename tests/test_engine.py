@@ -0,0 +1,129 @@
+import time
+import asyncio
+import unittest
+import sys
+sys.path.append("..")
+from fake_models import FakeModel, get_tokenizer
+from OmniEvent.infer_module.engine import InferenceEngine, StageTimer
+from OmniEvent.infer_module.cache import ResultCache
+from OmniEvent.infer_module.model_manager import ModelManager
+
+
+TEXT = "Troops attacked the city and the army fired"
+
+
+class NonStreamingModel(FakeModel):
+    """Like `OnnxSeq2SeqModel`, generates without logits processors."""
+    supports_logits_processor = False
+
+    def generate(self, input_ids, logits_processor=None, **kwargs):
+        if logits_processor is not None:
+            raise NotImplementedError("Logits processors are not supported.")
+        return super().generate(input_ids, **kwargs)
+
+
+class TestInferenceEngine(unittest.TestCase):
+
+    def setUp(self):
+        tokenizer = get_tokenizer([TEXT])
+        self.models = {}
+
+        def load(path, device):
+            self.models[path] = FakeModel(tokenizer)
+            return self.models[path], tokenizer
+        self.manager = ModelManager({"ED": "ed", "EAE": "eae"}, "cpu", load_fn=load)
+        self.engine = InferenceEngine(self.manager, cache=ResultCache())
+
+    def run_engine(self, *args, **kwargs):
+        async def run():
+            try:
+                return await self.engine.run(*args, **kwargs)
+            finally:
+                await self.engine.stop()
+        return asyncio.run(run())
+
+    def test_run(self):
+        timer = StageTimer()
+        results = self.run_engine([TEXT, "the city"], "ED", "ace", timer=timer)
+        self.assertEqual(results[0]["events"], [
+            {"type": "attack", "trigger": "attacked", "offset": [7, 15]},
+            {"type": "attack", "trigger": "fired", "offset": [38, 43]}
+        ])
+        self.assertEqual(results[1]["events"], [])
+        self.assertEqual(timer.counts["rows"], 2)
+        self.assertIn("offsets", timer.seconds)
+
+        results = self.run_engine([TEXT], "EE", "ace")
+        self.assertEqual([event["arguments"] for event in results[0]["events"]],
+                         [[{"mention": "city", "offset": [20, 24], "role": "target"}]] * 2)
+        # the ED outputs of the first request are cached
+        self.assertEqual((self.models["ed"].calls, self.models["eae"].calls), (1, 1))
+
+        results = self.run_engine([TEXT], "EAE", "ace", triggers=[[("fired", 38, 43)]])
+        self.assertEqual(results[0]["events"][0]["trigger"], "fired")
+        self.assertEqual(results[0]["events"][0]["arguments"][0]["mention"], "city")
+
+    def test_swap(self):
+        self.run_engine([TEXT], "ED", "ace")
+        self.manager.swap("ED", "ed")
+        self.run_engine([TEXT], "ED", "ace")
+        # the swapped-in model does not serve the outputs of the previous one
+        self.assertEqual(self.models["ed"].calls, 1)
+        self.assertEqual(len(self.engine.cache), 2)
+
+    def test_truncated(self):
+        key = self.engine.get_key("ED", "ace", "accurate")
+        self.assertTrue(all(truncated for _, _, truncated in
+                            self.engine.run_batch(key, [(TEXT, "<ace>")], deadline=time.monotonic())))
+        self.assertFalse(any(truncated for _, _, truncated in self.engine.run_batch(key, [(TEXT, "<ace>")])))
+
+        # outputs of a batch that hit the deadline are returned but not cached
+        self.engine.scheduler.process = lambda key, items, deadline: [
+            (result, timer, True) for result, timer, _ in self.engine.run_batch(key, items)]
+        for _ in range(2):
+            results = self.run_engine([TEXT], "ED", "ace")
+            self.assertEqual(len(results[0]["events"]), 2)
+        self.assertEqual(self.models["ed"].calls, 2 + 2)
+        self.assertEqual(len(self.engine.cache), 0)
+
+    def test_stream(self):
+        async def run():
+            messages = [message async for message in self.engine.stream(TEXT, "EE", "ace")]
+            await self.engine.stop()
+            return messages
+        messages = asyncio.run(run())
+        self.assertEqual([message["event"] for message in messages[:2]], ["trigger", "trigger"])
+        self.assertEqual(sorted(message["index"] for message in messages[2:4]), [0, 1])
+        self.assertEqual(messages[-1], {"event": "done", **self.run_engine([TEXT], "EE", "ace")[0]})
+
+    def test_stream_cache(self):
+        async def run():
+            messages = [message async for message in self.engine.stream(TEXT, "ED", "ace")]
+            await self.engine.stop()
+            return messages
+        streamed = asyncio.run(run())[-1]
+        results = self.run_engine([TEXT], "ED", "ace", decoding="accurate")
+        self.assertEqual(streamed["events"], results[0]["events"])
+        # the greedy streamed triggers are not served to the "accurate" request, nor the other way around
+        self.assertEqual(self.models["ed"].calls, 2)
+        self.assertEqual(len(self.engine.cache), 2)
+        asyncio.run(run())
+        self.assertEqual(self.models["ed"].calls, 2)
+
+    def test_stream_fallback(self):
+        tokenizer = get_tokenizer([TEXT])
+        self.manager.load_fn = lambda path, device: (self.models.setdefault(path, NonStreamingModel(tokenizer)),
+                                                     tokenizer)
+        async def run():
+            messages = [message async for message in self.engine.stream(TEXT, "EE", "ace")]
+            await self.engine.stop()
+            return messages
+        messages = asyncio.run(run())
+        # the triggers come at once, from a batch run with the decoding profile
+        self.assertEqual([message["trigger"] for message in messages[:2]], ["attacked", "fired"])
+        self.assertEqual(messages[-1], {"event": "done", **self.run_engine([TEXT], "EE", "ace")[0]})
+        self.assertEqual(self.models["ed"].calls, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
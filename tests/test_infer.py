@@ -1,8 +1,23 @@
 import json 
+import time
+import asyncio
 import unittest
 import sys 
 sys.path.append("..")
-from OmniEvent.infer import infer
+from unittest import mock
+from fake_models import FakeModel, get_tokenizer
+from OmniEvent.infer import infer, infer_batch, ainfer, SCHEDULER
+from OmniEvent.infer_module.batching import DeadlineExceededError
+from OmniEvent.infer_module.cache import ResultCache
+
+
+TEXTS = ["Troops attacked the city", "the army fired", "the city slept"]
+
+
+class SlowModel(FakeModel):
+    def generate(self, input_ids, **kwargs):
+        time.sleep(0.2)
+        return super().generate(input_ids, **kwargs)
 
 class TestInfer(unittest.TestCase):
 
@@ -16,6 +31,54 @@ class TestInfer(unittest.TestCase):
         self.assertEqual(result[1]["trigger"], "pounded")
         self.assertEqual(result[1]["type"], "injure")
 
+    def test_seq2seq_batch(self):
+        input_texts = [
+            "U.S. and British troops were moving on the strategic southern port city of Basra Saturday after a massive aerial assault pounded Baghdad at dawn",
+            "This is a sentence without any event."
+        ]
+        results = infer_batch(task="EE", texts=input_texts, batch_size=1)
+        self.assertEqual(len(results), 2)
+        self.assertEqual([result["text"] for result in results], input_texts)
+        result = sorted(results[0]["events"], key=lambda item: item["trigger"])
+        self.assertEqual(result[0]["trigger"], "assault")
+        self.assertEqual(result[1]["trigger"], "pounded")
+
+    def test_batch_size(self):
+        with mock.patch("OmniEvent.infer.infer_batch", return_value=[]) as infer_batch_mock:
+            infer("A text.", model="model", tokenizer="tokenizer", batch_size=4)
+        self.assertEqual(infer_batch_mock.call_args.kwargs["batch_size"], 4)
+
+
+class TestAinfer(unittest.TestCase):
+
+    def run_requests(self, *requests):
+        async def run():
+            try:
+                return await asyncio.gather(*requests, return_exceptions=True)
+            finally:
+                await SCHEDULER.stop()
+        return asyncio.run(run())
+
+    def test_batching(self):
+        tokenizer = get_tokenizer(TEXTS)
+        model = FakeModel(tokenizer)
+        results = self.run_requests(*[ainfer(text, model=model, tokenizer=tokenizer, device="cpu") for text in TEXTS])
+        self.assertEqual([result[0]["text"] for result in results], TEXTS)
+        self.assertEqual([len(result[0]["events"]) for result in results], [1, 1, 0])
+        # the concurrent calls ran in one batch
+        self.assertEqual(model.calls, 1)
+
+    def test_deadline(self):
+        tokenizer = get_tokenizer(TEXTS)
+        model, cache = SlowModel(tokenizer), ResultCache()
+        result, = self.run_requests(ainfer(TEXTS[0], model=model, tokenizer=tokenizer, device="cpu", timeout=0.05))
+        self.assertIsInstance(result, DeadlineExceededError)
+        # results cut short by the deadline are not cached
+        results = infer_batch(TEXTS, model=model, tokenizer=tokenizer, device="cpu", cache=cache,
+                              deadline=time.monotonic())
+        self.assertEqual([result["text"] for result in results], TEXTS)
+        self.assertEqual(len(cache), 0)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,74 @@
+import inspect
+import unittest
+import tempfile
+import importlib.util
+import sys 
+sys.path.append("..")
+import torch
+from transformers import MT5Config, MT5ForConditionalGeneration
+from OmniEvent.infer_module.seq2seq import do_event_detection
+
+
+def get_beam_hypotheses():
+    try:
+        from transformers.generation.beam_search import BeamHypotheses
+    except ImportError:
+        from transformers.generation_beam_search import BeamHypotheses
+    return BeamHypotheses
+
+
+@unittest.skipUnless(importlib.util.find_spec("onnxruntime") is not None, "onnxruntime is not installed")
+class TestOnnxRuntime(unittest.TestCase):
+
+    def export(self, model, tokenizer=None):
+        from OmniEvent.infer_module.onnx_export import export_onnx
+        from OmniEvent.infer_module.onnx_runtime import OnnxSeq2SeqModel
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        export_onnx(model, tmp_dir.name, tokenizer)
+        return OnnxSeq2SeqModel.from_pretrained(tmp_dir.name)
+
+    def test_parity(self):
+        torch.manual_seed(42)
+        config = MT5Config(vocab_size=128, d_model=32, d_kv=8, d_ff=64, num_layers=2, num_decoder_layers=2,
+                           num_heads=4, decoder_start_token_id=0, eos_token_id=1, pad_token_id=0)
+        model = MT5ForConditionalGeneration(config).eval()
+        onnx_model = self.export(model)
+        input_ids = torch.randint(2, 128, (3, 12))
+        attention_mask = torch.ones_like(input_ids)
+        attention_mask[1, 8:] = 0
+        for num_beams in [1, 4]:
+            expected = model.generate(input_ids, attention_mask=attention_mask, num_beams=num_beams, max_length=24)
+            outputs = onnx_model.generate(input_ids, attention_mask=attention_mask, num_beams=num_beams,
+                                          max_length=24)
+            self.assertTrue(torch.equal(expected, outputs))
+
+    @unittest.skipIf("generated_len" in inspect.signature(get_beam_hypotheses().add).parameters,
+                     "this transformers version scores the unfinished beams without the decoder start token")
+    def test_parity_max_length(self):
+        torch.manual_seed(8)
+        config = MT5Config(vocab_size=128, d_model=32, d_kv=8, d_ff=64, num_layers=2, num_decoder_layers=2,
+                           num_heads=4, decoder_start_token_id=0, eos_token_id=1, pad_token_id=0)
+        model = MT5ForConditionalGeneration(config).eval()
+        onnx_model = self.export(model)
+        input_ids = torch.randint(2, 128, (3, 12))
+        # the beams reach max_length, and are scored with the length penalty like the ones ending with EOS
+        for length_penalty in [0.5, 2.0]:
+            for max_length in [4, 6]:
+                expected = model.generate(input_ids, num_beams=4, max_length=max_length,
+                                          length_penalty=length_penalty)
+                outputs = onnx_model.generate(input_ids, num_beams=4, max_length=max_length,
+                                              length_penalty=length_penalty)
+                self.assertTrue(torch.equal(expected, outputs))
+
+    def test_seq2seq(self):
+        from OmniEvent.infer import get_pretrained
+        model, tokenizer = get_pretrained("s2s-mt5-ed", "cpu", use_registry=False)
+        onnx_model = self.export(model, tokenizer)
+        texts = ["U.S. and British troops were moving on the strategic southern port city of Basra Saturday after a massive aerial assault pounded Baghdad at dawn"]
+        self.assertEqual(do_event_detection(model, tokenizer, texts, ["<ace>"], "cpu"),
+                         do_event_detection(onnx_model, tokenizer, texts, ["<ace>"], "cpu"))
+
+
+if __name__ == "__main__":
+    unittest.main()
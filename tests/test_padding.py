@@ -0,0 +1,50 @@
+import unittest
+import sys
+sys.path.append("..")
+import torch
+from transformers import MT5Config, MT5ForConditionalGeneration
+from fake_models import get_tokenizer
+from OmniEvent.infer_module.seq2seq import EDProcessor, batch_generate, generate, clean_output, \
+    get_length_buckets
+
+
+TEXTS = [
+    "Troops attacked the city at dawn after the army fired on the port",
+    "the army fired",
+    "Troops attacked",
+    "the city slept while the army moved towards the port at dawn",
+    "dawn",
+]
+
+
+class TestDynamicPadding(unittest.TestCase):
+
+    def test_length_buckets(self):
+        lengths = [5, 1, 3, 4, 2]
+        self.assertEqual(get_length_buckets(lengths), [[0, 1, 2, 3, 4]])
+        self.assertEqual(get_length_buckets(lengths, 2), [[0, 1], [2, 3], [4]])
+        self.assertEqual(get_length_buckets(lengths, 2, sort_by_length=True), [[1, 4], [2, 3], [0]])
+
+    def test_bucketed_generation(self):
+        torch.manual_seed(0)
+        tokenizer = get_tokenizer(TEXTS)
+        config = MT5Config(vocab_size=len(tokenizer), d_model=32, d_kv=8, d_ff=64, num_layers=2, num_decoder_layers=2,
+                           num_heads=4, decoder_start_token_id=0, eos_token_id=1, pad_token_id=0)
+        model = MT5ForConditionalGeneration(config).eval()
+        processor = EDProcessor(tokenizer)
+        encodings = processor.encode_texts(TEXTS, ["<ace>"] * len(TEXTS))
+        # a fixed length cap, since "fast" derives it from the padded input length
+        decoding = {"num_beams": 1, "max_length": 24}
+        # every row decoded on its own, without padding
+        expected = [clean_output(tokenizer, generate(model, tokenizer, processor.collate(encodings, [i], "cpu"),
+                                                     decoding)[0])
+                    for i in range(len(TEXTS))]
+        for batch_size, sort_by_length in [(None, False), (2, False), (2, True)]:
+            outputs = batch_generate(model, tokenizer, processor, encodings, "cpu", batch_size, sort_by_length,
+                                     decoding)
+            # outputs are padded to the longest one of their batch
+            self.assertEqual([clean_output(tokenizer, output) for output in outputs], expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+import sys
+sys.path.append("..")
+from fake_models import FakeModel, get_tokenizer
+from OmniEvent.infer import infer_batch
+from OmniEvent.infer_module.pipeline import PipelinedExecutor
+
+
+TEXTS = [
+    "Troops attacked the city",
+    "nothing happened here",
+    "the army fired at the city",
+    "Troops attacked and fired",
+    "the city slept",
+]
+
+
+class FailingModel(FakeModel):
+    def generate(self, input_ids, **kwargs):
+        if self.calls == 1:
+            raise RuntimeError("generation failed")
+        return super().generate(input_ids, **kwargs)
+
+
+class TestPipeline(unittest.TestCase):
+
+    def test_executor(self):
+        executor = PipelinedExecutor(lambda batch: batch * 2, lambda output: output + 1)
+        self.assertEqual(executor.run(range(10)), [i * 2 + 1 for i in range(10)])
+
+        def first_stage(batch):
+            if batch == 3:
+                raise ValueError("first stage failed")
+            return batch
+        with self.assertRaisesRegex(ValueError, "first stage failed"):
+            PipelinedExecutor(first_stage, lambda output: output).run(range(10))
+
+    def test_event_extraction(self):
+        tokenizer = get_tokenizer(TEXTS)
+        models = (FakeModel(tokenizer), FakeModel(tokenizer))
+        kwargs = {"model": models, "tokenizer": (tokenizer, tokenizer), "task": "EE", "device": "cpu",
+                  "batch_size": 2}
+        sequential = infer_batch(TEXTS, pipeline=False, **kwargs)
+        pipelined = infer_batch(TEXTS, pipeline=True, **kwargs)
+        self.assertEqual(pipelined, sequential)
+        self.assertEqual([result["text"] for result in pipelined], TEXTS)
+        self.assertEqual([len(result["events"]) for result in pipelined], [1, 0, 1, 2, 0])
+        # one ED call per micro-batch of 2 texts, in either run
+        self.assertEqual(models[0].calls, 3 + 3)
+
+    def test_event_extraction_error(self):
+        tokenizer = get_tokenizer(TEXTS)
+        # ED fails on its second micro-batch, in the worker thread
+        models = (FailingModel(tokenizer), FakeModel(tokenizer))
+        with self.assertRaisesRegex(RuntimeError, "generation failed"):
+            infer_batch(TEXTS, model=models, tokenizer=(tokenizer, tokenizer), task="EE", device="cpu", batch_size=2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+import sys
+sys.path.append("..")
+from unittest import mock
+import torch
+from transformers import MT5Config, MT5ForConditionalGeneration
+from OmniEvent.infer import get_pretrained, MODEL_REGISTRY
+from OmniEvent.infer_module.precision import get_precision_dtype, quantize_dynamic_int8
+
+
+class FakeTokenizer():
+    pass
+
+
+class TestPrecision(unittest.TestCase):
+
+    def test_dtype(self):
+        self.assertIsNone(get_precision_dtype("fp32", "cpu"))
+        self.assertEqual(get_precision_dtype("int8", "cpu"), torch.qint8)
+        with self.assertRaises(ValueError):
+            get_precision_dtype("int8", "cuda")
+        with self.assertRaises(ValueError):
+            get_precision_dtype("fp16", "cpu")
+        with mock.patch("OmniEvent.infer_module.precision.is_bf16_supported", return_value=True):
+            self.assertEqual(get_precision_dtype("bf16", "cpu"), torch.bfloat16)
+        # devices without native bf16 fall back to fp32
+        with mock.patch("OmniEvent.infer_module.precision.is_bf16_supported", return_value=False):
+            self.assertIsNone(get_precision_dtype("bf16", "cpu"))
+
+    def test_registry_key(self):
+        calls = []
+        def load(model_name_or_path, device, dtype=None):
+            calls.append(dtype)
+            return object(), FakeTokenizer()
+        try:
+            with mock.patch("OmniEvent.infer.load_pretrained", side_effect=load):
+                int8_model, _ = get_pretrained("tiny-ed", "cpu", precision="int8")
+                fp32_model, _ = get_pretrained("tiny-ed", "cpu")
+                self.assertIs(get_pretrained("tiny-ed", "cpu", precision="int8")[0], int8_model)
+            self.assertIsNot(int8_model, fp32_model)
+            self.assertEqual(calls, [torch.qint8, None])
+            self.assertIn(("tiny-ed", "cpu", "torch.qint8"), MODEL_REGISTRY)
+            self.assertIn(("tiny-ed", "cpu", None), MODEL_REGISTRY)
+        finally:
+            MODEL_REGISTRY.unload("tiny-ed")
+
+    def test_quantize(self):
+        torch.manual_seed(0)
+        config = MT5Config(vocab_size=64, d_model=32, d_kv=8, d_ff=64, num_layers=1, num_decoder_layers=1,
+                           num_heads=4, decoder_start_token_id=0, eos_token_id=1, pad_token_id=0)
+        model = quantize_dynamic_int8(MT5ForConditionalGeneration(config).eval())
+        module_types = {type(module) for module in model.modules()}
+        self.assertIn(torch.ao.nn.quantized.dynamic.Linear, module_types)
+        self.assertNotIn(torch.nn.Linear, module_types)
+        outputs = model.generate(torch.randint(2, 64, (2, 8)), num_beams=1, max_length=8)
+        self.assertEqual(outputs.shape[0], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+import unittest
+import threading
+import sys 
+sys.path.append("..")
+from tokenizers import Tokenizer, models, pre_tokenizers
+from transformers import PreTrainedTokenizerFast
+from OmniEvent.infer_module.registry import ModelRegistry
+
+
+class TestModelRegistry(unittest.TestCase):
+
+    def test_load_once(self):
+        calls = []
+        def loader(name, device, dtype):
+            calls.append(name)
+            return object(), object()
+        registry = ModelRegistry()
+        threads = [threading.Thread(target=registry.get, args=("ed", "cpu", None, loader)) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(calls, ["ed"])
+        self.assertIs(registry.get("ed", "cpu", None, loader), registry.get("ed", "cpu", None, loader))
+
+    def test_lru_eviction(self):
+        loader = lambda name, device, dtype: (name, device)
+        registry = ModelRegistry(max_models=2)
+        registry.get("ed", "cpu", None, loader)
+        registry.get("eae", "cpu", None, loader)
+        registry.get("ed", "cpu", None, loader)
+        registry.get("ed", "cuda", None, loader)
+        self.assertEqual(registry.keys(), [("ed", "cpu", None), ("ed", "cuda", None)])
+        self.assertEqual(registry.unload("ed", device="cuda"), 1)
+        self.assertEqual(len(registry), 1)
+
+    def test_concurrent_encode(self):
+        words = [f"w{i}" for i in range(50)]
+        vocab = {word: i for i, word in enumerate(["<pad>", "<unk>"] + words)}
+        backend = Tokenizer(models.WordLevel(vocab, unk_token="<unk>"))
+        backend.pre_tokenizer = pre_tokenizers.WhitespaceSplit()
+        tokenizer = PreTrainedTokenizerFast(tokenizer_object=backend, pad_token="<pad>", unk_token="<unk>")
+        registry = ModelRegistry()
+        errors, copies = [], []
+        def encode(max_length):
+            try:
+                local_tokenizer = registry.local_copy(tokenizer)
+                copies.append(local_tokenizer)
+                self.assertIs(registry.local_copy(tokenizer), local_tokenizer)
+                for _ in range(200):
+                    # truncation and padding settings are written to the Rust tokenizer on every call
+                    encodings = local_tokenizer([words], truncation=True, max_length=max_length, padding="longest",
+                                                is_split_into_words=True)
+                    self.assertEqual(len(encodings["input_ids"][0]), max_length)
+            except Exception as e:
+                errors.append(e)
+        threads = [threading.Thread(target=encode, args=(5 + i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(len({id(local_tokenizer) for local_tokenizer in copies}), 8)
+        self.assertNotIn(tokenizer, copies)
+
+
+if __name__ == "__main__":
+    unittest.main()
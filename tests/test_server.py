@@ -0,0 +1,249 @@
+import os
+import json
+import time
+import asyncio
+import unittest
+import tempfile
+import sys
+sys.path.append("..")
+sys.path.append("../server")
+os.environ.setdefault("OMNIEVENT_DEVICE", "cpu")
+import httpx
+from fastapi.testclient import TestClient
+from pydantic import ValidationError
+from io_format import Input
+from stub_model import get_stub_loader
+from metrics import Registry, Counter, Histogram
+import main
+
+
+TEXTS = [
+    "Troops attacked the southern city",
+    "Protesters gathered outside the embassy",
+    "Soldiers advanced towards Baghdad overnight",
+    "The company announced layoffs yesterday",
+]
+
+
+class TestInput(unittest.TestCase):
+
+    def test_decoding(self):
+        self.assertEqual(Input(text="A text.").decoding, "accurate")
+        self.assertEqual(Input(text="A text.", decoding="speculative").decoding, "speculative")
+        with self.assertRaises(ValidationError):
+            Input(text="A text.", decoding="beam")
+
+    def test_task(self):
+        self.assertEqual(Input(text="A text.", task="Event Extraction").task, "Event Extraction")
+        with self.assertRaises(ValidationError):
+            Input(text="A text.", task="Event Summarization")
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_exposition(self):
+        registry = Registry()
+        counter = Counter("requests_total", "Requests.", registry=registry)
+        histogram = Histogram("latency_seconds", "Latency.", buckets=(0.1, 1), registry=registry)
+        counter.inc(task="ED")
+        counter.inc(2, task="ED")
+        for value in [0.05, 0.5, 5]:
+            histogram.observe(value, task="ED")
+        lines = registry.exposition().splitlines()
+        self.assertIn('requests_total{task="ED"} 3.0', lines)
+        self.assertIn('latency_seconds_bucket{task="ED",le="0.1"} 1', lines)
+        self.assertIn('latency_seconds_bucket{task="ED",le="1"} 2', lines)
+        self.assertIn('latency_seconds_bucket{task="ED",le="+Inf"} 3', lines)
+        self.assertIn('latency_seconds_count{task="ED"} 3', lines)
+
+        counter.inc(task='a "b"\\\n')
+        self.assertIn('requests_total{task="a \\"b\\"\\\\\\n"} 1.0', registry.exposition().splitlines())
+
+
+class TestServer(unittest.TestCase):
+    """Serves the app in-process, with stub models."""
+
+    def setUp(self):
+        main.model_manager.load_fn = get_stub_loader(TEXTS, step_ms=0)
+        main.response_cache.clear()
+        self.batches = []
+        self.failing = False
+        self.delay = 0
+
+        def process(key, items, deadline):
+            self.batches.append((key[0], len(items)))
+            time.sleep(self.delay)
+            if self.failing:
+                raise RuntimeError("batch failed")
+            return main.engine.run_batch(key, items, deadline)
+        main.scheduler.process = process
+
+    def tearDown(self):
+        main.scheduler.process = main.engine.run_batch
+
+    def request(self, method, path, bodies, headers=None):
+        """Sends the requests of `bodies` concurrently, and returns their responses."""
+        async def run():
+            transport = httpx.ASGITransport(app=main.app, raise_app_exceptions=False)
+            try:
+                async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                    return await asyncio.gather(*[client.request(method, path, json=body, headers=headers)
+                                                  for body in bodies])
+            finally:
+                await main.engine.stop()
+        return asyncio.run(run())
+
+    def test_batching(self):
+        responses = self.request("POST", "/api/query", [{"text": text} for text in TEXTS])
+        self.assertEqual([response.status_code for response in responses], [200] * 4)
+        self.assertEqual([response.json()[0]["text"] for response in responses], TEXTS)
+        self.assertEqual(responses[0].json()[0]["events"][0]["trigger"], "attacked")
+        # the concurrent requests ran in one batch
+        self.assertEqual(self.batches, [("ED", 4)])
+
+    def test_invalid_input(self):
+        responses = self.request("POST", "/api/query", [{"text": TEXTS[0], "task": "Event Summarization"}])
+        self.assertEqual(responses[0].status_code, 422)
+        self.assertEqual(self.batches, [])
+
+    def test_error(self):
+        self.failing = True
+        responses = self.request("POST", "/api/query", [{"text": text} for text in TEXTS[:2]])
+        self.assertEqual([response.status_code for response in responses], [500, 500])
+        self.assertEqual(self.batches, [("ED", 2)])
+
+    def test_admission(self):
+        self.delay = 0.2
+        responses = self.request("POST", "/api/query", [{"text": TEXTS[0], "timeout_ms": 50}])
+        self.assertEqual(responses[0].status_code, 504)
+
+        max_queue_size = main.scheduler.max_queue_size
+        try:
+            main.scheduler.max_queue_size = 2
+            responses = self.request("POST", "/api/query", [{"text": text} for text in TEXTS])
+        finally:
+            main.scheduler.max_queue_size = max_queue_size
+        self.assertEqual(sorted(response.status_code for response in responses), [200, 200, 503, 503])
+        self.assertEqual([response.headers.get("Retry-After") for response in responses if response.status_code == 503],
+                         ["1", "1"])
+
+    def test_bulk(self):
+        lines = [json.dumps({"text": text}) for text in TEXTS[:3]] + ["{bad", json.dumps({"task": "Event Detection"})]
+        async def run():
+            transport = httpx.ASGITransport(app=main.app)
+            try:
+                async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                    return await client.post("/api/batch", content="\n".join(lines),
+                                             headers={"Content-Type": "application/x-ndjson"})
+            finally:
+                await main.engine.stop()
+        response = asyncio.run(run())
+        self.assertEqual(response.headers["content-type"], "application/x-ndjson")
+        results = {result["index"]: result for result in map(json.loads, response.text.splitlines())}
+        self.assertEqual(sorted(results), [0, 1, 2, 3, 4])
+        self.assertEqual([results[i]["text"] for i in range(3)], TEXTS[:3])
+        self.assertIn("error", results[3])
+        self.assertIn("error", results[4])
+        # the valid inputs of the chunk ran in one batch
+        self.assertEqual(self.batches, [("ED", 3)])
+
+        responses = self.request("POST", "/api/batch", [[{"text": TEXTS[3]}]])
+        self.assertEqual(json.loads(responses[0].text)["text"], TEXTS[3])
+
+    def test_stream(self):
+        response, = self.request("POST", "/api/query/stream", [{"text": TEXTS[0], "task": "Event Extraction"}])
+        self.assertEqual(response.headers["content-type"], "application/x-ndjson")
+        messages = [json.loads(line) for line in response.text.splitlines()]
+        self.assertEqual(messages[0]["event"], "trigger")
+        self.assertEqual(messages[0]["trigger"], "attacked")
+        self.assertEqual(messages[-1]["event"], "done")
+        self.assertEqual(messages[-1]["text"], TEXTS[0])
+        self.assertIn("arguments", messages[-1]["events"][0])
+
+        with TestClient(main.app) as client:
+            try:
+                with client.websocket_connect("/ws/query") as websocket:
+                    websocket.send_json({"text": TEXTS[0], "task": "Event Extraction"})
+                    received = [websocket.receive_json()]
+                    while received[-1]["event"] != "done":
+                        received.append(websocket.receive_json())
+                    websocket.send_json({"task": "Event Detection"})
+                    self.assertEqual(websocket.receive_json()["event"], "error")
+            finally:
+                client.portal.call(main.engine.stop)
+        # the socket streams the same messages
+        self.assertEqual(received, messages)
+
+    def test_stream_fallback(self):
+        load_stub = main.model_manager.load_fn
+
+        def load_non_streaming(path, device):
+            model, tokenizer = load_stub(path, device)
+            # like ONNX models
+            model.supports_logits_processor = False
+            return model, tokenizer
+        main.model_manager.load_fn = load_non_streaming
+        main.model_manager._models.clear()
+        try:
+            response, = self.request("POST", "/api/query/stream", [{"text": TEXTS[0]}])
+        finally:
+            main.model_manager._models.clear()
+        messages = [json.loads(line) for line in response.text.splitlines()]
+        self.assertEqual([message["event"] for message in messages], ["trigger", "trigger", "done"])
+        self.assertEqual(messages[-1]["events"][0]["trigger"], "attacked")
+        # ED ran through the scheduler instead of streaming
+        self.assertEqual(self.batches, [("ED", 1)])
+
+    def test_swap(self):
+        with tempfile.TemporaryDirectory() as model_dir:
+            path = os.path.join(model_dir, "ed")
+            # disabled without an admin token
+            response, = self.request("POST", "/api/models/ED", [{"path": path}])
+            self.assertEqual(response.status_code, 403)
+            try:
+                main.settings.admin_token = "secret"
+                main.settings.model_dirs = [model_dir]
+                response, = self.request("POST", "/api/models/ED", [{"path": path}],
+                                         headers={"Authorization": "Bearer wrong"})
+                self.assertEqual(response.status_code, 401)
+                headers = {"Authorization": "Bearer secret"}
+                for name, body in [("ED", {"path": "/etc/passwd"}), ("ED", {"path": os.path.join(model_dir, "..")})]:
+                    response, = self.request("POST", f"/api/models/{name}", [body], headers=headers)
+                    self.assertEqual(response.status_code, 403)
+                response, = self.request("POST", "/api/models/other", [{"path": path}], headers=headers)
+                self.assertEqual(response.status_code, 400)
+                response, = self.request("POST", "/api/models/ED:maven", [{"path": path}], headers=headers)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.json()["path"], path)
+            finally:
+                main.settings.admin_token = None
+                main.settings.model_dirs = []
+                main.model_manager.paths.pop("ED:maven", None)
+                main.model_manager._models.pop("ED:maven", None)
+
+    def test_metrics(self):
+        def get_value(lines, prefix):
+            return sum(float(line.split(" ")[-1]) for line in lines if line.startswith(prefix))
+
+        before = self.request("GET", "/metrics", [None])[0].text.splitlines()
+        responses = self.request("POST", "/api/query?debug=true", [{"text": text} for text in TEXTS[:2]])
+        self.assertIn("generate;dur=", responses[0].headers["Server-Timing"])
+        after = self.request("GET", "/metrics", [None])[0].text.splitlines()
+        for prefix, value in [('omnievent_requests_total{endpoint="query",task="Event Detection"}', 2),
+                              ('omnievent_batch_size_count{task="ED"}', 1),
+                              ('omnievent_batch_rows_sum{task="ED"}', 2),
+                              ('omnievent_stage_seconds_count{stage="generate",task="ED"}', 1)]:
+            self.assertEqual(get_value(after, prefix) - get_value(before, prefix), value, prefix)
+        self.assertGreater(get_value(after, 'omnievent_tokens_out_total{task="ED"}'),
+                           get_value(before, 'omnievent_tokens_out_total{task="ED"}'))
+
+        # failed inputs are not counted as served
+        self.failing = True
+        self.request("POST", "/api/batch", [[{"text": text} for text in TEXTS[2:]]])
+        final = self.request("GET", "/metrics", [None])[0].text.splitlines()
+        prefix = 'omnievent_requests_total{endpoint="batch"'
+        self.assertEqual(get_value(final, prefix), get_value(after, prefix))
+
+
+if __name__ == "__main__":
+    unittest.main()
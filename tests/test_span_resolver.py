@@ -0,0 +1,32 @@
+import unittest
+import sys 
+sys.path.append("..")
+from OmniEvent.infer_module.seq2seq import SpanResolver, get_ed_result, get_eae_result, prepare_for_eae_from_pred
+
+
+class TestSpanResolver(unittest.TestCase):
+
+    def test_resolve(self):
+        text = "The attack on Monday killed two. A second attack on Friday wounded ten."
+        span_resolver = SpanResolver(text)
+        self.assertEqual(span_resolver.find_all("attack"), [4, 42])
+        # whole words take precedence over matches inside other words
+        self.assertEqual(span_resolver.find_all("on"), [11, 49])
+        self.assertEqual(span_resolver.resolve("on", 59), [49, 51])
+        self.assertEqual(span_resolver.resolve_in_order(["attack", "wounded", "attack", "none"]),
+                         [[4, 10], [59, 66], [42, 48], None])
+
+    def test_repeated_mentions(self):
+        text = "The attack on Monday killed two. A second attack on Friday wounded ten."
+        triggers = [(0, "attack", "attack"), (0, "injure", "wounded"), (0, "attack", "attack")]
+        events = get_ed_result([text], triggers)[0]["events"]
+        self.assertEqual([event["offset"] for event in events], [[4, 10], [59, 66], [42, 48]])
+        instances = prepare_for_eae_from_pred([text], [(0, "die", "killed"), (0, "injure", "wounded")], ["<ace>"])
+        arguments = [[(0, "time", "Monday"), (0, "place", "on")], [(1, "place", "on")]]
+        events = get_eae_result(instances, arguments)[0]["events"]
+        self.assertEqual([argument["offset"] for argument in events[0]["arguments"]], [[14, 20], [11, 13]])
+        self.assertEqual([argument["offset"] for argument in events[1]["arguments"]], [[49, 51]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+import time
+import unittest
+import sys
+sys.path.append("..")
+import torch
+from transformers import MT5Config, MT5ForConditionalGeneration
+from OmniEvent.infer_module.speculative import copy_draft, speculative_greedy_search
+
+
+class TestSpeculativeDecoding(unittest.TestCase):
+
+    def test_copy_draft(self):
+        src_sequence = [5, 6, 7, 8, 9, 6, 10, 1]
+        self.assertEqual(copy_draft([5, 6], src_sequence, 3), [7, 8, 9])
+        # the longest matching suffix decides between the occurrences of 6
+        self.assertEqual(copy_draft([9, 6], src_sequence, 3), [10, 1])
+        self.assertEqual(copy_draft([11, 6], src_sequence, 2), [7, 8])
+        self.assertEqual(copy_draft([11], src_sequence, 3), [])
+        self.assertEqual(copy_draft([], src_sequence, 3), [])
+
+    def test_parity(self):
+        torch.manual_seed(42)
+        config = MT5Config(vocab_size=128, d_model=32, d_kv=8, d_ff=64, num_layers=2, num_decoder_layers=2,
+                           num_heads=4, decoder_start_token_id=0, eos_token_id=1, pad_token_id=0)
+        model = MT5ForConditionalGeneration(config).eval()
+        input_ids = torch.randint(2, 128, (3, 12))
+        attention_mask = torch.ones_like(input_ids)
+        attention_mask[1, 8:] = 0
+        expected = model.generate(input_ids, attention_mask=attention_mask, num_beams=1, max_length=24)
+        self.assertTrue(torch.equal(expected, speculative_greedy_search(model, input_ids, attention_mask, 24)))
+
+        # appending the outputs to the inputs gives the drafts something to copy
+        input_ids = torch.cat([input_ids, expected[:, 1:]], dim=1)
+        attention_mask = torch.cat([attention_mask, (expected[:, 1:] != config.pad_token_id).long()], dim=1)
+        expected = model.generate(input_ids, attention_mask=attention_mask, num_beams=1, max_length=24)
+        num_forwards = []
+        model.get_decoder().register_forward_hook(lambda *args: num_forwards.append(1))
+        outputs = speculative_greedy_search(model, input_ids, attention_mask, 24)
+        self.assertTrue(torch.equal(expected, outputs))
+        self.assertLess(len(num_forwards), int((expected[:, 1:] != config.pad_token_id).sum()))
+
+    def test_deadline(self):
+        torch.manual_seed(0)
+        config = MT5Config(vocab_size=128, d_model=32, d_kv=8, d_ff=64, num_layers=1, num_decoder_layers=1,
+                           num_heads=4, decoder_start_token_id=0, eos_token_id=1, pad_token_id=0)
+        model = MT5ForConditionalGeneration(config).eval()
+        input_ids = torch.randint(2, 128, (2, 12))
+        expected = speculative_greedy_search(model, input_ids, max_length=24)
+        self.assertTrue(torch.equal(expected, speculative_greedy_search(model, input_ids, max_length=24,
+                                                                        deadline=time.monotonic() + 60)))
+        # a passed deadline stops decoding before the first step
+        outputs = speculative_greedy_search(model, input_ids, max_length=24, deadline=time.monotonic())
+        self.assertEqual(outputs.tolist(), [[config.decoder_start_token_id]] * 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,38 @@
+import os
+import json
+import tempfile
+import unittest
+import sys 
+sys.path.append("..")
+from OmniEvent.infer_module.stream import parse_instance, read_instances, iter_chunks, StreamCheckpoint
+
+
+class TestStream(unittest.TestCase):
+
+    def test_parse_instance(self):
+        line = json.dumps({
+            "id": "doc-0",
+            "text": "the assault began",
+            "events": [{"type": "attack", "triggers": [{"trigger_word": "assault", "position": [4, 11]}]}]
+        })
+        instance = parse_instance(line, 0, "unified")
+        self.assertEqual(instance["id"], "doc-0")
+        self.assertEqual(instance["triggers"], [("assault", 4, 11)])
+        self.assertEqual(parse_instance("the assault began\n", 3, "text")["id"], 3)
+        self.assertIsNone(parse_instance("\n", 4, "text"))
+
+    def test_read_and_resume(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            input_file = os.path.join(tmp_dir, "input.txt")
+            with open(input_file, "w") as f:
+                f.write("a\nb\n\nc\n")
+            chunks = list(iter_chunks(read_instances(input_file, "text", start_line=1), 2))
+            self.assertEqual([[line_no for line_no, _ in chunk] for chunk in chunks], [[1, 2], [3]])
+            checkpoint = StreamCheckpoint(os.path.join(tmp_dir, "output.jsonl.ckpt"))
+            self.assertEqual(checkpoint.load(), (0, 0))
+            checkpoint.save(3, 42)
+            self.assertEqual(checkpoint.load(), (3, 42))
+
+
+if __name__ == "__main__":
+    unittest.main()
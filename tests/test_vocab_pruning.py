@@ -0,0 +1,82 @@
+import os
+import json
+import unittest
+import tempfile
+import sys
+sys.path.append("..")
+import torch
+from tokenizers import Tokenizer, models, pre_tokenizers, processors, decoders
+from transformers import MT5Config, MT5ForConditionalGeneration, T5TokenizerFast
+from OmniEvent.infer import get_pretrained
+from OmniEvent.infer_module.vocab_pruning import prune_vocab
+
+
+def build_tokenizer():
+    pieces = ["<pad>", "</s>", "<unk>", "▁", ":", "<extra_id_0>", "<extra_id_1>"]
+    for word in ["troops", "moving", "city", "attack", "transport", "artifact", "bank", "river", "the"]:
+        pieces += [f"▁{word}", word]
+    pieces += [f"▁{char}" for char in "abcdefghijklmnopqrstuvwxyz"] + list("abcdefghijklmnopqrstuvwxyz")
+    pieces += ["▁mov", "ing", "▁cit", "▁troop"]
+    backend = Tokenizer(models.Unigram([(piece, -float(i)) for i, piece in enumerate(pieces)], unk_id=2))
+    backend.pre_tokenizer = pre_tokenizers.Metaspace()
+    backend.decoder = decoders.Metaspace()
+    backend.post_processor = processors.TemplateProcessing(single="$A </s>", special_tokens=[("</s>", 1)])
+    return T5TokenizerFast(tokenizer_object=backend, pad_token="<pad>", eos_token="</s>", unk_token="<unk>",
+                           extra_ids=0, additional_special_tokens=["<extra_id_0>", "<extra_id_1>"]), len(pieces)
+
+
+class TestVocabPruning(unittest.TestCase):
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.tmp_dir = tmp_dir.name
+        self.data_file = os.path.join(self.tmp_dir, "train.unified.jsonl")
+        with open(self.data_file, "w", encoding="utf-8") as f:
+            f.write(json.dumps({
+                "text": "troops moving the city",
+                "events": [{
+                    "type": "Movement.Transport",
+                    "triggers": [{
+                        "trigger_word": "moving",
+                        "arguments": [{"role": "Artifact", "mentions": [{"mention": "troops"}]}]
+                    }]
+                }]
+            }) + "\n")
+        self.schema_file = os.path.join(self.tmp_dir, "label2id.json")
+        with open(self.schema_file, "w", encoding="utf-8") as f:
+            json.dump({"NA": 0, "Conflict.Attack": 1}, f)
+
+    def test_prune(self):
+        torch.manual_seed(42)
+        tokenizer, vocab_size = build_tokenizer()
+        config = MT5Config(vocab_size=vocab_size, d_model=32, d_kv=8, d_ff=64, num_layers=2, num_decoder_layers=2,
+                           num_heads=4, decoder_start_token_id=0, eos_token_id=1, pad_token_id=0)
+        model = MT5ForConditionalGeneration(config).eval()
+        full_model = MT5ForConditionalGeneration(config).eval()
+        full_model.load_state_dict(model.state_dict())
+        output_dir = os.path.join(self.tmp_dir, "pruned")
+        kept_ids = prune_vocab(model, tokenizer, output_dir, [self.data_file], [self.schema_file],
+                               keep_single_chars=False)
+        self.assertLess(len(kept_ids), vocab_size)
+        self.assertNotIn(tokenizer.convert_tokens_to_ids("▁bank"), kept_ids)
+        self.assertIn(tokenizer.convert_tokens_to_ids("▁attack"), kept_ids)
+
+        pruned_model, pruned_tokenizer = get_pretrained(output_dir, "cpu", use_registry=False)
+        self.assertEqual(pruned_model.config.vocab_size, len(kept_ids))
+        for words in [["troops", "moving", "the", "city"], ["<extra_id_0>", "transport:", "moving", "<extra_id_1>"]]:
+            input_ids = tokenizer(words, is_split_into_words=True, return_tensors="pt").input_ids
+            pruned_input_ids = pruned_tokenizer(words, is_split_into_words=True, return_tensors="pt").input_ids
+            self.assertEqual(input_ids[0].tolist(), [kept_ids[id] for id in pruned_input_ids[0]])
+            self.assertEqual(tokenizer.decode(input_ids[0]), pruned_tokenizer.decode(pruned_input_ids[0]))
+
+        decoder_input_ids = pruned_input_ids.new_tensor([[0, 3, 4]])
+        with torch.no_grad():
+            logits = full_model(input_ids=input_ids,
+                                decoder_input_ids=torch.tensor([[kept_ids[id] for id in decoder_input_ids[0]]])).logits
+            pruned_logits = pruned_model(input_ids=pruned_input_ids, decoder_input_ids=decoder_input_ids).logits
+        self.assertTrue(torch.allclose(logits[..., kept_ids], pruned_logits))
+
+
+if __name__ == "__main__":
+    unittest.main()